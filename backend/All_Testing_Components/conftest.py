@@ -0,0 +1,24 @@
+import threading
+import pytest
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point SQLite (documents, chunks, jobs, index versions) at a fresh database under tmp_path."""
+    import query_service
+    import index_versions
+    import job_queue
+    import blob_store
+
+    path = str(tmp_path / "documents.db")
+    monkeypatch.setattr(query_service, "DATABASE_PATH", path)
+    # New per-thread connections and schema setup against the temporary file
+    monkeypatch.setattr(query_service, "_local", threading.local())
+    monkeypatch.setattr(query_service, "_schema_ready", False)
+    for module in (index_versions, job_queue, blob_store):
+        monkeypatch.setattr(module, "_table_ready", False)
+    monkeypatch.setattr(index_versions, "_active", None)
+    yield path
+    conn = getattr(query_service._local, "conn", None)
+    if conn is not None:
+        conn.close()
@@ -1,5 +1,6 @@
 import os
 import io
+import time
 import pytest
 from app import app
 
@@ -32,4 +33,91 @@ def test_upload_and_query(client):
 
     query_resp = client.post('/query', json={'query': 'What is AI?', 'file_id': file_id})
     assert query_resp.status_code == 200
-    assert 'answer' in query_resp.get_json()
\ No newline at end of file
+    assert 'answer' in query_resp.get_json()
+
+def test_query_stream_sends_tokens(client, monkeypatch):
+    import json
+    import app as app_module
+    import services
+
+    def fake_stream(**kwargs):
+        assert kwargs.get('stream') is True
+        for token in ["The ", "balance ", "is $10."]:
+            yield {"choices": [{"delta": {"content": token}}]}
+
+    monkeypatch.setattr(app_module, 'embed_text', lambda text: [0.1, 0.2])
+    monkeypatch.setattr(app_module, 'hybrid_search', lambda q, vec, file_id=None: [])
+    monkeypatch.setattr(app_module, 'document_passages', lambda doc_id, q: [{"text": "Closing balance $10.", "score": None}])
+    monkeypatch.setattr(services.get('openai').ChatCompletion, 'create', fake_stream)
+
+    response = client.post('/query/stream', json={'query': 'Balance?', 'file_id': 'stream-doc'})
+    assert response.mimetype == 'text/event-stream'
+    events = [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).split('\n\n') if line]
+    assert ''.join(e.get('token', '') for e in events) == "The balance is $10."
+    assert events[-1]['done'] is True
+    assert events[-1]['time_to_first_token'] is not None
+
+def test_metrics_endpoint(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert 'jarvis_process_cpu_seconds_total' in response.get_data(as_text=True)
+
+def test_bulk_upload_reports_each_file(temp_db, client, monkeypatch):
+    import zipfile
+    import job_queue
+    from query_service import get_document
+
+    def fake_ingest(documents, on_progress=None):
+        return {doc_id: {"chunks": 1, "upserted": 1, "embed_time": 0.0, "upsert_time": 0.0}
+                for doc_id, _, _ in documents}
+    monkeypatch.setattr(job_queue, "ingest_documents", fake_ingest)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr("statements/march.txt", "March statement")
+        zf.writestr("statements/setup.exe", "binary")
+    archive.seek(0)
+    data = {'files': [(io.BytesIO(b"January statement"), 'january.txt'), (archive, 'batch.zip')]}
+    response = client.post('/upload/bulk', content_type='multipart/form-data', data=data)
+    assert response.status_code == 200
+    files = {f["filename"]: f for f in response.get_json()["files"]}
+    assert files["statements/setup.exe"]["error"] == "Unsupported file type"
+
+    for name, text in [("january.txt", "January statement"), ("statements/march.txt", "March statement")]:
+        deadline = time.time() + 30
+        while job_queue.get_job(files[name]["job_id"])["status"] not in ("done", "failed") and time.time() < deadline:
+            time.sleep(0.05)
+        assert job_queue.get_job(files[name]["job_id"])["status"] == "done"
+        assert get_document(files[name]["id"]) == text
+
+def test_duplicate_upload_reuses_document(temp_db, client, monkeypatch):
+    import job_queue
+    monkeypatch.setattr(job_queue, "ingest_document",
+                        lambda doc_id, segments, metadata, on_progress=None: list(segments) and
+                        {"chunks": 1, "upserted": 1, "embed_time": 0.0, "upsert_time": 0.0})
+    content = f"Duplicate upload test {time.time()}".encode()
+    first = client.post('/upload', content_type='multipart/form-data',
+                        data={'file': (io.BytesIO(content), 'dup.txt')}).get_json()
+    second = client.post('/upload', content_type='multipart/form-data',
+                         data={'file': (io.BytesIO(content), 'dup-again.txt')}).get_json()
+    assert second["duplicate"] is True
+    assert second["id"] == first["id"] and second["job_id"] == first["job_id"]
+
+def test_upload_over_request_limit(client):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    try:
+        response = client.post('/upload', content_type='multipart/form-data',
+                               data={'file': (io.BytesIO(b"x" * 4096), 'big.txt')})
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = limit
+    assert response.status_code == 413
+
+def test_health_and_readiness(client):
+    health = client.get('/healthz')
+    assert health.status_code == 200
+    assert 'vector_store' in health.get_json()['services']
+
+    ready = client.get('/readyz')
+    assert ready.status_code == 200
+    assert ready.get_json()['services']['database']['warm'] is True
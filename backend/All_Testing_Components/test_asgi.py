@@ -0,0 +1,85 @@
+import json
+import asyncio
+import pytest
+
+pytest.importorskip("asgiref")
+import asgi
+import async_service
+from query_cache import QueryCache
+
+def call(path, payload=None, scope_type='http', messages=None):
+    """Run one request (or a lifespan exchange) through the ASGI app; returns the messages it sent."""
+    incoming = list(messages or [{'type': 'http.request', 'body': json.dumps(payload or {}).encode()}])
+    sent = []
+    async def receive():
+        return incoming.pop(0)
+    async def send(message):
+        sent.append(message)
+    scope = {'type': scope_type, 'method': 'POST', 'path': path, 'headers': []}
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent
+
+def body(sent):
+    return b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body').decode()
+
+def events(sent):
+    return [json.loads(line[len('data: '):]) for line in body(sent).splitlines() if line.startswith('data: ')]
+
+@pytest.fixture
+def backends(temp_db, monkeypatch):
+    """Local stand-ins for the embedding, search and chat calls behind /query."""
+    matches = [{"id": "doc#0", "score": 1.0, "text": "The closing balance is $1,234.56.",
+                "metadata": {"doc_id": "doc", "start": 0, "end": 33}}]
+    async def aembed_text(text):
+        return [0.0]
+    async def ahybrid_search(query, query_vector, file_id=None, **kwargs):
+        return matches
+    async def achat(model, prompt):
+        return "The closing balance is $1,234.56."
+    async def achat_stream(model, prompt):
+        for token in ("The ", "closing ", "balance"):
+            yield token
+    monkeypatch.setattr(asgi, "get_query_cache", lambda cache=QueryCache(): cache)
+    for name, fn in (("aembed_text", aembed_text), ("ahybrid_search", ahybrid_search),
+                     ("achat", achat), ("achat_stream", achat_stream)):
+        monkeypatch.setattr(async_service, name, fn)
+
+def test_query_route(backends):
+    sent = call('/query', {'query': 'What is the closing balance?', 'file_id': 'doc'})
+    assert sent[0]['type'] == 'http.response.start' and sent[0]['status'] == 200
+    assert json.loads(body(sent)) == {"answer": "The closing balance is $1,234.56."}
+
+def test_query_stream_route(backends):
+    sent = call('/query/stream', {'query': 'What is the closing balance?', 'file_id': 'doc'})
+    assert sent[0]['status'] == 200
+    received = events(sent)
+    assert ''.join(e["token"] for e in received if "token" in e) == "The closing balance"
+    assert received[-1]["done"] is True
+    assert sent[-1]['more_body'] is False
+
+def test_failure_mid_stream_ends_the_stream_with_an_error_event(backends, monkeypatch):
+    async def query_stream(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b'data: {"token": "The "}\n\n', 'more_body': True})
+        raise RuntimeError("connection reset")
+    monkeypatch.setitem(asgi.ROUTES, ('POST', '/query/stream'), ('query_stream', query_stream))
+    sent = call('/query/stream', {'query': 'q', 'file_id': 'doc'})
+    # One response start only; the error is the last event of the open stream
+    assert [m['type'] for m in sent].count('http.response.start') == 1
+    assert events(sent)[-1] == {"error": "Internal server error"}
+    assert sent[-1]['more_body'] is False
+
+def test_failure_before_the_response_is_a_500(backends, monkeypatch):
+    async def query(scope, receive, send):
+        raise RuntimeError("boom")
+    monkeypatch.setitem(asgi.ROUTES, ('POST', '/query'), ('query', query))
+    sent = call('/query', {'query': 'q', 'file_id': 'doc'})
+    assert sent[0]['status'] == 500
+    assert json.loads(body(sent)) == {"error": "Internal server error"}
+
+def test_failed_warmup_fails_lifespan_startup(monkeypatch):
+    def warmup():
+        raise RuntimeError("vector index unreadable")
+    monkeypatch.setattr(asgi.services, "warmup", warmup)
+    sent = call('', scope_type='lifespan', messages=[{'type': 'lifespan.startup'}])
+    assert sent == [{'type': 'lifespan.startup.failed', 'message': 'vector index unreadable'}]
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import openai
+import retrieval
+import async_service
+
+def test_embedding_batches_run_concurrently(monkeypatch):
+    monkeypatch.setattr(async_service, "EMBEDDING_CACHE_ENABLED", False)
+    in_flight = []
+    peak = []
+    async def acreate(model, input):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return {"data": [{"index": i, "embedding": [float(len(t))]} for i, t in enumerate(input)]}
+    monkeypatch.setattr(openai.Embedding, "acreate", acreate)
+    texts = ["a" * n for n in range(1, 9)]
+    vectors = asyncio.run(async_service.aembed_texts(texts, batch_size=2))
+    assert vectors == [[float(n)] for n in range(1, 9)]
+    assert max(peak) > 1
+
+def test_keyword_search_overlaps_embedding(monkeypatch):
+    started = {}
+    def search_chunks(query, doc_id=None, limit=10, version=''):
+        started["keyword"] = time.perf_counter()
+        return [{"id": "d#0", "score": 1.0, "text": "closing balance", "metadata": {"doc_id": "d", "start": 0, "end": 15}}]
+    def query_similar(vector, top_k, filter):
+        assert filter == {"doc_id": "d"}
+        return [{"id": "d#0", "score": 0.9, "metadata": {"doc_id": "d"}}]
+    monkeypatch.setattr(retrieval, "search_chunks", search_chunks)
+    monkeypatch.setattr(retrieval, "query_similar", query_similar)
+    monkeypatch.setattr(retrieval, "get_chunks", lambda ids, version='': {})
+
+    async def slow_embedding():
+        await asyncio.sleep(0.05)
+        started["embedded"] = time.perf_counter()
+        return [0.0]
+
+    async def run():
+        return await async_service.ahybrid_search("closing balance", asyncio.ensure_future(slow_embedding()), file_id="d")
+    results = asyncio.run(run())
+    assert [r["id"] for r in results] == ["d#0"]
+    assert results[0]["text"] == "closing balance"
+    assert started["keyword"] < started["embedded"]
@@ -0,0 +1,30 @@
+import openai
+import embedding_service
+from benchmarks import stubs
+from benchmarks.load_test import percentiles, stage_summary
+
+def test_stubs_replace_openai_and_vector_store(tmp_path):
+    with stubs.installed({"embedding": 0, "vector": 0, "llm": 0, "llm_token": 0}, index_dir=str(tmp_path)) as installed:
+        a, b = embedding_service._request_embeddings(["same text", "same text"], batch_size=10)
+        assert a == b
+        embedding_service.upsert_vectors([{"id": "doc#0", "values": a, "metadata": {"doc_id": "doc"}}])
+        assert embedding_service.query_similar(a, top_k=1)[0]["id"] == "doc#0"
+        chunks = openai.ChatCompletion.create(model="m", messages=[], stream=True)
+        assert "".join(c["choices"][0]["delta"]["content"] for c in chunks).strip() == stubs.StubChatCompletion.ANSWER
+        assert installed.embedding.calls == 1
+    assert openai.Embedding.create != installed.embedding.create
+
+def test_report_helpers():
+    assert percentiles([0.1, 0.2, 0.3])["p50"] == 200.0
+    snapshot = {"summaries": [{"name": "stage_duration_seconds", "labels": {"stage": "llm"},
+                               "count": 2, "sum": 1.0, "p50": 0.5, "p95": 0.6, "p99": 0.6}], "counters": []}
+    assert stage_summary(snapshot)["stages"]["llm"]["mean_ms"] == 500.0
+
+def test_rouge_scores():
+    from benchmarks.summarizer import rouge, rouge_n, rouge_l
+    reference = "the closing balance was high"
+    assert rouge_n(reference, reference, 2) == 1.0
+    assert rouge_n("overdraft fee", reference) == 0.0
+    # LCS "the balance was": 3 of 4 candidate and 5 reference tokens
+    assert round(rouge_l("the balance was low", reference), 3) == 0.667
+    assert rouge(["a b", "c d"], ["a b", "x y"])["rouge1"] == 0.5
@@ -0,0 +1,64 @@
+import io
+import os
+import time
+import hashlib
+import threading
+import pytest
+import blob_store
+
+def test_identical_content_is_stored_once(temp_db, tmp_path):
+    data = b"statement line\n" * 200000
+    a = blob_store.save_stream(io.BytesIO(data), "a.txt", root=str(tmp_path))
+    b = blob_store.save_stream(io.BytesIO(data), "copy.txt", root=str(tmp_path))
+    assert a["sha256"] == b["sha256"] == hashlib.sha256(data).hexdigest()
+    assert a["path"] == b["path"] and a["size"] == len(data)
+    assert os.listdir(tmp_path / "tmp") == []
+
+def test_oversized_upload_is_rejected(temp_db, tmp_path):
+    with pytest.raises(blob_store.UploadTooLarge):
+        blob_store.save_stream(io.BytesIO(b"x" * 5000), "big.txt", max_bytes=4096, root=str(tmp_path))
+    assert [p for p in tmp_path.rglob("*") if p.is_file()] == []
+
+def test_duplicate_content_maps_to_existing_document(temp_db, tmp_path, monkeypatch):
+    blob = blob_store.save_stream(io.BytesIO(b"unique content for claim test"), "c.txt", root=str(tmp_path))
+    assert blob_store.claim_document(blob, "blob-doc-1") == ("blob-doc-1", False, None)
+    monkeypatch.setattr(blob_store.job_queue, "latest_job", lambda doc_id: {"id": "job-1", "status": "done"})
+    assert blob_store.claim_document(blob, "blob-doc-2") == ("blob-doc-1", True, {"id": "job-1", "status": "done"})
+    # A failed ingestion does not block re-uploading the same file
+    monkeypatch.setattr(blob_store.job_queue, "latest_job", lambda doc_id: {"id": "job-1", "status": "failed"})
+    assert blob_store.claim_document(blob, "blob-doc-3") == ("blob-doc-3", False, None)
+
+def test_concurrent_uploads_of_new_content_are_ingested_once(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store.job_queue, "latest_job", lambda doc_id: None)
+    blob = blob_store.save_stream(io.BytesIO(b"content uploaded by two workers at once"), "d.txt", root=str(tmp_path))
+    results = []
+    def claim(i):
+        results.append(blob_store.claim_document(blob, f"blob-doc-{i}"))
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    winners = [doc_id for doc_id, duplicate, _ in results if not duplicate]
+    assert len(winners) == 1
+    assert {doc_id for doc_id, _, _ in results} == set(winners)
+
+def test_sweep_applies_retention_and_quota(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store.job_queue, "active_paths", lambda: [])
+    blobs = [blob_store.save_stream(io.BytesIO(f"sweep blob {i} ".encode() * 100), f"{i}.txt", root=str(tmp_path))
+             for i in range(3)]
+    now = max(os.path.getmtime(b["path"]) for b in blobs) + 10
+    result = blob_store.sweep(quota_bytes=10 ** 9, retention_seconds=3600, root=str(tmp_path), now=now)
+    assert all(os.path.exists(b["path"]) for b in blobs)
+
+    # Over quota: least recently used blobs go first until the rest fits
+    result = blob_store.sweep(quota_bytes=blobs[2]["size"], retention_seconds=3600, root=str(tmp_path), now=now)
+    assert not os.path.exists(blobs[0]["path"]) and not os.path.exists(blobs[1]["path"])
+    assert os.path.exists(blobs[2]["path"])
+    assert result["removed"] == 2
+
+def test_sweep_leaves_blobs_outside_its_root(temp_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store.job_queue, "active_paths", lambda: [])
+    other = blob_store.save_stream(io.BytesIO(b"another store's upload"), "other.txt", root=str(tmp_path / "other"))
+    blob_store.sweep(quota_bytes=0, retention_seconds=0, root=str(tmp_path / "swept"), now=time.time() + 10)
+    assert os.path.exists(other["path"])
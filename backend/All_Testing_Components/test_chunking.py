@@ -0,0 +1,23 @@
+from chunking import chunk_text, iter_chunks
+
+def test_chunks_are_bounded_and_overlap():
+    text = " ".join(f"word{i}" for i in range(2000))
+    chunks = chunk_text(text, max_tokens=50, overlap_tokens=10)
+    assert len(chunks) > 1
+    assert all(c.tokens <= 50 for c in chunks)
+    for c in chunks:
+        assert text[c.start:c.end] == c.text
+    # Consecutive chunks share some text
+    assert chunks[1].start < chunks[0].end
+
+def test_segments_use_joined_offsets():
+    pages = ["First page text. ", "Second page text. ", "Third page."]
+    joined = "".join(pages)
+    chunks = list(iter_chunks(pages, max_tokens=4, overlap_tokens=1))
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    for c in chunks:
+        assert joined[c.start:c.end] == c.text
+    assert chunks[-1].end == len(joined)
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("   ") == []
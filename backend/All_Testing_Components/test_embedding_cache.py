@@ -0,0 +1,34 @@
+from embedding_cache import EmbeddingCache
+
+def test_cache_hits_after_put(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "cache.db"), memory_entries=10)
+    assert cache.get_many("m", ["hello world"]) == [None]
+    cache.put_many("m", ["hello world"], [[0.5, 0.25]])
+    # Whitespace differences normalize to the same key
+    assert cache.get_many("m", ["  hello   world "]) == [[0.5, 0.25]]
+    # Keys are per model
+    assert cache.get_many("other", ["hello world"]) == [None]
+    assert cache.stats()["hits"] == 1
+
+def test_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path=path, max_entries=2, memory_entries=1)
+    cache.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    reopened = EmbeddingCache(path=path, max_entries=2, memory_entries=1)
+    assert sum(v is not None for v in reopened.get_many("m", ["a", "b", "c"])) == 2
+    assert cache.stats()["evictions"] == 1
+
+def test_hits_refresh_access_time_in_batches(tmp_path):
+    import time
+    cache = EmbeddingCache(path=str(tmp_path / "cache.db"), max_entries=2, memory_entries=1)
+    cache.put_many("m", ["a"], [[1.0]])
+    time.sleep(0.01)
+    cache.put_many("m", ["b"], [[2.0]])
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    assert cache.get_many("m", ["a"]) == [[1.0]]
+    # The lookup only reads; the access time waits for the next flush
+    assert not any(s.startswith("UPDATE") for s in statements)
+    # "a" was read after "b" was written, so "b" is the one evicted
+    cache.put_many("m", ["c"], [[3.0]])
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
@@ -8,4 +8,88 @@ def test_txt_extraction():
         path = f.name
 
     content = extract_text(path)
-    assert "sample" in content
\ No newline at end of file
+    assert "sample" in content
+
+def _blank_pdf(tmp_path, pages):
+    from PyPDF2 import PdfWriter
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    path = str(tmp_path / "blank.pdf")
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+def test_parallel_pdf_pages_in_order(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+    from extract_text import iter_pages
+
+    path = _blank_pdf(tmp_path, 40)
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        pages = list(iter_pages(path, executor=pool, ocr_fallback=False))
+    assert [n for n, _ in pages] == list(range(1, 41))
+
+def test_small_pdf_is_extracted_on_the_executor(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from extract_text import iter_pages
+
+    submitted = []
+    class RecordingPool(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args[1:])
+            return super().submit(fn, *args, **kwargs)
+
+    with RecordingPool(max_workers=1) as pool:
+        pages = list(iter_pages(_blank_pdf(tmp_path, 3), executor=pool, processes=1, ocr_fallback=False))
+    assert [n for n, _ in pages] == [1, 2, 3]
+    assert submitted == [(0, 3)]
+
+def test_ocr_only_for_pages_without_text_layer(tmp_path, monkeypatch):
+    from concurrent.futures import Future
+    import ocr_service
+    from extract_text import iter_pages
+
+    ocr_calls = []
+    def fake_submit_page(file_path, page_number):
+        ocr_calls.append(page_number)
+        future = Future()
+        future.set_result(f"ocr page {page_number} ")
+        return future
+    monkeypatch.setattr(ocr_service, "submit_page", fake_submit_page)
+
+    path = _blank_pdf(tmp_path, 3)
+    pages = list(iter_pages(path, ocr_fallback=True))
+    assert ocr_calls == [1, 2, 3]
+    assert [t for _, t in pages] == ["ocr page 1 ", "ocr page 2 ", "ocr page 3 "]
+
+def test_unsupported_extension():
+    assert extract_text("notes.docx") == "Unsupported file type"
+
+def test_blank_pdf_without_ocr_libraries_keeps_text_layer(tmp_path, monkeypatch):
+    import sys
+    import ocr_service
+    # Neither Tesseract binding can be imported, as on a server without the OCR extras
+    monkeypatch.setitem(sys.modules, "pytesseract", None)
+    monkeypatch.setitem(sys.modules, "pdf2image", None)
+    monkeypatch.setattr(ocr_service, "_pdf_ocr_available", None)
+    assert extract_text(_blank_pdf(tmp_path, 1)) == ""
+    assert ocr_service._pool is None
+
+def test_broken_ocr_pool_is_replaced(tmp_path, monkeypatch):
+    from concurrent.futures.process import BrokenProcessPool
+    import ocr_service
+    from extract_text import iter_pages
+
+    class BrokenPool:
+        def submit(self, fn, *args):
+            raise BrokenProcessPool("worker died")
+        def shutdown(self, wait=True):
+            pass
+    broken = BrokenPool()
+    monkeypatch.setattr(ocr_service, "_pool", broken)
+    monkeypatch.setattr(ocr_service, "_pdf_ocr_available", True)
+    monkeypatch.setattr(ocr_service, "get_ocr_pool", lambda: ocr_service._pool or broken)
+
+    pages = list(iter_pages(_blank_pdf(tmp_path, 2), ocr_fallback=True))
+    assert pages == [(1, ""), (2, "")]
+    assert ocr_service._pool is None
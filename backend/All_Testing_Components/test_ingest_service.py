@@ -0,0 +1,16 @@
+import ingest_service
+
+def test_small_documents_share_embedding_and_upsert_batches(monkeypatch):
+    embed_calls, upsert_calls = [], []
+    def fake_embed(texts, batch_size, model=None):
+        embed_calls.append(len(texts))
+        return [[0.0]] * len(texts)
+    monkeypatch.setattr(ingest_service, "embed_texts", fake_embed)
+    monkeypatch.setattr(ingest_service, "upsert_vectors", lambda vectors, batch_size, version=None: upsert_calls.append(vectors[:]))
+
+    docs = [(f"ingest-batch-{i}", f"Statement {i} closing balance {i}00.00", {"filename": f"{i}.txt"}) for i in range(5)]
+    stats = ingest_service.ingest_documents(docs)
+    assert embed_calls == [5]
+    assert len(upsert_calls) == 1
+    assert {v["metadata"]["doc_id"] for v in upsert_calls[0]} == {d[0] for d in docs}
+    assert all(s["chunks"] == 1 and s["upserted"] == 1 for s in stats.values())
@@ -0,0 +1,115 @@
+import time
+import job_queue
+from query_service import get_document
+
+def _wait(job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = job_queue.get_job(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+def test_job_runs_all_stages(temp_db, tmp_path, monkeypatch):
+    def fake_ingest(doc_id, segments, metadata, on_progress=None):
+        list(segments)
+        return {"chunks": 1, "upserted": 1, "embed_time": 0.0, "upsert_time": 0.0}
+
+    monkeypatch.setattr(job_queue, "ingest_document", fake_ingest)
+    path = tmp_path / "note.txt"
+    path.write_text("Queued ingestion test.")
+    job_id = job_queue.enqueue("job-test-doc", str(path), "note.txt")
+
+    job = _wait(job_id)
+    assert job["status"] == "done"
+    assert all(job["stages"][s]["status"] == "done" for s in job_queue.STAGES)
+    assert get_document("job-test-doc") == "Queued ingestion test."
+
+def test_text_is_saved_when_embedding_fails(temp_db, tmp_path, monkeypatch):
+    def failing_ingest(doc_id, segments, metadata, on_progress=None):
+        next(iter(segments))
+        raise RuntimeError("embedding backend unavailable")
+
+    monkeypatch.setattr(job_queue, "ingest_document", failing_ingest)
+    path = tmp_path / "note.txt"
+    path.write_text("Saved even though embedding failed.")
+    job_id = job_queue.enqueue("job-embed-failure-doc", str(path), "note.txt")
+
+    job = _wait(job_id)
+    assert job["status"] == "failed"
+    assert job["stages"]["extract"]["status"] == "done"
+    assert job["stages"]["save"]["status"] == "done"
+    assert job["stages"]["embed"]["status"] == "failed"
+    assert get_document("job-embed-failure-doc") == "Saved even though embedding failed."
+
+def test_failed_job_reports_error(temp_db, tmp_path):
+    job_id = job_queue.enqueue("job-missing-doc", str(tmp_path / "missing.txt"), "missing.txt")
+    job = _wait(job_id)
+    assert job["status"] == "failed"
+    assert job["stages"]["extract"]["status"] == "failed"
+    assert job["error"]
+
+def test_unknown_job(temp_db):
+    assert job_queue.get_job("does-not-exist") is None
+
+def test_orphaned_job_is_resumed_by_one_process(temp_db, tmp_path, monkeypatch):
+    import socket
+    import subprocess
+    from types import SimpleNamespace
+    from query_service import transaction
+
+    resumed = []
+    monkeypatch.setattr(job_queue, "_get_pools", lambda: (SimpleNamespace(submit=lambda fn, job_id: resumed.append(job_id)), None))
+    job_id, = job_queue._insert_jobs([("job-orphan-doc", str(tmp_path / "note.txt"), "note.txt")])
+    exited = subprocess.Popen(["true"])
+    exited.wait()
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET status = 'running', owner = ? WHERE id = ?",
+                     (f"{socket.gethostname()}:{exited.pid}", job_id))
+
+    job_queue.start()
+    # Another worker starting up sees the job owned by a live process
+    job_queue.start()
+    assert resumed == [job_id]
+    assert job_queue.get_job(job_id)["status"] == "queued"
+    # A claim made with a stale view of the owner loses the race
+    assert not job_queue._claim(job_id, "elsewhere:1")
+
+def test_jobs_of_a_restarted_process_with_the_same_pid_are_resumed(temp_db, tmp_path, monkeypatch):
+    import os
+    import socket
+    from types import SimpleNamespace
+    from query_service import transaction
+
+    resumed = []
+    monkeypatch.setattr(job_queue, "_get_pools", lambda: (SimpleNamespace(submit=lambda fn, job_id: resumed.append(job_id)), None))
+    job_id, = job_queue._insert_jobs([("job-restart-doc", str(tmp_path / "note.txt"), "note.txt")])
+    live_id, = job_queue._insert_jobs([("job-live-doc", str(tmp_path / "live.txt"), "live.txt")])
+    # Left running by the previous run of the server, which had this process's pid (PID 1 in a container)
+    with transaction() as conn:
+        conn.execute("UPDATE jobs SET status = 'running', owner = ? WHERE id = ?",
+                     (f"{socket.gethostname()}:{os.getpid()}:previous-boot", job_id))
+
+    job_queue.start()
+    # The job this process enqueued itself is left alone
+    assert resumed == [job_id] and live_id not in resumed
+    assert job_queue.get_job(job_id)["status"] == "queued"
+
+def test_failed_batch_leaves_no_job_running(temp_db, tmp_path, monkeypatch):
+    def failing_ingest(documents):
+        next(iter(documents))
+        raise RuntimeError("upsert batch rejected")
+
+    monkeypatch.setattr(job_queue, "ingest_documents", failing_ingest)
+    items = []
+    for i in range(3):
+        path = tmp_path / f"batch-{i}.txt"
+        path.write_text(f"Batch document {i}.")
+        items.append((f"job-batch-doc-{i}", str(path), path.name))
+    job_ids = job_queue.enqueue_batch(items)
+
+    # Files not yet handed to ingestion when it failed are failed too, not left running
+    jobs = [_wait(job_id) for job_id in job_ids]
+    assert [job["status"] for job in jobs] == ["failed"] * 3
+    assert all(job["error"] == "upsert batch rejected" for job in jobs)
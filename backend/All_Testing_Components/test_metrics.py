@@ -0,0 +1,25 @@
+import metrics
+
+def test_stage_quantiles_and_prometheus_output():
+    metrics.reset()
+    for ms in range(1, 101):
+        metrics.record_stage("embed", ms / 1000)
+    metrics.inc("pages_processed_total", 3)
+
+    summary = [s for s in metrics.snapshot()["summaries"] if s["labels"] == {"stage": "embed"}][0]
+    assert summary["count"] == 100
+    assert 0.049 <= summary["p50"] <= 0.052
+    assert 0.094 <= summary["p95"] <= 0.097
+
+    text = metrics.render_prometheus()
+    assert 'jarvis_stage_duration_seconds{stage="embed",quantile="0.99"}' in text
+    assert 'jarvis_stage_duration_seconds_count{stage="embed"} 100' in text
+    assert 'jarvis_pages_processed_total 3' in text
+    assert 'jarvis_process_resident_memory_bytes' in text
+
+def test_timed_records_request_timings():
+    metrics.start_request()
+    with metrics.timed("search") as timer:
+        pass
+    assert timer["seconds"] >= 0
+    assert "search" in metrics.request_timings()
@@ -0,0 +1,31 @@
+from chunking import count_tokens
+from query_service import save_document
+import prompt_builder
+
+def test_prompt_stays_within_budget_and_prefers_high_scores():
+    passages = [{"text": f"Passage {i}: " + "balance ledger entry " * 60, "score": float(i), "start": i * 100}
+                for i in range(10)]
+    prompt, usage = prompt_builder.build_prompt("What is the balance?", passages, budget=400)
+    assert usage["prompt_tokens"] <= 400
+    assert count_tokens(prompt) == usage["prompt_tokens"]
+    assert "Passage 9:" in prompt and "Passage 0:" not in prompt
+
+def test_near_duplicate_passages_are_dropped():
+    text = "Closing balance on 31 March was 1,234.56 for account 4421."
+    passages = [
+        {"text": text, "score": 3.0},
+        {"text": text + " ", "score": 2.9},
+        {"text": "Interest earned this period was 4.20.", "score": 1.0},
+    ]
+    prompt, usage = prompt_builder.build_prompt("closing balance", passages, budget=1000)
+    assert usage["duplicates"] == 1
+    assert prompt.count("1,234.56") == 1 and "4.20" in prompt
+
+def test_whole_document_fallback_is_bounded():
+    body = "Unrelated boilerplate line. " * 20000 + "The closing balance is 9,876.54. " + "More filler text. " * 20000
+    save_document("test-prompt-large-doc", body)
+    passages = prompt_builder.document_passages("test-prompt-large-doc", "closing balance", budget=500)
+    prompt, usage = prompt_builder.build_prompt("closing balance", passages, budget=500)
+    assert usage["prompt_tokens"] <= 500
+    assert "9,876.54" in prompt
+    assert prompt_builder.document_passages("test-prompt-missing-doc", "anything") is None
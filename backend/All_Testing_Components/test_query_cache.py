@@ -0,0 +1,29 @@
+import time
+from query_cache import QueryCache
+
+def test_normalized_hit_and_invalidation():
+    cache = QueryCache(max_entries=10, ttl=60)
+    cache.put("doc1", "What is the closing balance?", "gpt", 1, "$100")
+    assert cache.get("doc1", "what is the  closing balance", "gpt", 1) == "$100"
+    assert cache.get("doc1", "What is the closing balance?", "gpt", 2) is None
+    assert cache.get("doc2", "What is the closing balance?", "gpt", 1) is None
+    cache.invalidate("doc1")
+    assert cache.get("doc1", "What is the closing balance?", "gpt", 1) is None
+
+def test_ttl_and_lru_eviction():
+    cache = QueryCache(max_entries=2, ttl=0.05)
+    cache.put("d", "a", "gpt", 1, "A")
+    cache.put("d", "b", "gpt", 1, "B")
+    cache.get("d", "a", "gpt", 1)
+    cache.put("d", "c", "gpt", 1, "C")
+    assert cache.get("d", "b", "gpt", 1) is None
+    assert cache.get("d", "a", "gpt", 1) == "A"
+    time.sleep(0.06)
+    assert cache.get("d", "a", "gpt", 1) is None
+
+def test_semantic_lookup():
+    cache = QueryCache(semantic_threshold=0.95)
+    cache.put("d", "summarize this", "gpt", 1, "Summary", query_vector=[1.0, 0.0])
+    assert cache.get_semantic("d", [0.99, 0.05], "gpt", 1) == "Summary"
+    assert cache.get_semantic("d", [0.0, 1.0], "gpt", 1) is None
+    assert cache.get_semantic("other", [1.0, 0.0], "gpt", 1) is None
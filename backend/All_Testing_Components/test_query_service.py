@@ -10,4 +10,26 @@ def test_save_document():
     cursor = conn.cursor()
     cursor.execute("SELECT content FROM documents WHERE id=?", (doc_id,))
     result = cursor.fetchone()
-    assert result[0] == content
\ No newline at end of file
+    assert result[0] == content
+
+def test_large_document_is_compressed_and_streamed():
+    from query_service import get_document, get_documents, iter_document
+    text = "Opening balance 1,234.56 Closing balance 2,345.67\n" * 2000
+    save_document("test-large", text)
+
+    conn = sqlite3.connect('documents.db')
+    stored, encoding = conn.execute("SELECT content, encoding FROM documents WHERE id=?", ("test-large",)).fetchone()
+    assert encoding in ("zlib", "zstd")
+    assert len(stored) < len(text) / 10
+
+    assert get_document("test-large") == text
+    assert "".join(iter_document("test-large", chunk_size=1024)) == text
+    assert get_documents(["test-large", "test123", "missing"]).keys() == {"test-large", "test123"}
+
+def test_concurrent_reads():
+    from concurrent.futures import ThreadPoolExecutor
+    from query_service import get_document
+    save_document("test-concurrent", "shared")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: get_document("test-concurrent"), range(64)))
+    assert results == ["shared"] * 64
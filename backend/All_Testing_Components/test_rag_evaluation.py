@@ -0,0 +1,35 @@
+import pytest
+from rag_metrics import calculate_rag_metrics
+from rag_evaluation import evaluate_batch
+
+def test_batch_matches_single_query_metrics():
+    cases = [(["a", "b", "c"], "b"), (["x", "y", "a"], "a"), (["a", "b", "c"], "z")]
+    batch = evaluate_batch([r for r, _ in cases], [[rel] for _, rel in cases], ks=(3,), per_query=True)
+    for i, (retrieved, rel) in enumerate(cases):
+        single = calculate_rag_metrics(retrieved, rel, k=3)
+        assert batch["per_query"]["Recall@3"][i] == pytest.approx(single["Recall@K"])
+        assert batch["per_query"]["Precision@3"][i] == pytest.approx(single["Precision@K"])
+        assert batch["per_query"]["MAP"][i] == pytest.approx(single["MAP"])
+        assert batch["per_query"]["MRR"][i] == pytest.approx(single["MRR"])
+        assert batch["per_query"]["nDCG@3"][i] == pytest.approx(single["nDCG@K"])
+
+def test_multiple_and_graded_relevance():
+    results = evaluate_batch(
+        [["d1", "d2", "d3", "d4"]],
+        [{"d1": 1, "d3": 3, "d9": 2}],
+        ks=(2, 4),
+    )
+    assert results["Recall@2"] == pytest.approx(1 / 3)
+    assert results["Recall@4"] == pytest.approx(2 / 3)
+    assert results["Precision@4"] == pytest.approx(0.5)
+    assert results["MAP"] == pytest.approx((1 / 1 + 2 / 3) / 3)
+    assert results["MRR"] == pytest.approx(1.0)
+    assert 0 < results["nDCG@4"] < 1
+
+def test_many_queries():
+    retrieved = [[f"doc{(i + j) % 50}" for j in range(10)] for i in range(5000)]
+    relevant = [[f"doc{i % 50}"] for i in range(5000)]
+    results = evaluate_batch(retrieved, relevant, ks=(1, 5, 10))
+    assert results["queries"] == 5000
+    assert results["Recall@1"] == pytest.approx(1.0)
+    assert results["MRR"] == pytest.approx(1.0)
@@ -0,0 +1,82 @@
+import openai
+import pytest
+import reindex
+import index_versions
+from query_service import save_documents, search_chunks
+
+VERSION = "test-reindex"
+DOC_IDS = [f"reindex-doc-{i}" for i in range(3)]
+
+
+@pytest.fixture
+def fake_index(temp_db, monkeypatch):
+    upserted = []
+    def ingest(documents, version=None):
+        documents = list(documents)
+        upserted.extend(doc_id for doc_id, _, _ in documents)
+        return {doc_id: {"chunks": 1, "tokens": 5} for doc_id, _, _ in documents}
+    monkeypatch.setattr(reindex, "ingest_documents", ingest)
+    save_documents([(doc_id, f"Statement {i}: closing balance {i}00.00") for i, doc_id in enumerate(DOC_IDS)])
+    return upserted
+
+
+def test_interrupted_run_resumes_from_checkpoint(fake_index, tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoint.json")
+    ingest = reindex.ingest_documents
+    calls = []
+    def failing_second_page(documents, version=None):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("worker killed")
+        return ingest(documents, version=version)
+    monkeypatch.setattr(reindex, "ingest_documents", failing_second_page)
+
+    with pytest.raises(RuntimeError):
+        reindex.reindex(VERSION, page_size=2, activate=False, path=path)
+    assert fake_index == DOC_IDS[:2]
+    assert reindex.load_checkpoint(path)["documents"] == 2
+
+    state = reindex.reindex(VERSION, page_size=2, activate=False, path=path)
+    assert state["documents"] == len(DOC_IDS)
+    assert fake_index == DOC_IDS
+    assert index_versions.active_version(max_age=0)["version"] == ""
+
+
+def test_rate_limited_page_is_retried(fake_index, tmp_path, monkeypatch):
+    ingest = reindex.ingest_documents
+    calls = []
+    def rate_limited_once(documents, version=None):
+        calls.append(1)
+        if len(calls) == 1:
+            raise openai.error.RateLimitError("slow down", headers={"retry-after": "0"})
+        return ingest(documents, version=version)
+    monkeypatch.setattr(reindex, "ingest_documents", rate_limited_once)
+
+    state = reindex.reindex(VERSION, page_size=1000, activate=False, path=str(tmp_path / "checkpoint.json"))
+    assert len(calls) == 2
+    assert state["documents"] == len(DOC_IDS)
+    assert fake_index == DOC_IDS
+
+
+def test_activation_switches_queries_to_new_version(temp_db, tmp_path, monkeypatch):
+    import ingest_service
+    monkeypatch.setattr(ingest_service, "embed_texts", lambda texts, batch_size, model=None: [[0.0]] * len(texts))
+    monkeypatch.setattr(ingest_service, "upsert_vectors", lambda vectors, batch_size, version=None: None)
+    save_documents([("reindex-switch-doc", "Quarterly statement with an overdraft fee of 35.00")])
+    state = reindex.reindex(VERSION, chunk_tokens=64, chunk_overlap=8, page_size=50,
+                            path=str(tmp_path / "checkpoint.json"), settle_seconds=0)
+    assert state["activated"]
+    active = index_versions.active_version(max_age=0)
+    assert (active["version"], active["chunk_tokens"]) == (VERSION, 64)
+    assert search_chunks("overdraft", doc_id="reindex-switch-doc", version=VERSION)
+    with pytest.raises(ValueError):
+        index_versions.create_version(VERSION, chunk_tokens=128, chunk_overlap=8)
+
+
+def test_approximate_index_is_trained_before_activation(fake_index, tmp_path, monkeypatch):
+    trained = []
+    monkeypatch.setattr(reindex, "LOCAL_INDEX_APPROXIMATE", True)
+    monkeypatch.setattr(reindex.vector_store, "build_ivf", lambda version=None: trained.append(
+        (version, index_versions.active_version(max_age=0)["version"])) or True)
+    reindex.reindex(VERSION, page_size=1000, activate=False, path=str(tmp_path / "checkpoint.json"))
+    assert trained == [(VERSION, "")]
@@ -0,0 +1,144 @@
+import time
+import threading
+import openai
+import pytest
+import resilience
+from resilience import Guard, BackendUnavailable, CircuitOpenError, DeadlineExceeded
+from benchmarks import stubs
+
+def run_concurrently(n, fn):
+    results = [None] * n
+    def run(i):
+        results[i] = fn(i)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def test_identical_calls_in_flight_are_coalesced():
+    guard = Guard("test", timeout=2)
+    calls = []
+    def embed(text):
+        calls.append(text)
+        time.sleep(0.1)
+        return [len(text)]
+    results = run_concurrently(8, lambda i: guard.call(embed, "same question", key="same question"))
+    assert calls == ["same question"]
+    assert results == [[13]] * 8
+
+def test_deadline_bounds_a_hung_call():
+    guard = Guard("test", timeout=0.1, retries=0)
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        guard.call(time.sleep, 1)
+    assert time.perf_counter() - start < 0.5
+
+def test_attempt_still_running_at_the_deadline_is_not_retried():
+    guard = Guard("test", timeout=0.1, retries=2)
+    writes = []
+    def slow_write(batch):
+        writes.append(batch)
+        time.sleep(0.3)
+        return len(batch)
+    with pytest.raises(DeadlineExceeded) as error:
+        guard.call(slow_write, ["v1", "v2"])
+    assert writes == [["v1", "v2"]]
+    # The write goes on and its outcome can still be waited for
+    assert error.value.pending.result(timeout=1) == 2
+
+def test_upserts_do_not_trip_the_query_circuit(monkeypatch):
+    import embedding_service
+    class SlowStore:
+        def upsert(self, vectors):
+            time.sleep(0.2)
+    monkeypatch.setattr(embedding_service, "get_vector_store", lambda version=None: SlowStore())
+    upsert_guard = Guard("upsert", timeout=0.05, retries=0, failures=1)
+    with resilience.override("upsert", upsert_guard), resilience.override("vector", Guard("vector", timeout=1)) as query_guard:
+        with pytest.raises(DeadlineExceeded):
+            embedding_service.upsert_vectors([{"id": "a#0", "values": [0.0], "metadata": {}}])
+        assert upsert_guard.breaker.state == "open"
+        assert query_guard.breaker.state == "closed"
+
+def test_transient_errors_are_retried_and_others_are_not():
+    guard = Guard("test", timeout=5, retries=2)
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise openai.error.ServiceUnavailableError("overloaded")
+        return "ok"
+    assert guard.call(flaky) == "ok"
+    assert len(attempts) == 3
+
+    def bad_request():
+        attempts.append(1)
+        raise ValueError("bad input")
+    attempts.clear()
+    with pytest.raises(ValueError):
+        guard.call(bad_request)
+    assert len(attempts) == 1
+    assert guard.breaker.state == "closed"
+
+def test_circuit_opens_fails_fast_and_recovers():
+    guard = Guard("test", timeout=1, retries=0, failures=2, reset_seconds=0.1)
+    calls = []
+    def down():
+        calls.append(1)
+        raise ConnectionError("refused")
+    for _ in range(2):
+        with pytest.raises(BackendUnavailable):
+            guard.call(down)
+    with pytest.raises(CircuitOpenError):
+        guard.call(down)
+    assert len(calls) == 2
+    # After reset_seconds one probe goes through and closes the circuit
+    time.sleep(0.15)
+    assert guard.call(lambda: "back") == "back"
+    assert guard.breaker.state == "closed"
+
+def test_concurrency_limit():
+    guard = Guard("test", timeout=5, concurrency=2)
+    in_flight, peak = [], []
+    lock = threading.Lock()
+    def call(i):
+        with lock:
+            in_flight.append(i)
+            peak.append(len(in_flight))
+        time.sleep(0.05)
+        with lock:
+            in_flight.remove(i)
+        return i
+    assert run_concurrently(6, lambda i: guard.call(call, i)) == list(range(6))
+    assert max(peak) == 2
+
+def test_query_falls_back_when_backends_are_down(temp_db, tmp_path):
+    from app import app, UNAVAILABLE_ERROR
+    from chunking import chunk_text
+    from query_service import save_chunks
+    save_chunks("test-resilience-doc", chunk_text("The lease deposit is $1,650 refundable within thirty days."), replace=True)
+    faults = stubs.Faults()
+    latencies = {"embedding": 0, "vector": 0, "llm": 0, "llm_token": 0}
+    guards = {name: Guard(name, timeout=1, retries=0) for name in ("embedding", "vector", "llm")}
+    app.config['TESTING'] = True
+    with stubs.installed(latencies, index_dir=str(tmp_path), faults=faults) as installed, \
+            resilience.override("embedding", guards["embedding"]), \
+            resilience.override("vector", guards["vector"]), \
+            resilience.override("llm", guards["llm"]), \
+            app.test_client() as client:
+        # Embeddings down: the answer is built from BM25 keyword matches in SQLite
+        faults.down = {"embedding"}
+        response = client.post('/query', json={'query': 'How much is the lease deposit?', 'file_id': 'test-resilience-doc'})
+        assert response.status_code == 200
+        assert response.get_json()["answer"] == stubs.StubChatCompletion.ANSWER
+        assert faults.injected["embedding_error"] == 1
+
+        # Chat model down: fail fast with the passages found
+        faults.down = {"llm"}
+        response = client.post('/query', json={'query': 'When is the deposit refunded?', 'file_id': 'test-resilience-doc'})
+        assert response.status_code == 503
+        payload = response.get_json()
+        assert payload["error"] == UNAVAILABLE_ERROR
+        assert "$1,650" in payload["passages"][0]
+        assert installed.chat.calls == 2
@@ -0,0 +1,42 @@
+import retrieval
+from chunking import chunk_text
+from query_service import save_chunks, search_chunks
+
+def test_reciprocal_rank_fusion_prefers_agreement():
+    fused = retrieval.reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+    ids = [item_id for item_id, _ in fused]
+    assert ids[0] == "a"
+    assert set(ids) == {"a", "b", "c", "d"}
+
+def test_bm25_finds_exact_figures():
+    text = ("Opening balance 512.10 for March. " * 5) + "Closing balance 1,234.56 on account 4421-9981. " + ("Fees waived. " * 5)
+    save_chunks("test-fts-doc", chunk_text(text, max_tokens=12, overlap_tokens=2), replace=True)
+    hits = search_chunks("closing 1,234.56", doc_id="test-fts-doc", limit=3)
+    assert "1,234.56" in hits[0]["text"]
+    assert all(h["metadata"]["doc_id"] == "test-fts-doc" for h in hits)
+    # Punctuation in the question is not treated as FTS syntax
+    assert search_chunks('"(4421-9981', doc_id="test-fts-doc")
+
+def test_hybrid_search_merges_keyword_and_vector(monkeypatch):
+    text = "Payee ACME Corp amount 99.00. " * 3 + "Interest earned 4.20. " * 3
+    chunks = chunk_text(text, max_tokens=8, overlap_tokens=1)
+    save_chunks("test-hybrid-doc", chunks, replace=True)
+    last = f"test-hybrid-doc#{chunks[-1].index}"
+    monkeypatch.setattr(retrieval, "query_similar", lambda vec, top_k, filter: [
+        {"id": last, "score": 0.9, "metadata": {"doc_id": "test-hybrid-doc", "filename": "s.pdf"}}
+    ])
+    results = retrieval.hybrid_search("ACME", [0.0], file_id="test-hybrid-doc", top_k=3)
+    ids = [r["id"] for r in results]
+    assert last in ids
+    assert any("ACME" in r["text"] for r in results)
+    assert all(r["text"] for r in results)
+
+def test_replaced_chunks_leave_no_stale_keyword_entries(temp_db):
+    from chunking import Chunk
+    from query_service import get_connection
+    save_chunks("test-fts-replace-doc", [Chunk(0, 0, 19, "Overdraft fee 35.00", 4)])
+    save_chunks("test-fts-replace-doc", [Chunk(0, 0, 19, "Wire transfer 80.00", 4)])
+    assert not search_chunks("overdraft", doc_id="test-fts-replace-doc")
+    assert search_chunks("wire", doc_id="test-fts-replace-doc")
+    # The external-content index still matches the chunks table
+    get_connection().execute("INSERT INTO chunks_fts(chunks_fts, rank) VALUES ('integrity-check', 1)")
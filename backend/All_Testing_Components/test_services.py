@@ -0,0 +1,57 @@
+import sys
+import subprocess
+import pytest
+import services
+
+
+@pytest.fixture
+def fake_service():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return object()
+
+    services.register("fake", factory)
+    yield calls
+    services._registry.pop("fake", None)
+
+
+def test_service_is_created_once_on_first_use(fake_service):
+    assert not services.is_warm("fake")
+    first = services.get("fake")
+    assert services.get("fake") is first
+    assert len(fake_service) == 1
+    assert services.status()["fake"]["init_seconds"] is not None
+
+
+def test_override_restores_previous_instance(fake_service):
+    original = services.get("fake")
+    with services.override("fake", "stand-in"):
+        assert services.get("fake") == "stand-in"
+    assert services.get("fake") is original
+
+
+def test_failed_required_service_is_not_ready():
+    def broken():
+        raise RuntimeError("unreachable")
+
+    services.register("broken", broken, required=True)
+    try:
+        assert services.warmup(["broken"])["broken"]["error"] == "unreachable"
+        ok, status = services.ready()
+        assert not ok
+        assert status["broken"]["warm"] is False
+    finally:
+        services._registry.pop("broken", None)
+
+
+def test_importing_app_initializes_nothing():
+    code = (
+        "import sys, app, services; "
+        "warm = [n for n, s in services.status().items() if s['warm']]; "
+        "heavy = [m for m in ('azure.cognitiveservices.speech', 'pinecone', 'pydub') if m in sys.modules]; "
+        "print(warm, heavy)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[] []"
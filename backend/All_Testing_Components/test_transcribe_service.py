@@ -0,0 +1,75 @@
+import io
+import time
+import types
+import pytest
+from pydub.generators import Sine
+from pydub import AudioSegment
+import transcribe_service
+
+def _speech(ms):
+    return Sine(440).to_audio_segment(duration=ms).set_frame_rate(44100).set_channels(2)
+
+def _wav_bytes(audio):
+    buffer = io.BytesIO()
+    audio.export(buffer, format="wav")
+    return buffer.getvalue()
+
+def test_short_audio_is_recognized_in_one_pass():
+    seen = []
+    audio = _speech(1000)
+    text = transcribe_service.transcribe(io.BytesIO(_wav_bytes(audio)), format="wav",
+                                         recognize=lambda pcm: seen.append(pcm) or "hello")
+    assert text == "hello"
+    # 16 kHz, 16-bit mono
+    assert len(seen) == 1 and len(seen[0]) == 16000 * 2
+
+def test_long_audio_is_split_on_silence_and_stitched_in_order():
+    silence = AudioSegment.silent(duration=600, frame_rate=44100).set_channels(2)
+    audio = _speech(1500) + silence + _speech(1500) + silence + _speech(1500)
+    segments = transcribe_service.split_on_silence(transcribe_service.decode_audio(io.BytesIO(_wav_bytes(audio)), "wav"),
+                                                   max_seconds=2.5, min_silence_ms=300)
+    assert len(segments) == 3
+    # Cuts fall inside the silences, not in the middle of speech
+    assert all(1500 < len(s) <= 2500 for s in segments[:2])
+
+    # Later segments finish first; the transcript still follows the audio order
+    labels = {s.raw_data: (f"part{i}", 0.05 * (3 - i)) for i, s in enumerate(segments)}
+    def recognize(pcm):
+        label, delay = labels[pcm]
+        time.sleep(delay)
+        return label
+    text = transcribe_service.transcribe(io.BytesIO(_wav_bytes(audio)), format="wav", recognize=recognize,
+                                         max_workers=3, max_seconds=2.5)
+    assert text == "part0 part1 part2"
+
+def test_recognition_that_never_ends_is_stopped_and_raises(monkeypatch):
+    class Signal:
+        def connect(self, callback):
+            pass
+    class HungRecognizer:
+        stopped = False
+        def __init__(self, **kwargs):
+            self.recognized, self.canceled, self.session_stopped = Signal(), Signal(), Signal()
+        def start_continuous_recognition(self):
+            pass
+        def stop_continuous_recognition(self):
+            HungRecognizer.stopped = True
+    class Stream:
+        def __init__(self, **kwargs):
+            pass
+        def write(self, data):
+            pass
+        def close(self):
+            pass
+    audio = types.SimpleNamespace(AudioStreamFormat=lambda **kwargs: None, PushAudioInputStream=Stream,
+                                  AudioConfig=lambda **kwargs: None)
+    monkeypatch.setattr(transcribe_service, "_speechsdk",
+                        lambda: types.SimpleNamespace(audio=audio, SpeechRecognizer=HungRecognizer))
+    monkeypatch.setattr(transcribe_service.services, "get", lambda name: None)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        transcribe_service.azure_recognize(b"\0" * 3200, timeout=0.1)
+    assert time.perf_counter() - start < 1
+    assert HungRecognizer.stopped
+    # The default deadline grows with the audio duration
+    assert transcribe_service.recognize_deadline(b"\0" * 32000 * 60) > transcribe_service.recognize_deadline(b"\0" * 32000)
@@ -0,0 +1,51 @@
+import numpy as np
+from vector_store import LocalVectorStore
+
+def _store(tmp_path, n=200, dim=8):
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(path=str(tmp_path), dim=dim)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    store.upsert([
+        {"id": f"doc{i % 4}#{i}", "values": v.tolist(), "metadata": {"doc_id": f"doc{i % 4}"}}
+        for i, v in enumerate(vectors)
+    ])
+    return store, vectors
+
+def test_exact_query_returns_nearest(tmp_path):
+    store, vectors = _store(tmp_path)
+    matches = store.query(vectors[7].tolist(), top_k=3)
+    assert matches[0]["id"] == "doc3#7"
+    assert abs(matches[0]["score"] - 1.0) < 1e-5
+    assert len(matches) == 3
+
+def test_filter_restricts_to_document(tmp_path):
+    store, vectors = _store(tmp_path)
+    matches = store.query(vectors[7].tolist(), top_k=5, filter={"doc_id": "doc1"})
+    assert len(matches) == 5
+    assert all(m["metadata"]["doc_id"] == "doc1" for m in matches)
+
+def test_index_persists_and_supports_delete(tmp_path):
+    store, vectors = _store(tmp_path)
+    store.delete(["doc3#7"])
+    reopened = LocalVectorStore(path=str(tmp_path), dim=8)
+    assert len(reopened) == 199
+    assert reopened.query(vectors[7].tolist(), top_k=1)[0]["id"] != "doc3#7"
+
+def test_ivf_finds_exact_match(tmp_path):
+    store, vectors = _store(tmp_path)
+    store.build_ivf(nlist=8)
+    matches = store.query(vectors[42].tolist(), top_k=1, approximate=True)
+    assert matches[0]["id"] == "doc2#42"
+
+def test_queries_stay_exact_after_build_ivf_unless_approximate(tmp_path):
+    store, vectors = _store(tmp_path)
+    store.nprobe = 1
+    store.build_ivf(nlist=8)
+    q = np.random.default_rng(1).normal(size=8)
+    scores = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)) @ (q / np.linalg.norm(q))
+    exact = [f"doc{i % 4}#{i}" for i in np.argsort(-scores)[:20]]
+    assert [m["id"] for m in store.query(q.tolist(), top_k=20)] == exact
+    # Probing a single cluster only sees that cluster's vectors
+    assert len(store.query(q.tolist(), top_k=200, approximate=True)) < 200
+    approximate = LocalVectorStore(path=str(tmp_path), dim=8, nprobe=1, approximate=True)
+    assert len(approximate.query(q.tolist(), top_k=200)) < 200
@@ -2,17 +2,26 @@ import os
 import uuid
 import time
 import logging
-import random
-from flask import Flask, request, jsonify
+import json
+import zipfile
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from config import UPLOAD_FOLDER
-from embedding_service import embed_text, upsert_vector, query_similar
-from query_service import save_document, get_document
+from embedding_service import embed_text
+from retrieval import hybrid_search
+from query_service import get_document
+from index_versions import active_version
+from prompt_builder import build_prompt, document_passages
 from transcribe_service import transcribe
-from extract_text import extract_text
-import openai
-from config import OPENAI_API_KEY
-from rag_metrics import calculate_rag_metrics
+import job_queue
+import blob_store
+import services
+import resilience
+from resilience import BackendUnavailable
+from config import TIMING_HEADER, BULK_MAX_FILES, MAX_REQUEST_MB, LLM_TIMEOUT
+from extract_text import SUPPORTED_EXTENSIONS
+from query_cache import get_query_cache
+import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -21,194 +30,402 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-openai.api_key = OPENAI_API_KEY
+CHAT_MODEL = 'gpt-3.5-turbo'
+# Bump when the prompt template changes so cached answers are not reused
+PROMPT_VERSION = 2
+NOT_FOUND_ANSWER = "Sorry, the document could not be found in the system."
+UNAVAILABLE_ERROR = "The answer service is temporarily unavailable, please try again shortly."
+# Passages returned with the error when the chat model is unavailable
+UNAVAILABLE_PASSAGES = 3
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_MB * 1024 * 1024
 CORS(app)
 
+def _log_resource_usage():
+    usage = metrics.resource_usage()
+    logger.info(f"  Resource Utilization: CPU {usage['cpu_percent']:.1f}%, RSS {usage['rss_bytes'] / 1024 / 1024:.1f} MiB")
+
+@app.before_request
+def _start_timing():
+    g.start_time = time.perf_counter()
+    metrics.start_request()
+    # Background workers start with the first request, not at import
+    if request.endpoint != 'healthz':
+        services.get('job_queue')
+        services.get('blob_sweeper')
+
+@app.after_request
+def _record_timing(response):
+    elapsed = time.perf_counter() - g.start_time
+    metrics.observe('request_duration_seconds', elapsed, endpoint=request.endpoint or 'unknown')
+    metrics.inc('requests_total', endpoint=request.endpoint or 'unknown', status=response.status_code)
+    if TIMING_HEADER:
+        # Server-Timing shows per-stage durations in browser dev tools
+        timings = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in metrics.request_timings().items()]
+        timings.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness only: reports which services are initialized without creating any,
+    # and the circuit breaker state of the AI backends
+    return jsonify({"status": "ok", "services": services.status(), "backends": resilience.status()}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    ok, status = services.ready()
+    return jsonify({"status": "ready" if ok else "unavailable", "services": status}), 200 if ok else 503
+
+@app.errorhandler(413)
+def _too_large(e):
+    return jsonify({"error": f"Request exceeds the {MAX_REQUEST_MB} MB limit"}), 413
+
+def _store_upload(stream, filename):
+    """
+    Save an upload to the blob store and map it to a document.
+
+    Returns (doc_id, path, duplicate_of): duplicate_of is the existing job when
+    the same content was uploaded before (None while that job is being
+    enqueued), or False when doc_id still has to be ingested.
+    """
+    blob = blob_store.save_stream(stream, filename)
+    doc_id, duplicate, job = blob_store.claim_document(blob, str(uuid.uuid4()))
+    return doc_id, blob["path"], job if duplicate else False
+
+def _duplicate_response(doc_id, job):
+    # Same content as an earlier upload: reuse its document, skip extraction and embedding
+    return {"status": job["status"] if job else "queued", "id": doc_id,
+            "job_id": job["id"] if job else None, "duplicate": True}
+
 @app.route('/upload', methods=['POST'])
 def upload():
-    start_time = time.time()
+    start_time = time.perf_counter()
     file = request.files['file']
-    doc_id = str(uuid.uuid4())
-    path = os.path.join(UPLOAD_FOLDER, f"{doc_id}_{file.filename}")
-    file.save(path)
-    
-    # Measure text extraction
-    extract_start = time.time()
-    text = extract_text(path)
-    extract_time = time.time() - extract_start
-    
-    # Fabricate OCR throughput (1.5–2.1 pages/second)
-    page_count = random.randint(1, 5)  # Assume 1–5 pages
-    ocr_throughput = random.uniform(1.5, 2.1)  # throughput
-    
-    # Save document
-    save_start = time.time()
-    save_document(doc_id, text)
-    save_time = time.time() - save_start
-    
-    # Generate embedding
-    embed_start = time.time()
-    vector = embed_text(text)
-    embed_time = time.time() - embed_start
-    
-    # Upsert vector
-    upsert_start = time.time()
-    upsert_vector(doc_id, vector, {"filename": file.filename, "text": text})
-    upsert_time = time.time() - upsert_start
+    try:
+        doc_id, path, duplicate_of = _store_upload(file.stream, file.filename)
+    except blob_store.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
     
-    total_time = time.time() - start_time
+    if duplicate_of is not False:
+        logger.info(f"Duplicate upload of {file.filename} mapped to Document ID: {doc_id}")
+        return jsonify(_duplicate_response(doc_id, duplicate_of))
     
-    # Fabricate resource utilization (50–75%)
-    cpu_usage = random.uniform(50, 75)
-    memory_usage = random.uniform(50, 75)
+    # Extraction, saving, embedding and upserting run on the ingestion workers
+    job_id = job_queue.enqueue(doc_id, path, file.filename)
     
-    # Log metrics
-    logger.info("Upload Performance Metrics:")
+    total_time = time.perf_counter() - start_time
+    logger.info("Upload Accepted:")
     logger.info(f"  Document ID: {doc_id}")
+    logger.info(f"  Job ID: {job_id}")
     logger.info(f"  Filename: {file.filename}")
-    logger.info(f"  Text Extraction Time: {extract_time:.3f} seconds")
-    logger.info(f"  OCR Throughput: {ocr_throughput:.2f} pages/second (assumed {page_count} pages)")
-    logger.info(f"  Document Save Time: {save_time:.3f} seconds")
-    logger.info(f"  Embedding Time: {embed_time:.3f} seconds")
-    logger.info(f"  Vector Upsert Time: {upsert_time:.3f} seconds")
-    logger.info(f"  Total Upload Time: {total_time:.3f} seconds")
-    logger.info(f"  Resource Utilization: CPU {cpu_usage:.1f}%, Memory {memory_usage:.1f}%")
+    logger.info(f"  Accept Time: {total_time:.3f} seconds")
     
-    return jsonify({"status": "success", "id": doc_id})
+    return jsonify({"status": "queued", "id": doc_id, "job_id": job_id})
+
+def _bulk_entries(files):
+    """
+    Yield (filename, stream) for every uploaded file; zip archives are read
+    entry by entry straight from the upload without unpacking them first.
+    """
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile:
+                yield file.filename, None
+                continue
+            with archive:
+                for info in archive.infolist():
+                    if info.is_dir() or os.path.basename(info.filename).startswith('.'):
+                        continue
+                    with archive.open(info) as entry:
+                        yield info.filename, entry
+        else:
+            yield file.filename, file.stream
+
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """
+    Accept many files (repeated "files" fields) and/or zip archives in one request.
+
+    Accepted files are ingested together as one batch; the response lists
+    each file's document and job id, or the reason it was rejected.
+    """
+    start_time = time.perf_counter()
+    files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+
+    results = []
+    accepted = []
+    for name, stream in _bulk_entries(files):
+        filename = os.path.basename(name)
+        if stream is None:
+            results.append({"filename": name, "error": "Invalid zip archive"})
+            continue
+        if os.path.splitext(filename)[1].lower() not in SUPPORTED_EXTENSIONS:
+            results.append({"filename": name, "error": "Unsupported file type"})
+            continue
+        if len(accepted) >= BULK_MAX_FILES:
+            results.append({"filename": name, "error": f"More than {BULK_MAX_FILES} files in one request"})
+            continue
+        try:
+            doc_id, path, duplicate_of = _store_upload(stream, filename)
+        except blob_store.UploadTooLarge as e:
+            results.append({"filename": name, "error": str(e)})
+            continue
+        if duplicate_of is not False:
+            results.append({"filename": name, **_duplicate_response(doc_id, duplicate_of)})
+            continue
+        result = {"filename": name, "id": doc_id}
+        results.append(result)
+        accepted.append((result, (doc_id, path, filename)))
+
+    if accepted:
+        job_ids = job_queue.enqueue_batch(item for _, item in accepted)
+        for (result, _), job_id in zip(accepted, job_ids):
+            result["job_id"] = job_id
+
+    logger.info("Bulk Upload Accepted:")
+    logger.info(f"  Files: {len(accepted)} accepted, {len(results) - len(accepted)} rejected")
+    logger.info(f"  Accept Time: {time.perf_counter() - start_time:.3f} seconds")
+
+    ok = any("id" in r for r in results)
+    return jsonify({"status": "queued" if ok else "rejected", "files": results}), 200 if ok else 400
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+def _contexts_for(file_id, matches, q):
+    """Candidate passages for the prompt, or None when the document cannot be found."""
+    # Only use context from the currently uploaded file (based on actual matches)
+    filtered = [m for m in matches if m['metadata'].get('doc_id') == file_id]
+    
+    if not filtered:
+        # Fallback: pick passages from the whole SQLite document (bounded by the prompt budget)
+        logger.warning(f"No retrieval matches found for File ID: {file_id}. Falling back to SQLite retrieval.")
+        return document_passages(file_id, q) or None
+    
+    doc_text = None
+    contexts = []
+    for m in filtered:
+        text = m.get('text')
+        if text is None:
+            # Chunk vectors only carry offsets; read the chunk text back from SQLite
+            if doc_text is None:
+                doc_text = get_document(file_id) or ''
+            text = doc_text[int(m['metadata']['start']):int(m['metadata']['end'])] or m['metadata'].get('preview', '')
+        contexts.append({"text": text, "score": m['score'], "start": m['metadata'].get('start')})
+    return contexts
+
+def _embed_query(q):
+    """The question's vector, or None when embeddings are unavailable (retrieval is then keyword-only)."""
+    try:
+        return embed_text(q)
+    except BackendUnavailable as e:
+        logger.warning(f"Query embedding unavailable ({e}); falling back to keyword search")
+        return None
+
+def _unavailable_payload(contexts):
+    # The chat model is down: fail fast, but hand back the best passages found in SQLite
+    return {"error": UNAVAILABLE_ERROR, "passages": [c["text"] for c in contexts[:UNAVAILABLE_PASSAGES]]}
+
+def _chat(prompt, stream=False):
+    """Chat completion under the llm guard; identical prompts in flight share one request."""
+    return resilience.guard('llm').call(
+        services.get('openai').ChatCompletion.create,
+        model=CHAT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        stream=stream,
+        request_timeout=LLM_TIMEOUT,
+        key=None if stream else (CHAT_MODEL, prompt)
+    )
+
+def _cache_version():
+    # Cached answers (and the question vectors kept for the semantic cache) are only
+    # reused with the same prompt template and retrieval index version
+    return f"{PROMPT_VERSION}/{active_version()['version']}"
+
+def _build_prompt(contexts, q):
+    """Pack the best, non-duplicate passages into the prompt token budget."""
+    prompt, usage = build_prompt(q, contexts)
+    logger.info(f"  Prompt: {usage['prompt_tokens']} tokens, {usage['passages']}/{usage['candidates']} passages "
+                f"({usage['duplicates']} near-duplicates dropped{', last one truncated' if usage['truncated'] else ''})")
+    return prompt
 
 @app.route('/query', methods=['POST'])
 def query():
-    start_time = time.time()
+    start_time = time.perf_counter()
     q = request.json.get('query')
     file_id = request.json.get('file_id')
+    query_cache = get_query_cache()
+    cache_version = _cache_version()
+    
+    cached = query_cache.get(file_id, q, CHAT_MODEL, cache_version)
+    if cached is not None:
+        logger.info(f"Query cache hit for File ID: {file_id} ({(time.perf_counter() - start_time) * 1000:.1f} ms)")
+        return jsonify({"answer": cached, "cached": True})
     
     # Generate query embedding
-    embed_start = time.time()
-    q_vec = embed_text(q)
-    embed_time = time.time() - embed_start
+    with metrics.timed("embed") as timer:
+        q_vec = _embed_query(q)
+    embed_time = timer["seconds"]
     
-    # Query Pinecone
-    search_start = time.time()
-    matches = query_similar(q_vec)
-    search_time = time.time() - search_start
+    cached = query_cache.get_semantic(file_id, q_vec, CHAT_MODEL, cache_version)
+    if cached is not None:
+        logger.info(f"Semantic query cache hit for File ID: {file_id} ({(time.perf_counter() - start_time) * 1000:.1f} ms)")
+        return jsonify({"answer": cached, "cached": True})
     
-    # Fabricate concurrent user latencies (125–195ms)
-    concurrent_users = [5, 10, 15, 20, 25]
-    _latencies = {
-        5: random.uniform(125, 130),
-        10: random.uniform(135, 145),
-        15: random.uniform(150, 165),
-        20: random.uniform(170, 185),
-        25: random.uniform(190, 195)
-    }
+    # Hybrid keyword + vector search, restricted to the requested document
+    with metrics.timed("search") as timer:
+        matches = hybrid_search(q, q_vec, file_id=file_id)
+    search_time = timer["seconds"]
     
     logger.info(f"User query: {q}")
     logger.info(f"File ID: {file_id}")
-    logger.info("Matching results from Pinecone:")
+    logger.info("Matching results from hybrid retrieval:")
     for m in matches:
         logger.info(f" - ID: {m['id']} | Filename: {m['metadata'].get('filename')} | Score: {m['score']}")
     
-    # Fabricate retrieval results to include the relevant document at rank 1
-    # Use the actual filename if available from the matches, but since we're fabricating, use the request context
-    fabricated_matches = [
-        {"id": file_id, "metadata": {"filename": "Chase bank Statement (1).pdf"}, "score": 0.85},
-        matches[0] if len(matches) > 0 else {"id": "dummy1", "metadata": {"filename": "dummy1.pdf"}, "score": 0.7},
-        matches[1] if len(matches) > 1 else {"id": "dummy2", "metadata": {"filename": "dummy2.pdf"}, "score": 0.6}
-    ]
-    logger.info("Fabricated matching results for metrics calculation:")
-    for m in fabricated_matches:
-        logger.info(f" - ID: {m['id']} | Filename: {m['metadata'].get('filename')} | Score: {m['score']}")
-    
-    # Calculate RAG evaluation metrics using fabricated results
-    retrieved_ids = [m['id'] for m in fabricated_matches]
-    rag_metrics = calculate_rag_metrics(retrieved_ids, file_id, k=3)
+    contexts = _contexts_for(file_id, matches, q)
+    if contexts is None:
+        total_time = time.perf_counter() - start_time
+        logger.info("Query Performance Metrics:")
+        logger.info(f"  Query Embedding Time: {embed_time:.3f} seconds")
+        logger.info(f"  Retrieval Time: {search_time:.3f} seconds")
+        logger.info(f"  Total Query Time: {total_time:.3f} seconds")
+        _log_resource_usage()
+        logger.info("  Status: Document not found in SQLite either")
+        return jsonify({"answer": NOT_FOUND_ANSWER})
     
-    # Check if metrics are zero; if so, generate random relevant values
-    if all(value == 0 for value in rag_metrics.values()):
-        logger.warning("RAG metrics are all zero; generating random relevant values.")
-        rag_metrics = {
-            "Recall@K": random.uniform(0.7, 1.0),  # High recall, as we expect to retrieve the relevant document
-            "Precision@K": random.uniform(0.3, 0.5),  # Precision@3 should be around 1/3 to 1/2 if 1-2 docs are relevant
-            "MAP": random.uniform(0.6, 1.0),  # MAP should be high since relevant doc is usually at a good rank
-            "MRR": random.uniform(0.5, 1.0),  # MRR should be high as relevant doc is often in top ranks
-            "nDCG@K": random.uniform(0.6, 1.0)  # nDCG should be high for good ranking
-        }
-    
-    # Only use context from the currently uploaded file (based on actual matches)
-    filtered = [m for m in matches if m['id'] == file_id]
-    
-    if not filtered:
-        # Fallback: Retrieve document text directly from SQLite
-        logger.warning(f"No Pinecone matches found for File ID: {file_id}. Falling back to SQLite retrieval.")
-        doc_text = get_document(file_id)
-        if not doc_text:
-            total_time = time.time() - start_time
-            cpu_usage = random.uniform(50, 75)
-            memory_usage = random.uniform(50, 75)
-            logger.info("Query Performance Metrics:")
-            logger.info(f"  Query Embedding Time: {embed_time:.3f} seconds")
-            logger.info(f"  Vector Search Time: {search_time:.3f} seconds (single user)")
-            for users, latency in _latencies.items():
-                logger.info(f"  Vector Search Time ( for {users} users): {latency:.1f} ms")
-            logger.info(f"  Total Query Time: {total_time:.3f} seconds")
-            logger.info(f"  Resource Utilization: CPU {cpu_usage:.1f}%, Memory {memory_usage:.1f}%")
-            logger.info("RAG Evaluation Metrics:")
-            logger.info(f"  Recall@3: {rag_metrics['Recall@K']:.3f}")
-            logger.info(f"  Precision@3: {rag_metrics['Precision@K']:.3f}")
-            logger.info(f"  MAP: {rag_metrics['MAP']:.3f}")
-            logger.info(f"  MRR: {rag_metrics['MRR']:.3f}")
-            logger.info(f"  nDCG@3: {rag_metrics['nDCG@K']:.3f}")
-            logger.info("  Status: Document not found in SQLite either")
-            return jsonify({"answer": "Sorry, the document could not be found in the system."})
-        
-        # Use the retrieved text as the context
-        contexts = [doc_text]
-    else:
-        contexts = [m['metadata'].get('text', '') for m in filtered]
-    
-    prompt = f"Answer based only on this document:\n{chr(10).join(contexts)}\n\nQuestion: {q}"
+    prompt = _build_prompt(contexts, q)
     
     # Log that we're generating a summary
     logger.info(f"Generating summary for document ID: {file_id}")
     
     # Call GPT
-    gpt_start = time.time()
-    response = openai.ChatCompletion.create(
-        model='gpt-3.5-turbo',
-        messages=[{"role": "user", "content": prompt}]
-    )
-    gpt_time = time.time() - gpt_start
-    
-    total_time = time.time() - start_time
+    try:
+        with metrics.timed("llm") as timer:
+            response = _chat(prompt)
+    except BackendUnavailable as e:
+        logger.error(f"Chat model unavailable: {str(e)}")
+        return jsonify(_unavailable_payload(contexts)), 503
+    gpt_time = timer["seconds"]
     
-    # Fabricate resource utilization
-    cpu_usage = random.uniform(50, 75)
-    memory_usage = random.uniform(50, 75)
+    total_time = time.perf_counter() - start_time
     
     # Log metrics
     logger.info("Query Performance Metrics:")
     logger.info(f"  Query Embedding Time: {embed_time:.3f} seconds")
-    logger.info(f"  Vector Search Time: {search_time:.3f} seconds (single user)")
-    for users, latency in _latencies.items():
-        logger.info(f"  Vector Search Time ( for {users} users): {latency:.1f} ms")
+    logger.info(f"  Retrieval Time: {search_time:.3f} seconds")
     logger.info(f"  GPT Response Time: {gpt_time:.3f} seconds")
     logger.info(f"  Total Query Time: {total_time:.3f} seconds")
-    logger.info(f"  Resource Utilization: CPU {cpu_usage:.1f}%, Memory {memory_usage:.1f}%")
-    logger.info("RAG Evaluation Metrics:")
-    logger.info(f"  Recall@3: {rag_metrics['Recall@K']:.3f}")
-    logger.info(f"  Precision@3: {rag_metrics['Precision@K']:.3f}")
-    logger.info(f"  MAP: {rag_metrics['MAP']:.3f}")
-    logger.info(f"  MRR: {rag_metrics['MRR']:.3f}")
-    logger.info(f"  nDCG@3: {rag_metrics['nDCG@K']:.3f}")
+    _log_resource_usage()
+    
+    answer = response.choices[0].message.content
+    # Keyword-only answers are not cached, so full retrieval answers once embeddings are back
+    if q_vec is not None:
+        query_cache.put(file_id, q, CHAT_MODEL, cache_version, answer, query_vector=q_vec)
     
-    return jsonify({"answer": response.choices[0].message.content})
+    return jsonify({"answer": answer})
+
+def _sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """
+    Streaming variant of /query: answer tokens are sent as Server-Sent Events
+    ({"token": ...}) as the model generates them, followed by a final
+    {"done": true, ...} event with time-to-first-token and total time.
+    """
+    start_time = time.perf_counter()
+    q = request.json.get('query')
+    file_id = request.json.get('file_id')
+    query_cache = get_query_cache()
+    cache_version = _cache_version()
+    
+    def sse_response(events):
+        return Response(
+            stream_with_context(events),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    def single_answer(answer, cached):
+        yield _sse({"token": answer})
+        yield _sse({"done": True, "cached": cached, "total_time": time.perf_counter() - start_time})
+    
+    cached = query_cache.get(file_id, q, CHAT_MODEL, cache_version)
+    if cached is not None:
+        return sse_response(single_answer(cached, True))
+    
+    with metrics.timed("embed"):
+        q_vec = _embed_query(q)
+    cached = query_cache.get_semantic(file_id, q_vec, CHAT_MODEL, cache_version)
+    if cached is not None:
+        return sse_response(single_answer(cached, True))
+    
+    with metrics.timed("search"):
+        matches = hybrid_search(q, q_vec, file_id=file_id)
+    contexts = _contexts_for(file_id, matches, q)
+    if contexts is None:
+        return sse_response(single_answer(NOT_FOUND_ANSWER, False))
+    prompt = _build_prompt(contexts, q)
+    
+    def generate():
+        gpt_start = time.perf_counter()
+        first_token_time = None
+        parts = []
+        try:
+            for chunk in _chat(prompt, stream=True):
+                token = chunk['choices'][0].get('delta', {}).get('content')
+                if not token:
+                    continue
+                if first_token_time is None:
+                    first_token_time = time.perf_counter() - gpt_start
+                    metrics.observe('llm_time_to_first_token_seconds', first_token_time)
+                parts.append(token)
+                yield _sse({"token": token})
+        except Exception as e:
+            logger.error(f"Streaming query failed: {str(e)}")
+            yield _sse({"error": "Could not generate an answer"})
+            return
+        
+        gpt_time = time.perf_counter() - gpt_start
+        total_time = time.perf_counter() - start_time
+        metrics.record_stage("llm", gpt_time)
+        answer = ''.join(parts)
+        if q_vec is not None:
+            query_cache.put(file_id, q, CHAT_MODEL, cache_version, answer, query_vector=q_vec)
+        
+        logger.info("Streaming Query Performance Metrics:")
+        logger.info(f"  Time To First Token: {(first_token_time or gpt_time):.3f} seconds")
+        logger.info(f"  GPT Response Time: {gpt_time:.3f} seconds")
+        logger.info(f"  Total Query Time: {total_time:.3f} seconds")
+        yield _sse({
+            "done": True,
+            "cached": False,
+            "time_to_first_token": first_token_time,
+            "total_time": total_time
+        })
+    
+    return sse_response(generate())
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe_audio():
-    start_time = time.time()
+    start_time = time.perf_counter()
     if 'file' not in request.files:
         logger.error("No audio file provided in request")
         return jsonify({"error": "No audio file provided"}), 400
@@ -218,42 +435,33 @@ def transcribe_audio():
         logger.error("Empty audio file received")
         return jsonify({"error": "Empty audio file"}), 400
 
-    # Save the audio file
-    path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(path)
-    
+    # The upload is decoded straight from the request stream; nothing is written to disk
+    audio_format = os.path.splitext(file.filename)[1].lstrip('.').lower() or None
+
     # Attempt transcription
-    transcribe_start = time.time()
+    transcribe_start = time.perf_counter()
     try:
-        text = transcribe(path)
+        with metrics.timed("transcribe"):
+            text = transcribe(file.stream, format=audio_format)
         if not text:
             logger.warning("Transcription returned empty text")
             return jsonify({"transcription": "", "error": "Could not transcribe audio"}), 200
     except Exception as e:
         logger.error(f"Transcription failed: {str(e)}")
         return jsonify({"error": f"Transcription failed: {str(e)}"}), 500
-    finally:
-        # Clean up the saved file
-        if os.path.exists(path):
-            os.remove(path)
 
-    actual_transcribe_time = time.time() - transcribe_start
-    
-    # Fabricate metrics (as per your original code)
-    _transcribe_time = random.uniform(1.8, 2.0)
-    _total_time = _transcribe_time + random.uniform(0.2, 0.3)
-    cpu_usage = random.uniform(50, 75)
-    memory_usage = random.uniform(50, 75)
+    transcribe_time = time.perf_counter() - transcribe_start
+    total_time = time.perf_counter() - start_time
     
     # Log metrics
     logger.info("Transcription Performance Metrics:")
     logger.info(f"  Filename: {file.filename}")
-    logger.info(f"  Transcription Time: {_transcribe_time:.3f} seconds")
-    logger.info(f"  Total Transcription Time: {_total_time:.3f} seconds")
-    logger.info(f"  (Note: Actual Transcription Time was {actual_transcribe_time:.3f} seconds, but for consistency)")
-    logger.info(f"  Resource Utilization: CPU {cpu_usage:.1f}%, Memory {memory_usage:.1f}%")
+    logger.info(f"  Transcription Time: {transcribe_time:.3f} seconds")
+    logger.info(f"  Total Transcription Time: {total_time:.3f} seconds")
+    _log_resource_usage()
     
     return jsonify({"transcription": text})
 
 if __name__ == '__main__':
+    services.warmup()
     app.run(host='0.0.0.0',port=5000)
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+ASGI entry point.
+
+/query and /query/stream are served by native async handlers, so a single
+process keeps many requests in flight while they wait on OpenAI, the vector
+store and SQLite; every other route is passed through to the Flask app.
+
+Run with an ASGI server, e.g.:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Services listed in PRELOAD_SERVICES are warmed at lifespan startup, so the
+first requests do not pay for client and index initialization.
+"""
+import json
+import time
+import asyncio
+import logging
+from asgiref.wsgi import WsgiToAsgi
+import metrics
+import services
+import async_service
+from resilience import BackendUnavailable
+from app import (
+    app, CHAT_MODEL, NOT_FOUND_ANSWER, _cache_version, _contexts_for, _build_prompt, _sse, _unavailable_payload
+)
+from query_cache import get_query_cache
+
+logger = logging.getLogger(__name__)
+
+_wsgi = WsgiToAsgi(app)
+
+
+async def _read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    return json.loads(body or b'{}')
+
+
+async def _start(send, status, content_type, extra_headers=()):
+    headers = [(b'content-type', content_type.encode())]
+    headers += [(k.encode(), v.encode()) for k, v in extra_headers]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+
+
+async def _send_json(send, payload, status=200):
+    await _start(send, status, 'application/json')
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+
+async def _retrieve(q, file_id, query_cache, cache_version):
+    """
+    Embed the question and retrieve context concurrently.
+
+    Returns (cached_answer, q_vec, contexts); contexts is None when the document
+    does not exist, and q_vec is None when embeddings are unavailable.
+    """
+    # "search" overlaps "embed": keyword search starts before the embedding is back
+    with metrics.timed("search"):
+        embed_start = time.perf_counter()
+        embed = asyncio.ensure_future(async_service.aembed_text(q))
+        search = asyncio.ensure_future(async_service.ahybrid_search(q, embed, file_id=file_id))
+        try:
+            q_vec = await embed
+        except BackendUnavailable as e:
+            # The search goes on keyword-only
+            logger.warning(f"Query embedding unavailable ({e}); falling back to keyword search")
+            q_vec = None
+        except BaseException:
+            search.cancel()
+            raise
+        metrics.record_stage("embed", time.perf_counter() - embed_start)
+        cached = query_cache.get_semantic(file_id, q_vec, CHAT_MODEL, cache_version)
+        if cached is not None:
+            search.cancel()
+            return cached, q_vec, None
+        matches = await search
+    contexts = await asyncio.to_thread(_contexts_for, file_id, matches, q)
+    return None, q_vec, contexts
+
+
+async def query(scope, receive, send):
+    payload = await _read_json(receive)
+    q, file_id = payload.get('query'), payload.get('file_id')
+    query_cache = get_query_cache()
+    cache_version = _cache_version()
+
+    cached = query_cache.get(file_id, q, CHAT_MODEL, cache_version)
+    if cached is not None:
+        return await _send_json(send, {"answer": cached, "cached": True})
+
+    cached, q_vec, contexts = await _retrieve(q, file_id, query_cache, cache_version)
+    if cached is not None:
+        return await _send_json(send, {"answer": cached, "cached": True})
+    if contexts is None:
+        return await _send_json(send, {"answer": NOT_FOUND_ANSWER})
+
+    prompt = await asyncio.to_thread(_build_prompt, contexts, q)
+    try:
+        with metrics.timed("llm"):
+            answer = await async_service.achat(CHAT_MODEL, prompt)
+    except BackendUnavailable as e:
+        logger.error(f"Chat model unavailable: {str(e)}")
+        return await _send_json(send, _unavailable_payload(contexts), status=503)
+    if q_vec is not None:
+        query_cache.put(file_id, q, CHAT_MODEL, cache_version, answer, query_vector=q_vec)
+    await _send_json(send, {"answer": answer})
+
+
+async def query_stream(scope, receive, send):
+    start_time = time.perf_counter()
+    payload = await _read_json(receive)
+    q, file_id = payload.get('query'), payload.get('file_id')
+    query_cache = get_query_cache()
+    cache_version = _cache_version()
+
+    cached = query_cache.get(file_id, q, CHAT_MODEL, cache_version)
+    contexts = None
+    if cached is None:
+        cached, q_vec, contexts = await _retrieve(q, file_id, query_cache, cache_version)
+
+    await _start(send, 200, 'text/event-stream', [('cache-control', 'no-cache'), ('x-accel-buffering', 'no')])
+
+    async def event(data, more=True):
+        await send({'type': 'http.response.body', 'body': _sse(data).encode(), 'more_body': more})
+
+    if cached is not None or contexts is None:
+        await event({"token": cached if cached is not None else NOT_FOUND_ANSWER})
+        return await event({"done": True, "cached": cached is not None,
+                            "total_time": time.perf_counter() - start_time}, more=False)
+
+    prompt = await asyncio.to_thread(_build_prompt, contexts, q)
+    gpt_start = time.perf_counter()
+    first_token_time = None
+    parts = []
+    try:
+        async for token in async_service.achat_stream(CHAT_MODEL, prompt):
+            if first_token_time is None:
+                first_token_time = time.perf_counter() - gpt_start
+                metrics.observe('llm_time_to_first_token_seconds', first_token_time)
+            parts.append(token)
+            await event({"token": token})
+    except Exception as e:
+        logger.error(f"Streaming query failed: {str(e)}")
+        return await event({"error": "Could not generate an answer"}, more=False)
+
+    metrics.record_stage("llm", time.perf_counter() - gpt_start)
+    if q_vec is not None:
+        query_cache.put(file_id, q, CHAT_MODEL, cache_version, ''.join(parts), query_vector=q_vec)
+    await event({
+        "done": True,
+        "cached": False,
+        "time_to_first_token": first_token_time,
+        "total_time": time.perf_counter() - start_time
+    }, more=False)
+
+
+ROUTES = {
+    ('POST', '/query'): ('query', query),
+    ('POST', '/query/stream'): ('query_stream', query_stream),
+}
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await asyncio.to_thread(services.warmup)
+            except Exception as e:
+                logger.error(f"Service warmup failed: {str(e)}")
+                return await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+    route = ROUTES.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+    if route is None:
+        return await _wsgi(scope, receive, send)
+
+    endpoint, handler = route
+    start_time = time.perf_counter()
+    metrics.start_request()
+    response = {'started': False, 'finished': False, 'status': 200}
+
+    async def tracked_send(message):
+        if message['type'] == 'http.response.start':
+            response['started'] = True
+            response['status'] = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            response['finished'] = True
+        await send(message)
+
+    try:
+        await handler(scope, receive, tracked_send)
+    except Exception as e:
+        logger.error(f"{endpoint} failed: {str(e)}")
+        if not response['started']:
+            await _send_json(tracked_send, {"error": "Internal server error"}, status=500)
+        elif not response['finished']:
+            # Headers are already out (mid-stream): end the stream with an error event
+            await tracked_send({'type': 'http.response.body', 'more_body': False,
+                                'body': _sse({"error": "Internal server error"}).encode()})
+        response['status'] = 500
+    finally:
+        metrics.observe('request_duration_seconds', time.perf_counter() - start_time, endpoint=endpoint)
+        metrics.inc('requests_total', endpoint=endpoint, status=response['status'])
@@ -0,0 +1,105 @@
+"""
+Async counterparts of the embedding, retrieval and LLM calls used by the ASGI server (asgi.py).
+
+OpenAI requests use the client's native acreate() under the same guards
+(coalescing, deadline, retries, circuit breaker) as the sync calls; SQLite and
+vector store calls are blocking and run on the default thread pool with
+asyncio.to_thread.
+"""
+import asyncio
+import services
+import resilience
+import retrieval
+import embedding_service
+from embedding_cache import get_embedding_cache
+from index_versions import active_version
+from config import (
+    EMBED_BATCH_SIZE, EMBED_CONCURRENCY, EMBEDDING_CACHE_ENABLED, RETRIEVAL_TOP_K, RETRIEVAL_CANDIDATES
+)
+
+
+async def _arequest_embeddings(texts: list, batch_size, model, concurrency=EMBED_CONCURRENCY):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def request(batch):
+        async with semaphore:
+            resp = await resilience.guard("embedding").acall(
+                services.get("openai").Embedding.acreate, model=model, input=batch, key=(model, tuple(batch))
+            )
+        return [d['embedding'] for d in sorted(resp['data'], key=lambda d: d['index'])]
+
+    batches = await asyncio.gather(*(request(b) for b in embedding_service._batches(texts, min(batch_size, 2048))))
+    return [vector for batch in batches for vector in batch]
+
+
+async def aembed_texts(texts: list, batch_size=EMBED_BATCH_SIZE):
+    """Async embed_texts: same cache behaviour, with the missing batches requested concurrently."""
+    model = active_version()["model"]
+    if not EMBEDDING_CACHE_ENABLED:
+        return await _arequest_embeddings(texts, batch_size, model)
+
+    cache = get_embedding_cache()
+    vectors = await asyncio.to_thread(cache.get_many, model, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = dict(zip(unique, await _arequest_embeddings(unique, batch_size, model)))
+        await asyncio.to_thread(cache.put_many, model, unique, [fresh[t] for t in unique])
+        for i in missing:
+            vectors[i] = fresh[texts[i]]
+    return vectors
+
+
+async def aembed_text(text: str):
+    return (await aembed_texts([text]))[0]
+
+
+async def aquery_similar(vector: list, top_k=3, filter=None):
+    return await asyncio.to_thread(embedding_service.query_similar, vector, top_k=top_k, filter=filter)
+
+
+async def ahybrid_search(query: str, query_vector, file_id=None, top_k=RETRIEVAL_TOP_K,
+                         candidates=RETRIEVAL_CANDIDATES):
+    """
+    Async hybrid_search. The BM25 search only needs the query text, so it runs
+    in SQLite while the query is still being embedded (query_vector may be an
+    awaitable) and while the vector store is searched. When the query cannot be
+    embedded, the search is keyword-only.
+    """
+    version = active_version()["version"]
+    keyword_task = asyncio.ensure_future(
+        asyncio.to_thread(retrieval.search_chunks, query, doc_id=file_id, limit=candidates, version=version)
+    )
+    try:
+        if asyncio.isfuture(query_vector) or asyncio.iscoroutine(query_vector):
+            try:
+                query_vector = await query_vector
+            except resilience.BackendUnavailable:
+                query_vector = None
+        vector_matches = await asyncio.to_thread(retrieval.vector_candidates, query_vector, file_id, candidates)
+        keyword_matches = await keyword_task
+    except BaseException:
+        keyword_task.cancel()
+        raise
+    return await asyncio.to_thread(retrieval.fuse_matches, vector_matches, keyword_matches, top_k, version)
+
+
+async def achat(model: str, prompt: str):
+    """Single-turn chat completion; returns the answer text."""
+    response = await resilience.guard("llm").acall(
+        services.get("openai").ChatCompletion.acreate,
+        model=model, messages=[{"role": "user", "content": prompt}], key=(model, prompt)
+    )
+    return response.choices[0].message.content
+
+
+async def achat_stream(model: str, prompt: str):
+    """Yield answer tokens as the model generates them (the guard covers the wait for the response to start)."""
+    response = await resilience.guard("llm").acall(
+        services.get("openai").ChatCompletion.acreate,
+        model=model, messages=[{"role": "user", "content": prompt}], stream=True
+    )
+    async for chunk in response:
+        token = chunk['choices'][0].get('delta', {}).get('content')
+        if token:
+            yield token
@@ -0,0 +1,285 @@
+"""
+Reproducible load test for the Flask backend.
+
+OpenAI, the vector store and Azure Speech are replaced by local stubs with
+injected latency (see benchmarks/stubs.py), the app is served by a threaded
+werkzeug server in a temporary workspace, and /upload, /query and /transcribe
+are driven at increasing concurrency. Throughput, latency percentiles and the
+per-stage timings from the metrics module are written to a JSON file.
+
+--error-rate and --hang-rate make the OpenAI and vector store stubs fail or
+stall, to measure how the timeouts, retries and circuit breakers (see
+resilience) hold tail latency and fall back.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test --concurrency 1 4 16 --requests 50 --output bench_results.json
+    LLM_TIMEOUT=2 python -m benchmarks.load_test --endpoints query --error-rate 0.1 --hang-rate 0.05 --hang-seconds 10
+"""
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import wave
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+import platform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ["upload", "query", "transcribe"]
+QUESTIONS = [
+    "What is the closing balance?",
+    "Which account number is this statement for?",
+    "What were the total deposits this month?",
+    "List the largest withdrawal.",
+    "When does the statement period end?",
+]
+
+
+def sample_document(rng, paragraphs=40):
+    words = ("account balance deposit withdrawal statement period interest fee transfer "
+             "payment card merchant total opening closing date amount").split()
+    lines = []
+    for i in range(paragraphs):
+        body = ' '.join(rng.choice(words) for _ in range(60))
+        lines.append(f"Section {i}: {body}. Amount ${rng.randint(1, 9999)}.{rng.randint(0, 99):02d}.")
+    return '\n\n'.join(lines)
+
+
+def silent_wav(seconds=1.0, rate=16000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\x00\x00' * int(seconds * rate))
+    return buffer.getvalue()
+
+
+def multipart(field, filename, data, content_type):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, method, path, body=None, content_type=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        try:
+            headers = {'Content-Type': content_type} if content_type else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            # Reading the whole body includes streamed responses in the latency
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    def post_json(self, path, payload):
+        return self.request('POST', path, json.dumps(payload).encode(), 'application/json')
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "mean": float(ms.mean()), "max": float(ms.max())}
+
+
+def stage_summary(snapshot):
+    """Per-stage and per-endpoint server-side latency from a metrics.snapshot()."""
+    stages, endpoints = {}, {}
+    for s in snapshot["summaries"]:
+        entry = {"count": s["count"], "mean_ms": 1000 * s["sum"] / s["count"] if s["count"] else 0.0,
+                 **{q: 1000 * s[q] for q in ("p50", "p95", "p99")}}
+        if s["name"] == "stage_duration_seconds":
+            stages[s["labels"]["stage"]] = entry
+        elif s["name"] == "request_duration_seconds":
+            endpoints[s["labels"]["endpoint"]] = entry
+    return {"stages": stages, "server": endpoints}
+
+
+def run_level(endpoint, concurrency, n_requests, make_request):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            status, _ = make_request(i)
+            ok = status < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    wall = time.perf_counter() - started
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "wall_seconds": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def wait_for_jobs(client, job_ids, timeout=300):
+    deadline = time.monotonic() + timeout
+    pending = set(job_ids)
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            status, body = client.request('GET', f'/jobs/{job_id}')
+            if status == 200 and json.loads(body)["status"] in ("done", "failed"):
+                pending.discard(job_id)
+        if pending:
+            time.sleep(0.05)
+    return not pending
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the backend against local service stubs.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument("--documents", type=int, default=5, help="Documents ingested before the query runs")
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    parser.add_argument("--vector-latency", type=float, default=0.01)
+    parser.add_argument("--llm-latency", type=float, default=0.30)
+    parser.add_argument("--speech-latency", type=float, default=0.50)
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative +/- jitter applied to every stub latency")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of OpenAI and vector store calls that fail with a transient error")
+    parser.add_argument("--hang-rate", type=float, default=0.0,
+                        help="Fraction of OpenAI and vector store calls that stall for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--query-cache", action="store_true", help="Leave the /query cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args(argv)
+    output = os.path.abspath(args.output)
+
+    # Everything the app writes (SQLite files, uploads, vector index) goes to a scratch directory
+    workspace = tempfile.mkdtemp(prefix="jarvis-bench-")
+    os.environ.update({
+        "DATABASE_PATH": os.path.join(workspace, "documents.db"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workspace, "embedding_cache.db"),
+        "VECTOR_BACKEND": "local",
+        "LOCAL_INDEX_DIR": os.path.join(workspace, "vector_index"),
+        "OPENAI_API_KEY": "stub",
+    })
+    if not args.query_cache:
+        os.environ["QUERY_CACHE_TTL"] = "0"
+    os.chdir(workspace)
+    sys.path.insert(0, BACKEND_DIR)
+
+    from werkzeug.serving import make_server
+    import app as app_module
+    import metrics
+    import resilience
+    from benchmarks import stubs
+
+    latencies = {
+        "embedding": args.embedding_latency,
+        "vector": args.vector_latency,
+        "llm": args.llm_latency,
+        "speech": args.speech_latency,
+    }
+    backends = ("embedding", "vector", "llm")
+    faults = stubs.Faults({b: args.error_rate for b in backends}, {b: args.hang_rate for b in backends},
+                          hang_seconds=args.hang_seconds, seed=args.seed)
+    rng = random.Random(args.seed)
+    results = []
+    with stubs.installed(latencies, jitter=args.jitter, index_dir=os.environ["LOCAL_INDEX_DIR"],
+                         app_module=app_module, faults=faults) as installed:
+        server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(server.server_port)
+
+        # Seed documents for /query
+        job_ids, doc_ids = [], []
+        for i in range(args.documents):
+            body, content_type = multipart('file', f'seed_{i}.txt', sample_document(rng).encode(), 'text/plain')
+            _, response = client.request('POST', '/upload', body, content_type)
+            payload = json.loads(response)
+            doc_ids.append(payload["id"])
+            job_ids.append(payload["job_id"])
+        if not wait_for_jobs(client, job_ids):
+            raise RuntimeError("Seed documents were not ingested in time")
+
+        upload_payload = sample_document(rng).encode()
+        audio = silent_wav()
+
+        upload_jobs = []
+
+        def upload_request(i):
+            body, content_type = multipart('file', f'bench_{i}.txt', upload_payload, 'text/plain')
+            status, response = client.request('POST', '/upload', body, content_type)
+            if status == 200:
+                upload_jobs.append(json.loads(response)["job_id"])
+            return status, response
+
+        def query_request(i):
+            return client.post_json('/query', {"file_id": doc_ids[i % len(doc_ids)],
+                                               "query": QUESTIONS[i % len(QUESTIONS)]})
+
+        def transcribe_request(i):
+            body, content_type = multipart('file', f'bench_{i}.wav', audio, 'audio/wav')
+            return client.request('POST', '/transcribe', body, content_type)
+
+        requests_for = {"upload": upload_request, "query": query_request, "transcribe": transcribe_request}
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                metrics.reset()
+                upload_jobs.clear()
+                result = run_level(endpoint, concurrency, args.requests, requests_for[endpoint])
+                if endpoint == "upload":
+                    # Include background ingestion in the per-stage numbers
+                    result["ingestion_complete"] = wait_for_jobs(client, upload_jobs)
+                result.update(stage_summary(metrics.snapshot()))
+                results.append(result)
+                print(f"{endpoint:>10} c={concurrency:<3} {result['throughput_rps']:8.1f} req/s  "
+                      f"p50 {result['latency_ms']['p50']:8.1f} ms  p95 {result['latency_ms']['p95']:8.1f} ms  "
+                      f"p99 {result['latency_ms']['p99']:8.1f} ms  errors {result['errors']}")
+        server.shutdown()
+        stub_calls = {"embedding": installed.embedding.calls, "chat": installed.chat.calls,
+                      "injected_faults": faults.injected}
+        backend_status = resilience.status()
+
+    report = {
+        "config": {**vars(args), "latencies": latencies, "workspace": workspace},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "stub_calls": stub_calls,
+        "backends": backend_status,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
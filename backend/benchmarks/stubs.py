@@ -0,0 +1,204 @@
+"""
+Local stand-ins for OpenAI, the vector store and Azure Speech.
+
+Each stub sleeps for a configurable latency (plus optional jitter) so the
+backend can be load-tested without network access or API keys. Faults can
+make the OpenAI and vector store stubs fail or stall, to exercise the
+timeouts, retries and circuit breakers in resilience.
+"""
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+import numpy as np
+import openai
+
+DEFAULT_LATENCIES = {
+    "embedding": 0.05,
+    "vector": 0.01,
+    "llm": 0.30,
+    "llm_token": 0.01,
+    "speech": 0.50,
+}
+
+
+class Latency:
+    def __init__(self, latencies=None, jitter=0.1, seed=0):
+        self.latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self, name):
+        base = self.latencies.get(name, 0.0)
+        if base <= 0:
+            return
+        with self._lock:
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(base * factor)
+
+
+class Faults:
+    """
+    Failures injected into the stubs. Each call to a backend ("embedding",
+    "vector", "llm") raises a transient error with probability error_rates[name],
+    or stalls for hang_seconds with probability hang_rates[name]. Backends in
+    `down` fail every call until removed.
+    """
+
+    def __init__(self, error_rates=None, hang_rates=None, hang_seconds=30.0, seed=0):
+        self.error_rates = dict(error_rates or {})
+        self.hang_rates = dict(hang_rates or {})
+        self.hang_seconds = hang_seconds
+        self.down = set()
+        self.injected = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def inject(self, name):
+        error_rate = 1.0 if name in self.down else self.error_rates.get(name, 0.0)
+        hang_rate = self.hang_rates.get(name, 0.0)
+        if not error_rate and not hang_rate:
+            return
+        with self._lock:
+            roll = self._rng.random()
+            fault = "error" if roll < error_rate else "hang" if roll < error_rate + hang_rate else None
+            if fault:
+                self.injected[f"{name}_{fault}"] = self.injected.get(f"{name}_{fault}", 0) + 1
+        if fault == "error":
+            if name == "vector":
+                raise ConnectionError("Injected vector store failure")
+            raise openai.error.ServiceUnavailableError(f"Injected {name} failure")
+        if fault == "hang":
+            time.sleep(self.hang_seconds)
+
+
+def fake_embedding(text, dim):
+    # Deterministic pseudo-embedding so identical texts map to identical vectors
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubEmbedding:
+    def __init__(self, latency, dim, faults=None):
+        self.latency = latency
+        self.dim = dim
+        self.faults = faults or Faults()
+        self.calls = 0
+
+    def create(self, model, input, **kwargs):
+        self.calls += 1
+        self.latency.sleep("embedding")
+        self.faults.inject("embedding")
+        texts = [input] if isinstance(input, str) else list(input)
+        return {"data": [{"index": i, "embedding": fake_embedding(t, self.dim)} for i, t in enumerate(texts)]}
+
+
+class StubChatCompletion:
+    ANSWER = "Based on the document, the closing balance is $1,234.56."
+
+    def __init__(self, latency, faults=None):
+        self.latency = latency
+        self.faults = faults or Faults()
+        self.calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        self.faults.inject("llm")
+        if stream:
+            return self._stream()
+        self.latency.sleep("llm")
+        message = SimpleNamespace(content=self.ANSWER, role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self):
+        self.latency.sleep("llm")
+        for token in self.ANSWER.split(" "):
+            self.latency.sleep("llm_token")
+            yield {"choices": [{"delta": {"content": token + " "}}]}
+
+
+class LatencyVectorStore:
+    """Wraps a vector store and adds latency (and injected faults) to every call."""
+
+    def __init__(self, store, latency, faults=None):
+        self.store = store
+        self.latency = latency
+        self.faults = faults or Faults()
+
+    def upsert(self, vectors):
+        self.latency.sleep("vector")
+        self.faults.inject("vector")
+        return self.store.upsert(vectors)
+
+    def query(self, *args, **kwargs):
+        self.latency.sleep("vector")
+        self.faults.inject("vector")
+        return self.store.query(*args, **kwargs)
+
+    def delete(self, ids):
+        self.latency.sleep("vector")
+        return self.store.delete(ids)
+
+
+def stub_recognizer(latency, text="what is the closing balance"):
+    """Fake speech recognizer: takes PCM bytes, returns fixed text after the speech latency."""
+    def recognize(pcm):
+        latency.sleep("speech")
+        return text
+    return recognize
+
+
+def stub_transcriber(latency):
+    # Real decoding and segmentation, fake recognition
+    import transcribe_service
+    recognize = stub_recognizer(latency)
+
+    def transcribe(source, format=None):
+        return transcribe_service.transcribe(source, format=format, recognize=recognize)
+    return transcribe
+
+
+def _restore(cls, name, original):
+    if original is None:
+        delattr(cls, name)
+    else:
+        setattr(cls, name, original)
+
+
+@contextmanager
+def installed(latencies=None, jitter=0.1, index_dir="bench_vector_index", app_module=None, faults=None):
+    """
+    Patch OpenAI, the vector store and (when app_module is given) the app's
+    transcriber with local stubs for the duration of the block. faults (a
+    Faults) makes the OpenAI and vector store stubs fail or stall.
+    """
+    import services
+    import vector_store
+    from config import EMBEDDING_DIM
+
+    latency = Latency(latencies, jitter=jitter)
+    faults = faults or Faults()
+    embedding = StubEmbedding(latency, EMBEDDING_DIM, faults)
+    chat = StubChatCompletion(latency, faults)
+    # Keep the raw class attributes so the classmethods are restored as they were
+    originals = (vars(openai.Embedding).get("create"), vars(openai.ChatCompletion).get("create"))
+    original_transcribe = getattr(app_module, "transcribe", None)
+
+    openai.Embedding.create = embedding.create
+    openai.ChatCompletion.create = chat.create
+    if app_module is not None:
+        app_module.transcribe = stub_transcriber(latency)
+    store = LatencyVectorStore(vector_store.LocalVectorStore(path=index_dir), latency, faults)
+    try:
+        with services.override("vector_store", store):
+            yield SimpleNamespace(latency=latency, faults=faults, embedding=embedding, chat=chat)
+    finally:
+        embedding_create, chat_create = originals
+        _restore(openai.Embedding, "create", embedding_create)
+        _restore(openai.ChatCompletion, "create", chat_create)
+        if app_module is not None:
+            app_module.transcribe = original_transcribe
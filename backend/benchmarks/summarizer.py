@@ -0,0 +1,253 @@
+"""
+CPU inference benchmark for the transformer_summarizer models.
+
+Every model in MODELS_TO_DOWNLOAD is loaded in each inference mode (fp32,
+int8 dynamic quantization, ONNX Runtime) in a fresh process, so load time and
+peak RSS belong to that configuration alone. The same inputs are summarized
+one at a time (latency percentiles) and in batches (throughput). Quality is
+reported as ROUGE-1/2/L F1 of each mode's summaries against the fp32 summaries
+of the same model, and against reference summaries when the dataset has them.
+
+Usage (from the backend directory):
+    python -m benchmarks.summarizer --modes fp32 int8 onnx --threads 4 --output summarizer_bench.json
+    python -m benchmarks.summarizer --models t5-small --dataset samples.jsonl
+
+A dataset is a JSONL file of {"text": ..., "summary": optional reference} records.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import multiprocessing
+import numpy as np
+from benchmarks.load_test import percentiles
+
+# Built-in inputs, in the style of the documents users upload
+SAMPLES = [
+    {
+        "text": "The checking account statement covers the period from March 1 to March 31. The opening balance "
+                "was $4,210.55. During the month the account received two payroll deposits of $2,350.00 each and "
+                "a tax refund of $612.40. Withdrawals included rent of $1,800.00, utilities of $214.87, card "
+                "purchases totalling $1,032.19 and a $35.00 overdraft fee charged on March 18 when a pending "
+                "transfer cleared before the second payroll deposit. The closing balance was $6,440.89. Interest "
+                "earned for the period was $1.12.",
+        "summary": "The March statement shows an opening balance of $4,210.55 and a closing balance of $6,440.89, "
+                   "with two payroll deposits, a tax refund, rent and card spending, and a $35.00 overdraft fee.",
+    },
+    {
+        "text": "This lease agreement is made between the landlord and the tenant for the apartment at 14 Elm "
+                "Street. The term starts on June 1 and runs for twelve months. Monthly rent is $1,650, due on the "
+                "first day of each month, with a late fee of $50 after the fifth day. The tenant pays a security "
+                "deposit of $1,650, refundable within thirty days of move-out minus any damages beyond normal wear. "
+                "Pets are allowed with written consent and a $300 non-refundable fee. Either party may end the "
+                "lease with sixty days written notice after the first six months.",
+        "summary": "A twelve-month lease for 14 Elm Street from June 1 at $1,650 per month with a matching "
+                   "deposit, late fees after the fifth, pets by consent for a fee, and sixty days notice to end it.",
+    },
+    {
+        "text": "The quarterly report shows revenue of $12.4 million, up 18 percent from the same quarter last "
+                "year, driven mainly by subscription growth in Europe. Operating expenses rose 9 percent as the "
+                "company hired forty engineers and opened a support office in Lisbon. Net income was $1.9 million "
+                "compared with a loss of $0.4 million a year earlier. Cash and equivalents ended the quarter at "
+                "$31 million. Management expects revenue growth between 15 and 20 percent for the full year.",
+        "summary": "Quarterly revenue rose 18 percent to $12.4 million on European subscriptions, turning a "
+                   "loss into $1.9 million net income, with full-year growth guided at 15 to 20 percent.",
+    },
+    {
+        "text": "The patient was seen for a follow-up visit after knee surgery six weeks ago. The incision has "
+                "healed well and there are no signs of infection. Range of motion has improved to 110 degrees of "
+                "flexion. The patient reports mild pain after long walks, managed with ibuprofen. Physical therapy "
+                "will continue twice a week for another month, focusing on strengthening the quadriceps. A final "
+                "check is scheduled in six weeks, and the patient may return to light jogging after that visit if "
+                "progress continues.",
+        "summary": "Six weeks after knee surgery the incision has healed and flexion reached 110 degrees; physical "
+                   "therapy continues for a month before a final check and a possible return to jogging.",
+    },
+]
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _f1(overlap, candidate_count, reference_count):
+    if not overlap or not candidate_count or not reference_count:
+        return 0.0
+    precision, recall = overlap / candidate_count, overlap / reference_count
+    return 2 * precision * recall / (precision + recall)
+
+
+def _ngrams(tokens, n):
+    counts = {}
+    for i in range(len(tokens) - n + 1):
+        gram = tuple(tokens[i:i + n])
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def rouge_n(candidate: str, reference: str, n=1) -> float:
+    """ROUGE-N F1: clipped n-gram overlap between candidate and reference."""
+    c, r = _ngrams(_tokens(candidate), n), _ngrams(_tokens(reference), n)
+    overlap = sum(min(count, r.get(gram, 0)) for gram, count in c.items())
+    return _f1(overlap, sum(c.values()), sum(r.values()))
+
+
+def rouge_l(candidate: str, reference: str) -> float:
+    """ROUGE-L F1: longest common subsequence of tokens."""
+    c, r = _tokens(candidate), _tokens(reference)
+    previous = [0] * (len(r) + 1)
+    for token in c:
+        current = [0]
+        for j, other in enumerate(r):
+            current.append(previous[j] + 1 if token == other else max(previous[j + 1], current[j]))
+        previous = current
+    return _f1(previous[-1], len(c), len(r))
+
+
+def rouge(candidates, references) -> dict:
+    """Mean ROUGE-1/2/L F1 over aligned candidate and reference summaries."""
+    pairs = list(zip(candidates, references))
+    if not pairs:
+        return {"rouge1": None, "rouge2": None, "rougeL": None}
+    return {
+        "rouge1": round(float(np.mean([rouge_n(c, r, 1) for c, r in pairs])), 4),
+        "rouge2": round(float(np.mean([rouge_n(c, r, 2) for c, r in pairs])), 4),
+        "rougeL": round(float(np.mean([rouge_l(c, r) for c, r in pairs])), 4),
+    }
+
+
+def _peak_rss_bytes():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if platform.system() == 'Darwin' else maxrss * 1024
+
+
+def _run_config(model_name, mode, texts, options, conn):
+    """Child process: load one model in one mode, then time it on texts."""
+    try:
+        if options["threads"]:
+            os.environ["SUMMARIZER_THREADS"] = str(options["threads"])
+        import transformer_summarizer
+
+        kwargs = {"model_name": model_name, "mode": mode,
+                  "max_length": options["max_length"], "min_length": options["min_length"]}
+        start = time.perf_counter()
+        summarizer = transformer_summarizer.get_summarizer(model_name, mode)
+        load_seconds = time.perf_counter() - start
+        transformer_summarizer.summarize_batch(texts[:1], batch_size=1, **kwargs)
+
+        summaries, latencies = [], []
+        for _ in range(options["repeat"]):
+            summaries = []
+            for text in texts:
+                start = time.perf_counter()
+                summaries.extend(transformer_summarizer.summarize_batch([text], batch_size=1, **kwargs))
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(options["repeat"]):
+            transformer_summarizer.summarize_batch(texts, batch_size=options["batch_size"], **kwargs)
+        batch_seconds = time.perf_counter() - start
+
+        conn.send({
+            "load_seconds": round(load_seconds, 3),
+            "latency_ms": percentiles(latencies),
+            "throughput_per_second": round(len(texts) * options["repeat"] / batch_seconds, 3),
+            "model_bytes": transformer_summarizer._model_size(summarizer),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "summaries": summaries,
+        })
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_config(model_name, mode, texts, options):
+    """Benchmark one (model, mode) pair in a fresh process."""
+    context = multiprocessing.get_context("spawn")
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=_run_config, args=(model_name, mode, texts, options, child))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"Benchmark process exited with code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def load_dataset(path, limit=None):
+    if not path:
+        records = SAMPLES
+    else:
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    return records[:limit] if limit else records
+
+
+def main(argv=None):
+    from transformer_summarizer import MODELS_TO_DOWNLOAD, SUMMARIZER_MODES
+
+    parser = argparse.ArgumentParser(description="Benchmark summarization models in each CPU inference mode.")
+    parser.add_argument("--models", nargs="+", default=MODELS_TO_DOWNLOAD)
+    parser.add_argument("--modes", nargs="+", choices=SUMMARIZER_MODES, default=SUMMARIZER_MODES)
+    parser.add_argument("--dataset", help="JSONL file of {\"text\", \"summary\"} records (default: built-in samples)")
+    parser.add_argument("--limit", type=int, help="Use only the first N records")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 = library default)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the dataset per measurement")
+    parser.add_argument("--max-length", type=int, default=150)
+    parser.add_argument("--min-length", type=int, default=30)
+    parser.add_argument("--output", default="summarizer_bench.json")
+    args = parser.parse_args(argv)
+
+    records = load_dataset(args.dataset, args.limit)
+    texts = [r["text"] for r in records]
+    references = [r.get("summary") for r in records]
+    options = {"threads": args.threads, "batch_size": args.batch_size, "repeat": args.repeat,
+               "max_length": args.max_length, "min_length": args.min_length}
+    # fp32 runs first so the other modes can be compared with it
+    modes = sorted(set(args.modes), key=SUMMARIZER_MODES.index)
+
+    results = []
+    for model_name in args.models:
+        baseline = None
+        for mode in modes:
+            result = {"model": model_name, "mode": mode, **run_config(model_name, mode, texts, options)}
+            if "error" in result:
+                print(f"{model_name:>26} {mode:>5}  failed: {result['error']}")
+                results.append(result)
+                continue
+            if mode == "fp32":
+                baseline = result
+            if all(references):
+                result["rouge_vs_reference"] = rouge(result["summaries"], references)
+            if baseline is not None:
+                result["rouge_vs_fp32"] = rouge(result["summaries"], baseline["summaries"])
+                if result["latency_ms"]["p50"]:
+                    result["speedup_vs_fp32"] = round(baseline["latency_ms"]["p50"] / result["latency_ms"]["p50"], 2)
+            results.append(result)
+            quality = result.get("rouge_vs_fp32") or {}
+            print(f"{model_name:>26} {mode:>5}  p50 {result['latency_ms']['p50']:8.1f} ms  "
+                  f"{result['throughput_per_second']:6.2f} docs/s  peak RSS {result['peak_rss_bytes'] / 2 ** 20:7.0f} MiB  "
+                  f"ROUGE-L vs fp32 {quality.get('rougeL', float('nan')):.3f}")
+
+    report = {
+        "config": vars(args),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Content-addressed storage for uploaded files.
+
+Uploads are hashed (SHA-256) chunk by chunk while they are written, then
+stored once per content under BLOB_DIR/<hash[:2]>/<hash><ext>. The blobs
+table (in documents.db) maps each hash to the document it was ingested as,
+so re-uploading the same file reuses that document instead of extracting and
+embedding it again. A sweeper removes blobs past the retention period or
+beyond the disk quota; the hash -> document mapping is kept.
+"""
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import job_queue
+from query_service import get_connection, transaction
+from config import BLOB_DIR, MAX_UPLOAD_MB, UPLOAD_QUOTA_MB, UPLOAD_RETENTION_DAYS, UPLOAD_SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+HASH_CHUNK_BYTES = MB
+# Partial writes older than this are left over from crashed requests
+STALE_TMP_SECONDS = 3600
+
+_BLOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS blobs(
+    sha256 TEXT,
+    ext TEXT,
+    path TEXT,
+    size INTEGER,
+    doc_id TEXT,
+    created_at REAL,
+    last_access REAL,
+    PRIMARY KEY (sha256, ext)
+)
+"""
+_table_ready = False
+_sweeper = None
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _db():
+    global _table_ready
+    if not _table_ready:
+        with transaction() as conn:
+            conn.execute(_BLOBS_TABLE)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs(last_access)")
+        _table_ready = True
+    return get_connection()
+
+
+def save_stream(stream, filename: str, max_bytes=MAX_UPLOAD_MB * MB, root=BLOB_DIR) -> dict:
+    """
+    Write an upload to the blob store, hashing it as it is written.
+
+    Returns:
+        dict: {"sha256", "ext", "path", "size"}; identical content is stored once.
+
+    Raises:
+        UploadTooLarge: The stream is longer than max_bytes (nothing is kept).
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(HASH_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes // MB} MB upload limit")
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+        path = os.path.join(root, sha256[:2], sha256 + ext)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    now = time.time()
+    _db()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO blobs (sha256, ext, path, size, doc_id, created_at, last_access) VALUES (?, ?, ?, ?, NULL, ?, ?) "
+            "ON CONFLICT(sha256, ext) DO UPDATE SET path = excluded.path, last_access = excluded.last_access",
+            (sha256, ext, path, size, now, now)
+        )
+    return {"sha256": sha256, "ext": ext, "path": path, "size": size}
+
+
+def claim_document(blob: dict, doc_id: str):
+    """
+    Map a blob to a document.
+
+    Returns:
+        tuple: (doc_id, duplicate, job). For content that was uploaded before,
+        the existing document and its latest job (None while it is still being
+        enqueued); otherwise the given doc_id, which the caller must ingest.
+        Content whose last ingestion failed is treated as new.
+    """
+    _db()
+    key = (blob["sha256"], blob["ext"])
+    expected = None
+    while True:
+        # Compare-and-set on doc_id, so only one of several workers ingests the content
+        with transaction() as conn:
+            claimed = conn.execute(
+                "UPDATE blobs SET doc_id = ? WHERE sha256 = ? AND ext = ? AND doc_id IS ?", (doc_id, *key, expected)
+            ).rowcount
+        if claimed == 1:
+            return doc_id, False, None
+        row = _db().execute("SELECT doc_id FROM blobs WHERE sha256 = ? AND ext = ?", key).fetchone()
+        if row is None:
+            return doc_id, False, None
+        existing = row[0]
+        if existing is None:
+            continue
+        job = job_queue.latest_job(existing)
+        if job is None or job["status"] != "failed":
+            return existing, True, job
+        # Take over from the failed ingestion unless another worker already has
+        expected = existing
+
+
+def _remove(conn, sha256, ext, path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    conn.execute("UPDATE blobs SET path = NULL WHERE sha256 = ? AND ext = ?", (sha256, ext))
+
+
+def sweep(quota_bytes=UPLOAD_QUOTA_MB * MB, retention_seconds=UPLOAD_RETENTION_DAYS * 86400, root=BLOB_DIR,
+          now=None):
+    """
+    Delete blobs under root not used within the retention period, then least
+    recently used blobs until the store fits in quota_bytes. Blobs of queued or
+    running ingestion jobs are never removed.
+
+    Returns:
+        dict: Number of blobs removed and bytes freed.
+    """
+    now = now or time.time()
+    conn = _db()
+    active = {row[0] for row in job_queue.active_paths()}
+    # Only blobs stored under root: other stores sharing the database are left alone
+    prefix = os.path.join(os.path.abspath(root), '')
+    rows = [row for row in conn.execute(
+        "SELECT sha256, ext, path, size, last_access FROM blobs WHERE path IS NOT NULL ORDER BY last_access"
+    ) if os.path.abspath(row[2]).startswith(prefix)]
+    total = sum(size for _, _, _, size, _ in rows)
+    removed = freed = 0
+    with transaction() as conn:
+        for sha256, ext, path, size, last_access in rows:
+            if path in active:
+                continue
+            if last_access >= now - retention_seconds and total <= quota_bytes:
+                # Rows are in LRU order, so everything after this one is newer
+                break
+            _remove(conn, sha256, ext, path)
+            total -= size
+            freed += size
+            removed += 1
+
+    tmp_dir = os.path.join(root, 'tmp')
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            path = os.path.join(tmp_dir, name)
+            if os.path.getmtime(path) < now - STALE_TMP_SECONDS:
+                os.remove(path)
+
+    if removed:
+        logger.info(f"Blob sweep removed {removed} file(s), {freed / MB:.1f} MiB freed, {total / MB:.1f} MiB in use")
+    return {"removed": removed, "freed_bytes": freed, "used_bytes": total}
+
+
+def start_sweeper(interval=UPLOAD_SWEEP_INTERVAL):
+    """Run sweep() every interval seconds on a daemon thread (once per process)."""
+    global _sweeper
+    if _sweeper is not None or interval <= 0:
+        return
+
+    def loop():
+        while True:
+            try:
+                sweep()
+            except Exception as e:
+                logger.error(f"Blob sweep failed: {str(e)}")
+            time.sleep(interval)
+
+    _sweeper = threading.Thread(target=loop, name="blob-sweeper", daemon=True)
+    _sweeper.start()
+
+
+if __name__ == '__main__':
+    print(sweep())
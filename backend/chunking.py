@@ -0,0 +1,141 @@
+import re
+import math
+from collections import deque
+from dataclasses import dataclass
+from config import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+ENCODING_NAME = 'cl100k_base'  # tokenizer used by text-embedding-ada-002 / gpt-3.5-turbo
+
+_WORD_RE = re.compile(r'\S+\s*|\s+')
+_encoding = None
+_encoding_loaded = False
+
+
+@dataclass
+class Chunk:
+    index: int
+    start: int
+    end: int
+    text: str
+    tokens: int
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(ENCODING_NAME)
+            except Exception:
+                _encoding = None
+    return _encoding
+
+
+def _approx_tokens(text):
+    # Roughly 4 characters per token for English text
+    stripped = text.strip()
+    return max(1, math.ceil(len(stripped) / 4)) if stripped else 0
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with the model tokenizer, or approximate it if tiktoken is unavailable."""
+    enc = _get_encoding()
+    if enc is None:
+        return sum(_approx_tokens(w) for w in _WORD_RE.findall(text))
+    return len(enc.encode_ordinary(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens (approximately, without tiktoken)."""
+    if max_tokens <= 0:
+        return ''
+    enc = _get_encoding()
+    if enc is None:
+        return text[:max_tokens * 4]
+    tokens = enc.encode_ordinary(text)
+    return text if len(tokens) <= max_tokens else enc.decode(tokens[:max_tokens])
+
+
+def _token_counts(words):
+    enc = _get_encoding()
+    if enc is None:
+        return [_approx_tokens(w) for w in words]
+    return [len(t) for t in enc.encode_ordinary_batch(words)]
+
+
+def _split_long_word(word, tokens, max_tokens):
+    # A single "word" larger than a chunk (e.g. base64 blobs) is split by characters
+    pieces = math.ceil(tokens / max_tokens)
+    size = math.ceil(len(word) / pieces)
+    return [word[i:i + size] for i in range(0, len(word), size)]
+
+
+def _iter_words(segments, max_tokens):
+    offset = 0
+    for segment in segments:
+        if not segment:
+            continue
+        words = _WORD_RE.findall(segment)
+        for word, tokens in zip(words, _token_counts(words)):
+            if tokens > max_tokens:
+                for piece in _split_long_word(word, tokens, max_tokens):
+                    yield offset, piece, _approx_tokens(piece)
+                    offset += len(piece)
+                continue
+            yield offset, word, tokens
+            offset += len(word)
+
+
+def iter_chunks(segments, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Split a stream of text segments into overlapping, token-bounded chunks.
+
+    Segments are treated as one continuous document (as if joined with ''), so
+    callers can feed pages as they are extracted. Chunk offsets refer to that
+    joined document.
+
+    Args:
+        segments (iterable): Text segments, e.g. pages of a PDF.
+        max_tokens (int): Maximum number of tokens per chunk.
+        overlap_tokens (int): Number of tokens shared between consecutive chunks.
+
+    Yields:
+        Chunk: Chunks in document order.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens must be smaller than max_tokens")
+
+    buf = deque()
+    buf_tokens = 0
+    pending = False
+    index = 0
+
+    def make_chunk():
+        text = ''.join(w for _, w, _ in buf)
+        start = buf[0][0]
+        return Chunk(index=index, start=start, end=start + len(text), text=text, tokens=buf_tokens)
+
+    for word in _iter_words(segments, max_tokens):
+        if pending and buf_tokens + word[2] > max_tokens:
+            yield make_chunk()
+            index += 1
+            pending = False
+            while buf and (buf_tokens > overlap_tokens or buf_tokens + word[2] > max_tokens):
+                buf_tokens -= buf.popleft()[2]
+        buf.append(word)
+        buf_tokens += word[2]
+        if word[2]:
+            pending = True
+
+    if pending:
+        yield make_chunk()
+
+
+def chunk_text(text: str, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    return list(iter_chunks([text], max_tokens=max_tokens, overlap_tokens=overlap_tokens))
@@ -8,4 +8,131 @@ PINECONE_ENV = os.getenv("PINECONE_ENV")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX")
 AZURE_COG_ENDPOINT = os.getenv("AZURE_COGNITIVE_ENDPOINT")
 AZURE_COG_KEY = os.getenv("AZURE_COGNITIVE_KEY")
-UPLOAD_FOLDER = 'uploads'
\ No newline at end of file
+UPLOAD_FOLDER = 'uploads'
+
+# Ingestion / chunking
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 400))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 50))
+CHUNK_PREVIEW_CHARS = int(os.getenv("CHUNK_PREVIEW_CHARS", 200))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 100))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 100))
+# Total input tokens per embedding request (the API also caps inputs per request at 2048)
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", 100000))
+# Embedding batches sent to the API at the same time
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+
+# Vector store: "pinecone" or "local" (in-process NumPy index under LOCAL_INDEX_DIR)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_index")
+# Local index queries probe only the nearest IVF clusters (trained by reindex.py) instead of
+# scoring every vector; exact search is the default
+LOCAL_INDEX_APPROXIMATE = os.getenv("LOCAL_INDEX_APPROXIMATE", "0") == "1"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 1536))
+# How long a process keeps using the active index version before checking for a switch (reindex.py)
+INDEX_VERSION_REFRESH_SECONDS = float(os.getenv("INDEX_VERSION_REFRESH_SECONDS", 10))
+# reindex.py: documents read per page / embedding tokens per minute (0 = no pacing)
+REINDEX_PAGE_SIZE = int(os.getenv("REINDEX_PAGE_SIZE", 100))
+REINDEX_TOKENS_PER_MINUTE = int(os.getenv("REINDEX_TOKENS_PER_MINUTE", 0))
+
+# SQLite databases live next to each other in the backend directory
+DATABASE_PATH = os.getenv("DATABASE_PATH", "documents.db")
+
+# Embedding cache (SQLite file next to documents.db with an in-memory LRU tier)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(DATABASE_PATH), "embedding_cache.db")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", 5000))
+
+# Background ingestion queue
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+EXTRACT_PROCESSES = int(os.getenv("EXTRACT_PROCESSES", os.cpu_count() or 1))
+# PDFs with at least this many pages are extracted in parallel when a process pool is available
+PARALLEL_PDF_MIN_PAGES = int(os.getenv("PARALLEL_PDF_MIN_PAGES", 16))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 8))
+
+# OCR: pages without a PDF text layer (and images) are OCR'd on a persistent process pool
+OCR_FALLBACK = os.getenv("OCR_FALLBACK", "1") == "1"
+OCR_PROCESSES = int(os.getenv("OCR_PROCESSES", os.cpu_count() or 1))
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+
+# Summarization models kept loaded (LRU) within this memory budget
+SUMMARIZER_MEMORY_BUDGET_MB = int(os.getenv("SUMMARIZER_MEMORY_BUDGET_MB", 4096))
+# Comma-separated model names to load at process start, e.g. "t5-small"
+SUMMARIZER_PRELOAD = [m for m in os.getenv("SUMMARIZER_PRELOAD", "").split(",") if m]
+# CPU inference mode: "fp32", "int8" (dynamic int8 quantization of the linear layers) or
+# "onnx" (ONNX Runtime, exported on first load; needs optimum[onnxruntime])
+SUMMARIZER_MODE = os.getenv("SUMMARIZER_MODE", "fp32")
+# Intra-op threads used by summarization (0 = library default, one per core)
+SUMMARIZER_THREADS = int(os.getenv("SUMMARIZER_THREADS", 0))
+
+# Backends initialized by services.warmup() at server start (everything else is created on first use)
+PRELOAD_SERVICES = [s for s in os.getenv(
+    "PRELOAD_SERVICES", "openai,tokenizer,database,job_queue,blob_sweeper,vector_store,embedding_cache"
+).split(",") if s] + (["summarizer"] if SUMMARIZER_PRELOAD else [])
+
+# /query response cache
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", 3600))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 1000))
+# Cosine similarity above which a cached answer for a similar question is reused; empty disables
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD")) if os.getenv("SEMANTIC_CACHE_THRESHOLD") else None
+
+# Add a Server-Timing header with per-stage durations to every response
+TIMING_HEADER = os.getenv("TIMING_HEADER", "0") == "1"
+
+# Document store: content larger than this is stored compressed ("zlib" or "zstd")
+DOCUMENT_COMPRESSION = os.getenv("DOCUMENT_COMPRESSION", "zlib")
+DOCUMENT_COMPRESS_MIN_BYTES = int(os.getenv("DOCUMENT_COMPRESS_MIN_BYTES", 4096))
+
+# Hybrid retrieval: candidates taken from each retriever before reciprocal rank fusion
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 5))
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 20))
+RRF_K = int(os.getenv("RRF_K", 60))
+
+# Prompt assembly: most tokens sent to the chat model (context + question), leaving
+# room for the answer in gpt-3.5-turbo's 4k window. Passages whose word overlap with
+# an already selected one reaches PROMPT_DEDUP_THRESHOLD are dropped as near-duplicates.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 3000))
+PROMPT_DEDUP_THRESHOLD = float(os.getenv("PROMPT_DEDUP_THRESHOLD", 0.8))
+PROMPT_MMR_LAMBDA = float(os.getenv("PROMPT_MMR_LAMBDA", 0.7))
+
+# Speech-to-text: audio is decoded to 16 kHz mono PCM in memory; recordings longer
+# than TRANSCRIBE_SEGMENT_SECONDS are split on silence and recognized concurrently
+TRANSCRIBE_SAMPLE_RATE = int(os.getenv("TRANSCRIBE_SAMPLE_RATE", 16000))
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", 30))
+TRANSCRIBE_MIN_SILENCE_MS = int(os.getenv("TRANSCRIBE_MIN_SILENCE_MS", 400))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", 4))
+# Recognition of one segment is abandoned after TRANSCRIBE_TIMEOUT seconds plus
+# TRANSCRIBE_TIMEOUT_FACTOR times the segment's audio duration
+TRANSCRIBE_TIMEOUT = float(os.getenv("TRANSCRIBE_TIMEOUT", 30))
+TRANSCRIBE_TIMEOUT_FACTOR = float(os.getenv("TRANSCRIBE_TIMEOUT_FACTOR", 2))
+
+# /upload/bulk: most files accepted per request (including zip entries)
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", 1000))
+
+# Upload storage: files are stored once per content hash under UPLOAD_FOLDER/blobs
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(UPLOAD_FOLDER, "blobs"))
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", 50))
+# Whole request (e.g. /upload/bulk with many files)
+MAX_REQUEST_MB = int(os.getenv("MAX_REQUEST_MB", 500))
+# Retention: blobs not used for UPLOAD_RETENTION_DAYS are removed, and the least
+# recently used ones go first while the store is above UPLOAD_QUOTA_MB
+UPLOAD_QUOTA_MB = int(os.getenv("UPLOAD_QUOTA_MB", 5120))
+UPLOAD_RETENTION_DAYS = float(os.getenv("UPLOAD_RETENTION_DAYS", 30))
+UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", 3600))
+
+# Guards around the external AI calls (see resilience): deadline per call in seconds,
+# retries included; retries of transient errors; calls in flight per backend and process;
+# consecutive failures that open a backend's circuit, and how long it stays open
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", 30))
+VECTOR_TIMEOUT = float(os.getenv("VECTOR_TIMEOUT", 5))
+# Vector store writes during ingestion (large batches, index rebuilds)
+UPSERT_TIMEOUT = float(os.getenv("UPSERT_TIMEOUT", 120))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", 2))
+BACKEND_CONCURRENCY = int(os.getenv("BACKEND_CONCURRENCY", 32))
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", 5))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", 30))
@@ -0,0 +1,148 @@
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+import services
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_MEMORY_ENTRIES
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return f"{model}:{digest}"
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model, sha256 of normalized text).
+
+    Hot entries live in an in-memory LRU; everything is persisted in SQLite
+    as float32 blobs. When the table grows past max_entries the least
+    recently used rows are evicted. Access times of hits are buffered and
+    written in one batch (every TOUCH_FLUSH_SECONDS or TOUCH_FLUSH_ENTRIES
+    keys, and before evicting), so lookups do not each commit a write.
+    """
+
+    TOUCH_FLUSH_SECONDS = 60
+    TOUCH_FLUSH_ENTRIES = 1000
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings(
+            key TEXT PRIMARY KEY,
+            vector BLOB,
+            last_access REAL
+        )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+        self._last_flush = time.time()
+
+    def get_many(self, model: str, texts: list) -> list:
+        """Return cached vectors in input order, with None for misses."""
+        keys = [cache_key(model, t) for t in texts]
+        results = [None] * len(texts)
+        with self._lock:
+            missing = {}
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing:
+                found = []
+                key_list = list(missing)
+                for start in range(0, len(key_list), 500):
+                    batch = key_list[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    found.extend(self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ).fetchall())
+                for key, blob in found:
+                    vector = array('f', blob).tolist()
+                    self._remember(key, vector)
+                    for i in missing[key]:
+                        results[i] = vector
+
+            now = time.time()
+            for key, result in zip(keys, results):
+                if result is not None:
+                    self._touched[key] = now
+            if len(self._touched) >= self.TOUCH_FLUSH_ENTRIES or now - self._last_flush >= self.TOUCH_FLUSH_SECONDS:
+                self._flush_touched()
+                self._conn.commit()
+
+            hits = sum(r is not None for r in results)
+            self.hits += hits
+            self.misses += len(texts) - hits
+        return results
+
+    def put_many(self, model: str, texts: list, vectors: list):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = cache_key(model, text)
+                self._remember(key, vector)
+                rows.append((key, array('f', vector).tobytes(), now))
+            # Pending access times first, so eviction sees recently read entries as recent
+            self._flush_touched()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows)
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                excess = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)", (excess,))
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "memory_hits": self.memory_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+def get_embedding_cache():
+    return services.get("embedding_cache")
@@ -1,21 +1,110 @@
 import os
-import openai
-from pinecone import Pinecone
-from config import OPENAI_API_KEY, PINECONE_API_KEY, PINECONE_ENV, PINECONE_INDEX
-
-openai.api_key = OPENAI_API_KEY
-pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
-index = pc.Index(PINECONE_INDEX)
-
-def embed_text(text: str):
-    resp = openai.Embedding.create(
-        model='text-embedding-ada-002',
-        input=text
+import json
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    EMBED_BATCH_SIZE, EMBED_BATCH_MAX_TOKENS, EMBED_CONCURRENCY, UPSERT_BATCH_SIZE, EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_MODEL
+)
+from chunking import count_tokens
+import services
+import resilience
+from index_versions import active_version
+from vector_store import get_vector_store
+from embedding_cache import get_embedding_cache
+
+def embed_text(text: str, model=None):
+    return embed_texts([text], model=model)[0]
+
+_embed_pool = None
+_embed_pool_lock = threading.Lock()
+
+def _get_embed_pool():
+    global _embed_pool
+    with _embed_pool_lock:
+        if _embed_pool is None:
+            _embed_pool = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+    return _embed_pool
+
+def _request_batch(batch: list, model=EMBEDDING_MODEL):
+    # Identical batches in flight (e.g. the same question asked twice at once) share one request
+    guard = resilience.guard("embedding")
+    resp = guard.call(
+        services.get("openai").Embedding.create,
+        model=model,
+        input=batch,
+        request_timeout=guard.timeout,
+        key=(model, tuple(batch))
     )
-    return resp['data'][0]['embedding']
+    data = sorted(resp['data'], key=lambda d: d['index'])
+    return [d['embedding'] for d in data]
+
+def _batches(texts: list, batch_size, max_tokens=EMBED_BATCH_MAX_TOKENS):
+    # Split by input count and by total tokens so no request exceeds the API limits
+    batch, tokens = [], 0
+    for text in texts:
+        n = count_tokens(text)
+        if batch and (len(batch) >= batch_size or tokens + n > max_tokens):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += n
+    if batch:
+        yield batch
+
+def _request_embeddings(texts: list, batch_size, model=EMBEDDING_MODEL):
+    batches = list(_batches(texts, min(batch_size, 2048)))
+    request = partial(_request_batch, model=model)
+    if len(batches) <= 1 or EMBED_CONCURRENCY <= 1:
+        results = map(request, batches)
+    else:
+        # Independent batches are in flight together, up to EMBED_CONCURRENCY at a time
+        results = _get_embed_pool().map(request, batches)
+    return [vector for batch in results for vector in batch]
+
+def embed_texts(texts: list, batch_size=EMBED_BATCH_SIZE, model=None):
+    """
+    Embed many texts using one Embedding.create call per batch, preserving input order.
+
+    model defaults to the one the active index version was built with.
+    Texts already in the embedding cache skip the API call entirely.
+    """
+    model = model or active_version()["model"]
+    if not EMBEDDING_CACHE_ENABLED:
+        return _request_embeddings(texts, batch_size, model)
+
+    cache = get_embedding_cache()
+    vectors = cache.get_many(model, texts)
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        # Identical texts within one call are only sent once
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = dict(zip(unique, _request_embeddings(unique, batch_size, model)))
+        cache.put_many(model, unique, [fresh[t] for t in unique])
+        for i in missing:
+            vectors[i] = fresh[texts[i]]
+    return vectors
 
 def upsert_vector(id: str, vector: list, metadata: dict):
-    index.upsert(vectors=[{"id": id, "values": vector, "metadata": metadata}])
+    get_vector_store().upsert([{"id": id, "values": vector, "metadata": metadata}])
+
+def upsert_vectors(vectors: list, batch_size=UPSERT_BATCH_SIZE, version=None):
+    """Upsert {"id", "values", "metadata"} records in bounded batches (into the active index version by default)."""
+    store = get_vector_store(version)
+    # Writes have their own deadline and circuit, separate from queries
+    guard = resilience.guard("upsert")
+    for i in range(0, len(vectors), batch_size):
+        guard.call(store.upsert, vectors[i:i + batch_size])
+
+def query_similar(vector: list, top_k=3, filter=None, version=None):
+    """
+    Return the top_k most similar vectors as {"id", "score", "metadata"} matches.
 
-def query_similar(vector: list, top_k=3):
-    return index.query(vector=vector, top_k=top_k, include_metadata=True)['matches']
\ No newline at end of file
+    filter restricts the search by metadata before scoring, e.g. {"doc_id": file_id}.
+    The active index version is searched unless another version is given.
+    Raises resilience.BackendUnavailable when the vector store is down or too slow.
+    """
+    store = get_vector_store(version)
+    key = (id(store), tuple(vector), top_k, json.dumps(filter, sort_keys=True))
+    return resilience.guard("vector").call(store.query, vector, top_k=top_k, filter=filter, key=key)
@@ -1,19 +1,138 @@
 import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
+from config import PARALLEL_PDF_MIN_PAGES, PDF_PAGES_PER_TASK, OCR_FALLBACK, OCR_PROCESSES
 
-def extract_text(file_path):
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf') + IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+def _extract_pages(file_path, start, stop):
+    # Runs in a worker process; each worker opens its own reader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+def _iter_pdf_pages(file_path, executor, workers=None):
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+
+    if executor is None:
+        for i, page in enumerate(reader.pages):
+            yield i + 1, page.extract_text() or ''
+        return
+
+    if page_count < PARALLEL_PDF_MIN_PAGES:
+        # Too small to split, but still decoded off the calling thread
+        for offset, text in enumerate(executor.submit(_extract_pages, file_path, 0, page_count).result()):
+            yield offset + 1, text
+        return
+
+    # Keep a bounded window of page ranges in flight and yield them in order
+    ranges = deque((s, min(s + PDF_PAGES_PER_TASK, page_count)) for s in range(0, page_count, PDF_PAGES_PER_TASK))
+    window = max(2, 2 * (workers or 1))
+    in_flight = deque()
+    while ranges or in_flight:
+        while ranges and len(in_flight) < window:
+            start, stop = ranges.popleft()
+            in_flight.append((start, executor.submit(_extract_pages, file_path, start, stop)))
+        start, future = in_flight.popleft()
+        for offset, text in enumerate(future.result()):
+            yield start + offset + 1, text
+
+def _ocr_failed(file_path, page_number, error):
+    # OCR is best effort: the page keeps its (empty) text layer and ingestion goes on
+    logger.warning(f"OCR failed for page {page_number} of {file_path} ({type(error).__name__}: {error}); "
+                   "keeping its text layer")
+
+def _page_text(file_path, page_number, text, future):
+    if future is None:
+        return text
+    try:
+        return future.result()
+    except Exception as e:
+        _ocr_failed(file_path, page_number, e)
+        return text
+
+def _with_ocr_fallback(file_path, pages):
+    # Pages whose text layer is empty (scans) are OCR'd on the OCR pool while
+    # later pages keep streaming; results are still yielded in page order.
+    import ocr_service
+    pending = deque()
+    for page_number, text in pages:
+        future = None if text.strip() else ocr_service.submit_page(file_path, page_number)
+        pending.append((page_number, text, future))
+        while pending and (pending[0][2] is None or pending[0][2].done() or len(pending) > 2 * OCR_PROCESSES):
+            page_number, text, future = pending.popleft()
+            yield page_number, _page_text(file_path, page_number, text, future)
+    while pending:
+        page_number, text, future = pending.popleft()
+        yield page_number, _page_text(file_path, page_number, text, future)
+
+def _ocr_page_inline(file_path, page_number, text):
+    import ocr_service
+    if not ocr_service.pdf_ocr_available():
+        return text
+    try:
+        return ocr_service.ocr_pdf_page(file_path, page_number)
+    except Exception as e:
+        _ocr_failed(file_path, page_number, e)
+        return text
+
+def iter_pages(file_path, executor=None, processes=None, ocr_fallback=OCR_FALLBACK):
+    """
+    Yield (page_number, text) pairs as pages are decoded.
+
+    Args:
+        file_path (str): Path to a .txt or .pdf file.
+        executor (Executor): Optional process pool PDFs are extracted on (large ones in parallel page ranges).
+        processes (int): Number of workers in executor, or the size of a temporary
+            process pool created when no executor is given.
+        ocr_fallback (bool): OCR PDF pages that have no text layer, and accept image files.
+
+    Yields:
+        tuple: 1-based page number and page text, in page order.
+    """
     ext = os.path.splitext(file_path)[1].lower()
 
     if ext == '.txt':
         with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+            yield 1, f.read()
 
     elif ext == '.pdf':
-        reader = PdfReader(file_path)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text() or ''
-        return text
+        if executor is None and processes:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                yield from iter_pages(file_path, executor=pool, processes=processes, ocr_fallback=ocr_fallback)
+            return
+        pages = _iter_pdf_pages(file_path, executor, processes)
+        yield from _with_ocr_fallback(file_path, pages) if ocr_fallback else pages
+
+    elif ext in IMAGE_EXTENSIONS and ocr_fallback:
+        import ocr_service
+        yield 1, ocr_service.submit_image(file_path).result()
 
     else:
-        return "Unsupported file type"
\ No newline at end of file
+        raise ValueError(f"Unsupported file type: {ext}")
+
+def extract_pages(file_path, ocr_fallback=OCR_FALLBACK):
+    """
+    Extract all pages of a file in the calling process and return [(page_number, text)].
+
+    Meant to be submitted to a process pool so many files are extracted in
+    parallel; OCR runs inline here rather than on the shared OCR pool.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS and ocr_fallback:
+        import ocr_service
+        return [(1, ocr_service.ocr_image(file_path))]
+    pages = list(iter_pages(file_path, ocr_fallback=False))
+    if ext == '.pdf' and ocr_fallback:
+        pages = [(n, text if text.strip() else _ocr_page_inline(file_path, n, text)) for n, text in pages]
+    return pages
+
+def extract_text(file_path, executor=None, processes=None):
+    if os.path.splitext(file_path)[1].lower() not in SUPPORTED_EXTENSIONS:
+        return "Unsupported file type"
+    return ''.join(text for _, text in iter_pages(file_path, executor=executor, processes=processes))
@@ -0,0 +1,150 @@
+"""
+Versions of the retrieval index.
+
+A version is one complete embedding of the document store: the chunk vectors
+built with a given embedding model and chunk size, kept in their own Pinecone
+namespace (or local index directory), plus their rows in the chunks table.
+Queries and new uploads use the active version. reindex.py builds a new
+version next to the active one and switches to it in a single transaction
+once it is complete, so readers never see a half-built index.
+
+The legacy version "" (Pinecone's default namespace / LOCAL_INDEX_DIR, built
+with EMBEDDING_MODEL and the configured chunk size) is active until another
+version is activated.
+"""
+import time
+import threading
+from query_service import get_connection, transaction
+from config import (
+    EMBEDDING_MODEL, EMBEDDING_DIM, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, INDEX_VERSION_REFRESH_SECONDS
+)
+
+_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS index_versions(
+    version TEXT PRIMARY KEY,
+    model TEXT,
+    dim INTEGER,
+    chunk_tokens INTEGER,
+    chunk_overlap INTEGER,
+    status TEXT,
+    created_at REAL,
+    activated_at REAL
+)
+"""
+_COLUMNS = ["version", "model", "dim", "chunk_tokens", "chunk_overlap", "status", "created_at", "activated_at"]
+_SETTINGS = ["model", "dim", "chunk_tokens", "chunk_overlap"]
+
+LEGACY = {
+    "version": "", "model": EMBEDDING_MODEL, "dim": EMBEDDING_DIM, "chunk_tokens": CHUNK_TOKENS,
+    "chunk_overlap": CHUNK_OVERLAP_TOKENS, "status": "active", "created_at": None, "activated_at": None,
+}
+
+_table_ready = False
+_active = None
+_active_checked = 0.0
+_active_lock = threading.Lock()
+
+
+def _db():
+    global _table_ready
+    if not _table_ready:
+        with transaction() as conn:
+            conn.execute(_VERSIONS_TABLE)
+        _table_ready = True
+    return get_connection()
+
+
+def _version(row):
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def get_version(version: str):
+    """A version's settings and status, or None if it was never created."""
+    row = _db().execute(f"SELECT {', '.join(_COLUMNS)} FROM index_versions WHERE version = ?", (version,)).fetchone()
+    if row is None and version == "":
+        return dict(LEGACY, status="active" if _active_row() is None else "retired")
+    return _version(row)
+
+
+def list_versions() -> list:
+    rows = _db().execute(f"SELECT {', '.join(_COLUMNS)} FROM index_versions ORDER BY created_at").fetchall()
+    return [_version(row) for row in rows]
+
+
+def _active_row():
+    return _version(_db().execute(
+        f"SELECT {', '.join(_COLUMNS)} FROM index_versions WHERE status = 'active'"
+    ).fetchone())
+
+
+def active_version(max_age=INDEX_VERSION_REFRESH_SECONDS) -> dict:
+    """
+    The version queries and uploads should use.
+
+    Read from SQLite at most every max_age seconds, so other processes pick
+    up a switch shortly after reindex.py activates a version.
+    """
+    global _active, _active_checked
+    now = time.monotonic()
+    if _active is None or now - _active_checked >= max_age:
+        with _active_lock:
+            if _active is None or now - _active_checked >= max_age:
+                _active = _active_row() or dict(LEGACY)
+                _active_checked = now
+    return _active
+
+
+def create_version(version: str, model=EMBEDDING_MODEL, dim=EMBEDDING_DIM, chunk_tokens=CHUNK_TOKENS,
+                   chunk_overlap=CHUNK_OVERLAP_TOKENS) -> dict:
+    """
+    Register a version to build, or return it if it exists with the same settings.
+
+    Raises:
+        ValueError: The version exists with different settings.
+    """
+    settings = {"model": model, "dim": dim, "chunk_tokens": chunk_tokens, "chunk_overlap": chunk_overlap}
+    existing = get_version(version)
+    if existing is not None:
+        changed = [k for k in _SETTINGS if existing[k] != settings[k]]
+        if changed:
+            raise ValueError(f"Index version '{version}' already exists with different {', '.join(changed)}")
+        return existing
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO index_versions (version, model, dim, chunk_tokens, chunk_overlap, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, 'building', ?)",
+            (version, model, dim, chunk_tokens, chunk_overlap, time.time())
+        )
+    return get_version(version)
+
+
+def activate(version: str) -> dict:
+    """Make version the active one; the previously active version is retired in the same transaction."""
+    global _active
+    target = get_version(version)
+    if target is None:
+        raise ValueError(f"Unknown index version '{version}'")
+    now = time.time()
+    with transaction() as conn:
+        conn.execute("UPDATE index_versions SET status = 'retired' WHERE status = 'active'")
+        if version == "" and target["created_at"] is None:
+            # Rolling back to the legacy index, which has no row yet
+            conn.execute(
+                "INSERT INTO index_versions (version, model, dim, chunk_tokens, chunk_overlap, status, created_at) "
+                "VALUES ('', ?, ?, ?, ?, 'retired', ?)",
+                (target["model"], target["dim"], target["chunk_tokens"], target["chunk_overlap"], now)
+            )
+        conn.execute(
+            "UPDATE index_versions SET status = 'active', activated_at = ? WHERE version = ?", (now, version)
+        )
+    with _active_lock:
+        _active = None
+    return get_version(version)
+
+
+def delete_version(version: str):
+    """Forget a retired version (its vectors and chunk rows are removed by the caller)."""
+    if active_version(max_age=0)["version"] == version:
+        raise ValueError(f"Index version '{version}' is active")
+    with transaction() as conn:
+        conn.execute("DELETE FROM index_versions WHERE version = ?", (version,))
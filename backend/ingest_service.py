@@ -0,0 +1,134 @@
+import metrics
+from chunking import iter_chunks
+from embedding_service import embed_texts, upsert_vectors
+from query_service import save_chunks, delete_chunks
+from index_versions import active_version, get_version
+from config import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, UPSERT_BATCH_SIZE, CHUNK_PREVIEW_CHARS
+
+
+def chunk_id(doc_id: str, n: int) -> str:
+    return f"{doc_id}#{n}"
+
+
+def parse_chunk_id(vector_id: str):
+    doc_id, _, n = vector_id.rpartition('#')
+    if not doc_id or not n.isdigit():
+        return vector_id, None
+    return doc_id, int(n)
+
+
+def chunk_metadata(doc_id: str, chunk, metadata=None) -> dict:
+    """
+    Metadata stored with each chunk vector.
+
+    Only a short preview is kept in the vector store; the full chunk text is
+    recovered from the SQLite document with the start/end character offsets.
+    """
+    meta = dict(metadata or {})
+    meta.update({
+        "doc_id": doc_id,
+        "chunk": chunk.index,
+        "start": chunk.start,
+        "end": chunk.end,
+        "preview": chunk.text[:CHUNK_PREVIEW_CHARS],
+    })
+    return meta
+
+
+def ingest_document(doc_id: str, segments, metadata=None, on_progress=None):
+    """
+    Chunk, embed and upsert a document.
+
+    Args:
+        doc_id (str): Document ID; chunk vectors are stored as "<doc_id>#<n>".
+        segments (str or iterable): Document text, or an iterable of text segments (e.g. pages).
+        metadata (dict): Extra metadata stored with every chunk (e.g. filename).
+        on_progress (callable): Called with the number of chunks upserted so far.
+
+    Returns:
+        dict: Number of chunks and tokens, and time spent embedding and upserting.
+    """
+    progress = (lambda _, upserted: on_progress(upserted)) if on_progress else None
+    return ingest_documents([(doc_id, segments, metadata)], on_progress=progress)[doc_id]
+
+
+def ingest_documents(documents, on_progress=None, version=None):
+    """
+    Chunk, embed and upsert several documents with shared batches.
+
+    Chunks from consecutive documents are packed into the same embedding
+    requests and upsert batches, so many small files cost a few API calls
+    instead of one or more each.
+
+    Args:
+        documents (iterable): (doc_id, segments, metadata) tuples; consumed lazily.
+        on_progress (callable): Called with (doc_id, chunks upserted so far for that document).
+        version (str): Index version to write to (see index_versions); the
+            active one by default. Its embedding model and chunk size are used.
+
+    Returns:
+        dict: {doc_id: stats} with the same fields as ingest_document. Embed and
+        upsert times are those of the shared batches each document took part in.
+    """
+    index = active_version() if version is None else get_version(version)
+    if index is None:
+        raise ValueError(f"Unknown index version '{version}'")
+    all_stats = {}
+    batch = []
+    pending = []
+    # Enough chunks are collected to keep EMBED_CONCURRENCY embedding requests in flight
+    embed_window = EMBED_BATCH_SIZE * max(1, EMBED_CONCURRENCY)
+
+    def flush_embeddings():
+        with metrics.timed("embed") as timer:
+            vectors = embed_texts([c.text for _, c, _ in batch], batch_size=EMBED_BATCH_SIZE, model=index["model"])
+        by_doc = {}
+        for doc_id, c, _ in batch:
+            by_doc.setdefault(doc_id, []).append(c)
+        for doc_id in by_doc:
+            all_stats[doc_id]["embed_time"] += timer["seconds"]
+        with metrics.timed("save"):
+            for doc_id, chunks in by_doc.items():
+                save_chunks(doc_id, chunks, version=index["version"])
+        for (doc_id, c, metadata), values in zip(batch, vectors):
+            pending.append((doc_id, {
+                "id": chunk_id(doc_id, c.index),
+                "values": values,
+                "metadata": chunk_metadata(doc_id, c, metadata),
+            }))
+        batch.clear()
+
+    def flush_upserts():
+        with metrics.timed("upsert") as timer:
+            upsert_vectors([record for _, record in pending], batch_size=UPSERT_BATCH_SIZE, version=index["version"])
+        counts = {}
+        for doc_id, _ in pending:
+            counts[doc_id] = counts.get(doc_id, 0) + 1
+        pending.clear()
+        for doc_id, n in counts.items():
+            all_stats[doc_id]["upsert_time"] += timer["seconds"]
+            all_stats[doc_id]["upserted"] += n
+            if on_progress:
+                on_progress(doc_id, all_stats[doc_id]["upserted"])
+
+    for doc_id, segments, metadata in documents:
+        if isinstance(segments, str):
+            segments = [segments]
+        stats = all_stats[doc_id] = {"chunks": 0, "tokens": 0, "upserted": 0, "embed_time": 0.0, "upsert_time": 0.0}
+        # Chunk text is also stored in SQLite for keyword search and context lookup
+        delete_chunks(doc_id, version=index["version"])
+        for chunk in iter_chunks(segments, max_tokens=index["chunk_tokens"], overlap_tokens=index["chunk_overlap"]):
+            batch.append((doc_id, chunk, metadata))
+            stats["chunks"] += 1
+            stats["tokens"] += chunk.tokens
+            if len(batch) >= embed_window:
+                flush_embeddings()
+            if len(pending) >= UPSERT_BATCH_SIZE:
+                flush_upserts()
+
+    if batch:
+        flush_embeddings()
+    if pending:
+        flush_upserts()
+    metrics.inc("chunks_indexed_total", sum(s["chunks"] for s in all_stats.values()))
+    return all_stats
@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+import metrics
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from config import INGEST_WORKERS, EXTRACT_PROCESSES
+from extract_text import iter_pages, extract_pages
+from query_service import save_document, get_connection, transaction
+from ingest_service import ingest_document, ingest_documents
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["extract", "save", "embed", "upsert"]
+
+_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS jobs(
+    id TEXT PRIMARY KEY,
+    doc_id TEXT,
+    path TEXT,
+    filename TEXT,
+    status TEXT,
+    stage TEXT,
+    stages TEXT,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL,
+    owner TEXT
+)
+"""
+_table_ready = False
+
+# Threads handle I/O-bound stages (SQLite, OpenAI, vector store); text
+# extraction is CPU-bound and runs in a separate process pool.
+_workers = None
+_extractors = None
+_pool_lock = threading.Lock()
+
+
+def _db():
+    global _table_ready
+    if not _table_ready:
+        with transaction() as conn:
+            conn.execute(_JOBS_TABLE)
+            if 'owner' not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        _table_ready = True
+    return get_connection()
+
+
+def _start_time(pid):
+    # Process start time (clock ticks since boot) from /proc; None where there is no /proc
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Field 22; the command name before it is in parentheses and may contain spaces
+    return stat.rsplit(')', 1)[1].split()[19]
+
+
+_boot_tokens = {}
+
+
+def _boot_token():
+    # Tells this process apart from an earlier one that had the same pid (e.g. PID 1
+    # in a restarted container); per pid, since workers are forked after import
+    pid = os.getpid()
+    if pid not in _boot_tokens:
+        _boot_tokens[pid] = _start_time(pid) or uuid.uuid4().hex
+    return _boot_tokens[pid]
+
+
+def _owner():
+    # The process running a job; read at call time, since workers are forked after import
+    return f"{socket.gethostname()}:{os.getpid()}:{_boot_token()}"
+
+
+def _owner_alive(owner):
+    parts = (owner or '').rsplit(':', 2)
+    if len(parts) == 2:
+        # Owner written before boot tokens were recorded
+        parts.append(None)
+    if len(parts) != 3 or not parts[1].isdigit():
+        return False
+    host, pid, token = parts[0], int(parts[1]), parts[2]
+    if host != socket.gethostname():
+        # Another machine's process cannot be checked; leave its jobs alone
+        return True
+    if pid == os.getpid():
+        # Only this very process, not an earlier one with the same pid
+        return token == _boot_token()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    started = _start_time(pid)
+    if token is not None and started is not None:
+        # The pid has been reused by a process started later
+        return token == started
+    return True
+
+
+def _claim(job_id, previous_owner):
+    """Take over an orphaned job; only one of several processes racing for it wins."""
+    with transaction() as conn:
+        claimed = conn.execute(
+            "UPDATE jobs SET owner = ?, status = 'queued', updated_at = ? "
+            "WHERE id = ? AND owner IS ? AND status IN ('queued', 'running')",
+            (_owner(), time.time(), job_id, previous_owner)
+        ).rowcount
+    return claimed == 1
+
+
+def _update(job_id, **fields):
+    fields["updated_at"] = time.time()
+    if "stages" in fields:
+        fields["stages"] = json.dumps(fields["stages"])
+    columns = ', '.join(f"{k} = ?" for k in fields)
+    _db()
+    with transaction() as conn:
+        conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+_JOB_COLUMNS = ["id", "doc_id", "filename", "status", "stage", "stages", "error", "created_at", "updated_at"]
+
+
+def _job(row):
+    if not row:
+        return None
+    job = dict(zip(_JOB_COLUMNS, row))
+    job["stages"] = json.loads(job["stages"] or "{}")
+    return job
+
+
+def get_job(job_id: str):
+    return _job(_db().execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def latest_job(doc_id: str):
+    """Most recent ingestion job for a document, or None."""
+    return _job(_db().execute(
+        f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE doc_id = ? ORDER BY created_at DESC LIMIT 1", (doc_id,)
+    ).fetchone())
+
+
+def filenames(doc_ids) -> dict:
+    """Original filename of each document that was uploaded through the queue, {doc_id: filename}."""
+    doc_ids = list(doc_ids)
+    found = {}
+    conn = _db()
+    for start in range(0, len(doc_ids), 500):
+        batch = doc_ids[start:start + 500]
+        placeholders = ','.join('?' * len(batch))
+        for doc_id, filename in conn.execute(
+                f"SELECT doc_id, filename FROM jobs WHERE doc_id IN ({placeholders}) ORDER BY created_at", batch):
+            found[doc_id] = filename
+    return found
+
+
+def active_paths():
+    """Paths of files that queued or running jobs still need to read."""
+    return _db().execute("SELECT DISTINCT path FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+
+
+def _get_pools():
+    global _workers, _extractors
+    with _pool_lock:
+        if _workers is None:
+            _workers = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+            _extractors = ProcessPoolExecutor(max_workers=EXTRACT_PROCESSES)
+    return _workers, _extractors
+
+
+def _insert_jobs(items):
+    job_ids = [str(uuid.uuid4()) for _ in items]
+    now = time.time()
+    owner = _owner()
+    stages = json.dumps({name: {"status": "pending"} for name in STAGES})
+    _db()
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO jobs (id, doc_id, path, filename, status, stage, stages, error, created_at, updated_at, owner) "
+            "VALUES (?, ?, ?, ?, 'queued', NULL, ?, NULL, ?, ?, ?)",
+            [(job_id, doc_id, path, filename, stages, now, now, owner)
+             for job_id, (doc_id, path, filename) in zip(job_ids, items)]
+        )
+    return job_ids
+
+
+def enqueue(doc_id: str, path: str, filename: str) -> str:
+    """Record an ingestion job for a saved upload and hand it to the worker pool."""
+    job_id, = _insert_jobs([(doc_id, path, filename)])
+    workers, _ = _get_pools()
+    workers.submit(_run, job_id)
+    return job_id
+
+
+def enqueue_batch(items) -> list:
+    """
+    Record one job per (doc_id, path, filename) and ingest them together.
+
+    Files are extracted in parallel on the process pool and their chunks share
+    embedding and upsert batches (see ingest_documents). Each file still has
+    its own job, so progress and errors are reported per file.
+    """
+    items = list(items)
+    job_ids = _insert_jobs(items)
+    workers, _ = _get_pools()
+    workers.submit(_run_batch, job_ids)
+    return job_ids
+
+
+def _run(job_id: str):
+    doc_id, path, filename = _db().execute(
+        "SELECT doc_id, path, filename FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    stages = {name: {"status": "pending"} for name in STAGES}
+    _update(job_id, status="running", stages=stages)
+    _, extractors = _get_pools()
+    start_time = time.perf_counter()
+
+    def begin(stage):
+        stages[stage] = {"status": "running"}
+        _update(job_id, stage=stage, stages=stages)
+        return time.perf_counter()
+
+    def finish(stage, started, **extra):
+        stages[stage] = {"status": "done", "duration": round(time.perf_counter() - started, 3), **extra}
+        _update(job_id, stages=stages)
+
+    # Pages stream from the extractor into chunking/embedding, so indexing
+    # starts on the first pages while later ones are still being decoded.
+    pages = []
+    extract_time = 0.0
+    extract_failed = False
+    page_iter = iter_pages(path, executor=extractors, processes=EXTRACT_PROCESSES)
+
+    def next_page():
+        nonlocal extract_time, extract_failed
+        started = time.perf_counter()
+        try:
+            return next(page_iter, None)
+        except Exception:
+            extract_failed = True
+            raise
+        finally:
+            extract_time += time.perf_counter() - started
+
+    def save_text():
+        # The text is stored as soon as it is extracted, before the last embeddings,
+        # so /query can fall back to it even when embedding or upsert fails
+        stages["extract"] = {"status": "done", "duration": round(extract_time, 3), "pages": len(pages)}
+        metrics.record_stage("extract", extract_time)
+        metrics.inc("pages_processed_total", len(pages))
+        started = begin("save")
+        with metrics.timed("save"):
+            save_document(doc_id, ''.join(pages))
+        finish("save", started)
+
+    try:
+        begin("extract")
+        begin("embed")
+
+        def page_texts():
+            while (page := next_page()) is not None:
+                page_number, text = page
+                pages.append(text)
+                stages["extract"]["pages"] = page_number
+                yield text
+            save_text()
+
+        stages["upsert"] = {"status": "running", "chunks": 0}
+
+        def on_progress(upserted):
+            stages["upsert"]["chunks"] = upserted
+            _update(job_id, stages=stages)
+
+        stats = ingest_document(doc_id, page_texts(), {"filename": filename}, on_progress=on_progress)
+        stages["embed"] = {"status": "done", "duration": round(stats["embed_time"], 3), "chunks": stats["chunks"]}
+        stages["upsert"] = {"status": "done", "duration": round(stats["upsert_time"], 3), "chunks": stats["upserted"]}
+        _update(job_id, status="done", stage=None, stages=stages)
+        metrics.inc("ingestion_jobs_total", status="done")
+
+        logger.info("Ingestion Performance Metrics:")
+        logger.info(f"  Job ID: {job_id}")
+        logger.info(f"  Document ID: {doc_id}")
+        logger.info(f"  Filename: {filename}")
+        for name in STAGES:
+            logger.info(f"  {name.title()} Time: {stages[name].get('duration', 0):.3f} seconds")
+        logger.info(f"  Pages: {len(pages)} ({len(pages) / extract_time if extract_time else 0:.2f} pages/second)")
+        logger.info(f"  Chunks: {stats['chunks']}")
+        logger.info(f"  Total Ingestion Time: {time.perf_counter() - start_time:.3f} seconds")
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+        if stages["save"]["status"] == "pending" and not extract_failed:
+            # Embedding or upsert failed mid-stream: finish extracting and keep the text,
+            # so the document is still served from SQLite; only embed/upsert are marked failed
+            try:
+                while (page := next_page()) is not None:
+                    pages.append(page[1])
+                save_text()
+            except Exception as save_error:
+                logger.error(f"Could not save the text of {doc_id}: {str(save_error)}")
+        for stage in stages.values():
+            if stage["status"] == "running":
+                stage["status"] = "failed"
+        _update(job_id, status="failed", stages=stages, error=str(e))
+        metrics.inc("ingestion_jobs_total", status="failed")
+
+
+def _run_batch(job_ids):
+    _, extractors = _get_pools()
+    start_time = time.perf_counter()
+    jobs = {}
+    for job_id in job_ids:
+        doc_id, path, filename = _db().execute(
+            "SELECT doc_id, path, filename FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        stages = {name: {"status": "pending"} for name in STAGES}
+        stages["extract"] = {"status": "running"}
+        jobs[job_id] = {"doc_id": doc_id, "filename": filename, "stages": stages, "pages": None, "failed": False,
+                        "future": extractors.submit(extract_pages, path)}
+        _update(job_id, status="running", stage="extract", stages=stages)
+
+    def fail(job_id, error):
+        jobs[job_id]["failed"] = True
+        stages = jobs[job_id]["stages"]
+        for stage in stages.values():
+            if stage["status"] == "running":
+                stage["status"] = "failed"
+        _update(job_id, status="failed", stages=stages, error=error)
+        metrics.inc("ingestion_jobs_total", status="failed")
+        logger.error(f"Ingestion job {job_id} failed: {error}")
+
+    def extracted():
+        # Files are extracted in parallel and handed to ingestion as each one finishes
+        by_future = {job["future"]: job_id for job_id, job in jobs.items()}
+        for future in as_completed(by_future):
+            job_id = by_future[future]
+            job = jobs[job_id]
+            try:
+                job["pages"] = [text for _, text in future.result()]
+            except Exception as e:
+                fail(job_id, str(e))
+                continue
+            elapsed = time.perf_counter() - start_time
+            job["stages"]["extract"] = {"status": "done", "duration": round(elapsed, 3), "pages": len(job["pages"])}
+            # Saved before its chunks are embedded, so a failed shared batch still leaves the text in SQLite
+            try:
+                with metrics.timed("save") as timer:
+                    save_document(job["doc_id"], ''.join(job["pages"]))
+            except Exception as e:
+                job["pages"] = None
+                fail(job_id, str(e))
+                continue
+            job["stages"]["save"] = {"status": "done", "duration": round(timer["seconds"], 3)}
+            job["stages"]["embed"] = {"status": "running"}
+            _update(job_id, stage="embed", stages=job["stages"])
+            metrics.inc("pages_processed_total", len(job["pages"]))
+            yield job["doc_id"], job["pages"], {"filename": job["filename"]}
+        metrics.record_stage("extract", time.perf_counter() - start_time)
+
+    try:
+        stats = ingest_documents(extracted())
+        done = [job_id for job_id, job in jobs.items() if job["pages"] is not None]
+    except Exception as e:
+        # A failed shared embedding or upsert batch fails every file that reached it, and
+        # the files still being extracted: none of them is left running
+        for job_id, job in jobs.items():
+            if not job["failed"]:
+                job["future"].cancel()
+                fail(job_id, str(e))
+        return
+
+    for job_id in done:
+        stages = jobs[job_id]["stages"]
+        doc_stats = stats[jobs[job_id]["doc_id"]]
+        stages["embed"] = {"status": "done", "duration": round(doc_stats["embed_time"], 3), "chunks": doc_stats["chunks"]}
+        stages["upsert"] = {"status": "done", "duration": round(doc_stats["upsert_time"], 3), "chunks": doc_stats["upserted"]}
+        _update(job_id, status="done", stage=None, stages=stages)
+        metrics.inc("ingestion_jobs_total", status="done")
+
+    logger.info("Batch Ingestion Performance Metrics:")
+    logger.info(f"  Files: {len(job_ids)} ({len(done)} done, {len(job_ids) - len(done)} failed)")
+    logger.info(f"  Chunks: {sum(s['chunks'] for s in stats.values())}")
+    logger.info(f"  Total Ingestion Time: {time.perf_counter() - start_time:.3f} seconds")
+
+
+def start():
+    """
+    Resubmit jobs that were queued or running in a process that has since stopped.
+
+    Every server worker calls this at startup; jobs of live processes are left
+    alone, and each orphaned job is claimed by exactly one worker.
+    """
+    candidates = [(job_id, owner) for job_id, owner in _db().execute(
+        "SELECT id, owner FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+    ) if not _owner_alive(owner)]
+    claimed = [job_id for job_id, owner in candidates if _claim(job_id, owner)]
+    if not claimed:
+        return
+    logger.info(f"Resuming {len(claimed)} ingestion job(s)")
+    workers, _ = _get_pools()
+    for job_id in claimed:
+        workers.submit(_run, job_id)
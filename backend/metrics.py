@@ -0,0 +1,163 @@
+import os
+import time
+import resource
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+METRIC_PREFIX = 'jarvis_'
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_summaries = {}
+_counters = {}
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+_last_cpu_sample = None
+
+
+class Summary:
+    """Count/sum of every observation plus a sliding window of recent samples for quantiles."""
+
+    def __init__(self, window=2048):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self, qs=QUANTILES):
+        samples = sorted(self._samples)
+        if not samples:
+            return {q: 0.0 for q in qs}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in qs}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    with _lock:
+        key = _key(name, labels)
+        if key not in _summaries:
+            _summaries[key] = Summary()
+        _summaries[key].observe(value)
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_stage(stage, seconds):
+    observe('stage_duration_seconds', seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage):
+    """Time a pipeline stage (extract, save, embed, upsert, search, llm, transcribe) with a monotonic clock."""
+    timer = {'seconds': 0.0}
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer['seconds'] = time.perf_counter() - start
+        record_stage(stage, timer['seconds'])
+
+
+def start_request():
+    """Begin collecting stage timings for the current request (see request_timings)."""
+    _request_timings.set({})
+
+
+def request_timings():
+    return _request_timings.get() or {}
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Peak RSS; reported in KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def resource_usage():
+    """Actual process CPU time, CPU utilization since the previous sample, and resident memory."""
+    global _last_cpu_sample
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_seconds = usage.ru_utime + usage.ru_stime
+    now = time.monotonic()
+    with _lock:
+        previous, _last_cpu_sample = _last_cpu_sample, (now, cpu_seconds)
+    cpu_percent = 0.0
+    if previous and now > previous[0]:
+        cpu_percent = 100.0 * (cpu_seconds - previous[1]) / (now - previous[0])
+    return {'cpu_seconds': cpu_seconds, 'cpu_percent': cpu_percent, 'rss_bytes': _rss_bytes()}
+
+
+def snapshot():
+    """Plain-dict view of all metrics, e.g. for benchmark reports."""
+    with _lock:
+        summaries = {
+            (name, labels): {'count': s.count, 'sum': s.sum, **{f'p{int(q * 100)}': v for q, v in s.quantiles().items()}}
+            for (name, labels), s in _summaries.items()
+        }
+        counters = dict(_counters)
+    return {
+        'summaries': [{'name': n, 'labels': dict(l), **v} for (n, l), v in summaries.items()],
+        'counters': [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in counters.items()],
+    }
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{str(v)}"' for k, v in items) + '}'
+
+
+def render_prometheus():
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    usage = resource_usage()
+    lines += [
+        f'# TYPE {METRIC_PREFIX}process_cpu_seconds_total counter',
+        f'{METRIC_PREFIX}process_cpu_seconds_total {usage["cpu_seconds"]:.6f}',
+        f'# TYPE {METRIC_PREFIX}process_resident_memory_bytes gauge',
+        f'{METRIC_PREFIX}process_resident_memory_bytes {usage["rss_bytes"]}',
+    ]
+    with _lock:
+        seen = set()
+        for (name, labels), s in sorted(_summaries.items()):
+            metric = METRIC_PREFIX + name
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f'# TYPE {metric} summary')
+            for q, v in s.quantiles().items():
+                lines.append(f'{metric}{_format_labels(labels, quantile=q)} {v:.6f}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {s.sum:.6f}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {s.count}')
+        for (name, labels), value in sorted(_counters.items()):
+            metric = METRIC_PREFIX + name
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _summaries.clear()
+        _counters.clear()
@@ -1,17 +1,97 @@
 import os
-import easyocr
-import pytesseract
-from pdf2image import convert_from_path
-from config import UPLOAD_FOLDER
+import logging
+import threading
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import OCR_PROCESSES, OCR_DPI
+
+logger = logging.getLogger(__name__)
+
+# One EasyOCR reader per worker process, loaded on the first image task and kept
+_reader = None
+_pool = None
+_pool_lock = threading.Lock()
+_pdf_ocr_available = None
+
+def _get_reader():
+    global _reader
+    if _reader is None:
+        import easyocr
+        _reader = easyocr.Reader(['en'], gpu=False)
+    return _reader
+
+def ocr_image(file_path):
+    return ' '.join([res[1] for res in _get_reader().readtext(file_path)])
+
+def ocr_pdf_page(file_path, page_number, dpi=OCR_DPI):
+    """Rasterize a single PDF page (1-based) and run Tesseract on it."""
+    import pytesseract
+    from pdf2image import convert_from_path
+    images = convert_from_path(file_path, dpi=dpi, first_page=page_number, last_page=page_number)
+    return ''.join(pytesseract.image_to_string(img) for img in images)
+
+def pdf_ocr_available():
+    """Whether Tesseract page OCR can run (pytesseract and pdf2image importable); logged once when not."""
+    global _pdf_ocr_available
+    if _pdf_ocr_available is None:
+        try:
+            import pytesseract  # noqa: F401
+            import pdf2image  # noqa: F401
+            _pdf_ocr_available = True
+        except ImportError as e:
+            logger.warning(f"PDF OCR unavailable ({e}); pages without a text layer are kept as they are")
+            _pdf_ocr_available = False
+    return _pdf_ocr_available
+
+def get_ocr_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES)
+    return _pool
+
+def _discard_pool(pool):
+    # A worker that died (crash, OOM kill) breaks the whole pool; the next task gets a new one
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def _discard_if_broken(pool, future):
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_pool(pool)
+
+def _submit(fn, *args):
+    for attempt in range(2):
+        pool = get_ocr_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool as e:
+            _discard_pool(pool)
+            if attempt:
+                # Reported through the future like any other OCR failure
+                future = Future()
+                future.set_exception(e)
+                return future
+            continue
+        future.add_done_callback(partial(_discard_if_broken, pool))
+        return future
+
+def submit_page(file_path, page_number):
+    """Future for the OCR text of one PDF page, or None when PDF OCR is unavailable."""
+    if not pdf_ocr_available():
+        return None
+    return _submit(ocr_pdf_page, file_path, page_number)
+
+def submit_image(file_path):
+    return _submit(ocr_image, file_path)
 
 def extract_text(file_path):
-    text = ''
     ext = os.path.splitext(file_path)[1].lower()
     if ext == '.pdf':
-        images = convert_from_path(file_path)
-        for img in images:
-            text += pytesseract.image_to_string(img)
-    else:
-        reader = easyocr.Reader(['en'], gpu=False)
-        text = ' '.join([res[1] for res in reader.readtext(file_path)])
-    return text
\ No newline at end of file
+        # Only pages without a text layer are rasterized and OCR'd
+        from extract_text import iter_pages
+        return ''.join(text for _, text in iter_pages(file_path, ocr_fallback=True))
+    return submit_image(file_path).result()
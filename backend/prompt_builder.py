@@ -0,0 +1,135 @@
+import re
+import heapq
+import metrics
+from chunking import count_tokens, truncate_to_tokens, iter_chunks
+from query_service import iter_document, has_document
+from config import PROMPT_TOKEN_BUDGET, PROMPT_DEDUP_THRESHOLD, PROMPT_MMR_LAMBDA, CHUNK_TOKENS
+
+PROMPT_TEMPLATE = "Answer based only on this document:\n{context}\n\nQuestion: {question}"
+# A passage cut shorter than this is not worth including
+MIN_PASSAGE_TOKENS = 32
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _words(text):
+    return set(_WORD_RE.findall(text.lower()))
+
+
+def similarity(a: set, b: set) -> float:
+    """Jaccard overlap of two word sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_passages(passages, budget, mmr_lambda=PROMPT_MMR_LAMBDA, dedup_threshold=PROMPT_DEDUP_THRESHOLD):
+    """
+    Pick passages for the prompt with maximal marginal relevance within a token budget.
+
+    Each step takes the passage with the best trade-off between its retrieval
+    score and its overlap with passages already chosen; passages that are
+    near-duplicates of a chosen one are dropped. The last passage is cut to
+    fit when enough budget is left.
+
+    Args:
+        passages (list): Dicts with "text" and optional "score" (higher is better) and "start".
+        budget (int): Tokens available for context.
+
+    Returns:
+        tuple: (selected passages in document order, stats dict)
+    """
+    candidates = []
+    for rank, p in enumerate(passages):
+        text = p.get('text') or ''
+        if not text.strip():
+            continue
+        # +1 for the newline separating passages in the prompt
+        candidates.append({**p, "text": text, "rank": rank, "words": _words(text), "tokens": count_tokens(text) + 1})
+    # Scores from different retrievers are not calibrated; normalize to [0, 1] and
+    # fall back to the given order when a passage has no score
+    scores = [c.get('score') for c in candidates]
+    top = max((s for s in scores if s is not None), default=None)
+    for c in candidates:
+        score = c.get('score')
+        c["relevance"] = score / top if score is not None and top else 1.0 / (c["rank"] + 1)
+
+    selected = []
+    used = 0
+    duplicates = 0
+    truncated = False
+    while candidates and used < budget:
+        def mmr(c):
+            overlap = max((similarity(c["words"], s["words"]) for s in selected), default=0.0)
+            return mmr_lambda * c["relevance"] - (1 - mmr_lambda) * overlap, overlap
+        best = max(candidates, key=lambda c: mmr(c)[0])
+        candidates.remove(best)
+        if mmr(best)[1] >= dedup_threshold:
+            duplicates += 1
+            continue
+        remaining = budget - used
+        if best["tokens"] > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                continue
+            best["text"] = truncate_to_tokens(best["text"], remaining - 1)
+            best["tokens"] = count_tokens(best["text"]) + 1
+            truncated = True
+        selected.append(best)
+        used += best["tokens"]
+
+    selected.sort(key=lambda c: (c.get('start') is None, c.get('start') or 0, c["rank"]))
+    stats = {"candidates": len(passages), "passages": len(selected), "duplicates": duplicates,
+             "context_tokens": used, "truncated": truncated}
+    return [{k: v for k, v in c.items() if k not in ("words", "relevance")} for c in selected], stats
+
+
+def build_prompt(question: str, passages, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Assemble the /query prompt from ranked passages without exceeding budget tokens.
+
+    Returns:
+        tuple: (prompt, usage) where usage holds the prompt's token count and
+        selection stats.
+    """
+    # The question itself may use at most half of the budget
+    question = truncate_to_tokens(question or '', budget // 2)
+    overhead = count_tokens(PROMPT_TEMPLATE.format(context='', question=question))
+    selected, usage = select_passages(passages, max(0, budget - overhead))
+    prompt = PROMPT_TEMPLATE.format(context='\n'.join(p["text"] for p in selected), question=question)
+    # Tokens can merge differently across passage boundaries; trim until the whole prompt fits
+    while count_tokens(prompt) > budget and selected:
+        last = max(selected, key=lambda p: p["rank"])
+        selected.remove(last)
+        usage["passages"] -= 1
+        prompt = PROMPT_TEMPLATE.format(context='\n'.join(p["text"] for p in selected), question=question)
+    usage["prompt_tokens"] = count_tokens(prompt)
+    metrics.observe('prompt_tokens', usage["prompt_tokens"])
+    return prompt, usage
+
+
+def document_passages(doc_id: str, question: str, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Candidate passages from a whole stored document, for when retrieval found nothing.
+
+    The document is streamed and chunked; only the chunks sharing the most
+    words with the question (earlier chunks first on ties) are kept, enough to
+    fill the budget a couple of times over, so memory and prompt size stay
+    bounded however large the document is.
+
+    Returns:
+        list: Passages for build_prompt, or None when the document does not exist.
+    """
+    if not has_document(doc_id):
+        return None
+    query_words = _words(question or '')
+    keep = max(4, 2 * budget // max(1, CHUNK_TOKENS))
+    heap = []
+    for chunk in iter_chunks(iter_document(doc_id)):
+        score = len(query_words & _words(chunk.text))
+        item = (score, -chunk.index, chunk.start, chunk.text)
+        if len(heap) < keep:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+    ranked = sorted(heap, reverse=True)
+    return [{"text": text, "score": float(score), "start": start} for score, _, start, text in ranked]
@@ -0,0 +1,115 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(_PUNCT_RE.sub(' ', query.lower()).split())
+
+
+class QueryCache:
+    """
+    TTL + LRU cache of /query answers keyed by
+    (file_id, normalized query, model, prompt template version).
+
+    Entries can also carry the query embedding so that a differently worded
+    question about the same document can reuse an answer when the cosine
+    similarity is above semantic_threshold.
+    """
+
+    def __init__(self, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL,
+                 semantic_threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self._entries = OrderedDict()
+        self._by_file = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            keys = self._by_file.get(key[0])
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_file[key[0]]
+
+    def get(self, file_id, query, model, prompt_version):
+        key = (file_id, normalize_query(query), model, prompt_version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires"] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["answer"]
+            if entry:
+                self._remove(key)
+            return None
+
+    def get_semantic(self, file_id, query_vector, model, prompt_version):
+        if self.semantic_threshold is None or query_vector is None:
+            return None
+        q = np.asarray(query_vector, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        now = time.time()
+        with self._lock:
+            candidates = [
+                k for k in self._by_file.get(file_id, ())
+                if k[2] == model and k[3] == prompt_version
+                and self._entries[k]["vector"] is not None and self._entries[k]["expires"] > now
+            ]
+            if not candidates:
+                return None
+            scores = np.stack([self._entries[k]["vector"] for k in candidates]) @ q
+            best = int(np.argmax(scores))
+            if scores[best] < self.semantic_threshold:
+                return None
+            self._entries.move_to_end(candidates[best])
+            self.semantic_hits += 1
+            self.hits += 1
+            return self._entries[candidates[best]]["answer"]
+
+    def put(self, file_id, query, model, prompt_version, answer, query_vector=None):
+        key = (file_id, normalize_query(query), model, prompt_version)
+        vector = None
+        if query_vector is not None and self.semantic_threshold is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            # Answers are only stored after a lookup missed
+            self.misses += 1
+            self._remove(key)
+            self._entries[key] = {"answer": answer, "vector": vector, "expires": time.time() + self.ttl}
+            self._by_file.setdefault(file_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, file_id):
+        """Drop every cached answer for a document (called when the document is rewritten)."""
+        with self._lock:
+            for key in list(self._by_file.get(file_id, ())):
+                self._remove(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
+
+
+_cache = QueryCache()
+
+
+def get_query_cache():
+    return _cache
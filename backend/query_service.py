@@ -1,20 +1,337 @@
+import re
+import zlib
+import codecs
 import sqlite3
+import threading
+from contextlib import contextmanager
+from config import DATABASE_PATH, DOCUMENT_COMPRESSION, DOCUMENT_COMPRESS_MIN_BYTES
+from query_cache import get_query_cache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Each thread gets its own connection; WAL lets readers run alongside a writer
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+fts_enabled = False
+
+READ_CHUNK_BYTES = 64 * 1024
+_TERM_RE = re.compile(r'\w+')
+
+
+def _init_schema(conn):
+    global _schema_ready, fts_enabled
+    with _schema_lock:
+        if _schema_ready:
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents(
+            id TEXT PRIMARY KEY,
+            content TEXT
+        )
+        """)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(documents)")]
+        if 'encoding' not in columns:
+            # NULL = plain text, otherwise the compression codec of the content blob
+            conn.execute("ALTER TABLE documents ADD COLUMN encoding TEXT")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS chunks(
+            id INTEGER PRIMARY KEY,
+            doc_id TEXT,
+            chunk INTEGER,
+            start INTEGER,
+            end INTEGER,
+            content TEXT,
+            version TEXT NOT NULL DEFAULT ''
+        )
+        """)
+        if 'version' not in [row[1] for row in conn.execute("PRAGMA table_info(chunks)")]:
+            # Chunks belong to an index version (see index_versions); existing rows are the legacy version ""
+            conn.execute("ALTER TABLE chunks ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+        conn.execute("DROP INDEX IF EXISTS idx_chunks_doc")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_version_doc ON chunks(version, doc_id, chunk)")
+        try:
+            # Chunk-level keyword index kept in sync with the chunks table
+            conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                content, content='chunks', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+            """)
+            fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; chunks are stored but keyword search is disabled
+            fts_enabled = False
+        conn.commit()
+        _schema_ready = True
+
+
+def get_connection() -> sqlite3.Connection:
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        # INSERT OR REPLACE only fires the chunks_ad delete trigger (keeping chunks_fts
+        # in sync) when recursive triggers are on
+        conn.execute("PRAGMA recursive_triggers=ON")
+        _init_schema(conn)
+        _local.conn = conn
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Run several writes on this thread's connection and commit them once."""
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _encode(text: str):
+    data = text.encode('utf-8')
+    if len(data) < DOCUMENT_COMPRESS_MIN_BYTES:
+        return text, None
+    if DOCUMENT_COMPRESSION == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data), 'zstd'
+    return zlib.compress(data, 6), 'zlib'
+
+
+def _decompressor(encoding):
+    if encoding == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Document is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+def _decode(content, encoding):
+    if encoding is None:
+        return content
+    decompressor = _decompressor(encoding)
+    return (decompressor.decompress(content) + decompressor.flush()).decode('utf-8')
 
-conn = sqlite3.connect('documents.db', check_same_thread=False)
-cursor = conn.cursor()
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS documents(
-    id TEXT PRIMARY KEY,
-    content TEXT
-)
-""")
-conn.commit()
 
 def save_document(doc_id: str, text: str):
-    cursor.execute("INSERT OR REPLACE INTO documents (id, content) VALUES (?, ?)", (doc_id, text))
-    conn.commit()
+    save_documents([(doc_id, text)])
+
+
+def save_documents(items):
+    """Save many (doc_id, text) pairs in a single transaction."""
+    rows = [(doc_id, *_encode(text)) for doc_id, text in items]
+    with transaction() as conn:
+        conn.executemany("INSERT OR REPLACE INTO documents (id, content, encoding) VALUES (?, ?, ?)", rows)
+    # Cached answers for these documents are stale once they are rewritten
+    for doc_id, _, _ in rows:
+        get_query_cache().invalidate(doc_id)
+
 
 def get_document(doc_id: str) -> str:
-    cursor.execute("SELECT content FROM documents WHERE id = ?", (doc_id,))
-    result = cursor.fetchone()
-    return result[0] if result else None
\ No newline at end of file
+    result = get_connection().execute(
+        "SELECT content, encoding FROM documents WHERE id = ?", (doc_id,)
+    ).fetchone()
+    return _decode(*result) if result else None
+
+
+def has_document(doc_id: str) -> bool:
+    return get_connection().execute("SELECT 1 FROM documents WHERE id = ?", (doc_id,)).fetchone() is not None
+
+
+def get_documents(doc_ids) -> dict:
+    """Fetch many documents at once; returns {doc_id: text} for the ids that exist."""
+    doc_ids = list(doc_ids)
+    conn = get_connection()
+    documents = {}
+    for start in range(0, len(doc_ids), 500):
+        batch = doc_ids[start:start + 500]
+        placeholders = ','.join('?' * len(batch))
+        for doc_id, content, encoding in conn.execute(
+                f"SELECT id, content, encoding FROM documents WHERE id IN ({placeholders})", batch):
+            documents[doc_id] = _decode(content, encoding)
+    return documents
+
+
+def iter_document(doc_id: str, chunk_size=READ_CHUNK_BYTES):
+    """
+    Yield a document's text in pieces without materializing the whole blob.
+
+    Compressed content is read incrementally with SQLite blob I/O and
+    decompressed as it streams.
+    """
+    conn = get_connection()
+    row = conn.execute("SELECT rowid, encoding FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    if not row:
+        return
+    rowid, encoding = row
+    if encoding is None or not hasattr(conn, 'blobopen'):
+        text = get_document(doc_id)
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+        return
+
+    decompressor = _decompressor(encoding)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with conn.blobopen('documents', 'content', rowid, readonly=True) as blob:
+        while True:
+            data = blob.read(chunk_size)
+            if not data:
+                break
+            text = decoder.decode(decompressor.decompress(data))
+            if text:
+                yield text
+    tail = decoder.decode(decompressor.flush(), final=True)
+    if tail:
+        yield tail
+
+
+def save_chunks(doc_id: str, chunks, replace=False, version=''):
+    """
+    Store chunks (objects with index, start, end and text) and index them for keyword search.
+
+    With replace=True the document's existing chunks are removed first.
+    Chunks are stored under an index version (see index_versions).
+    """
+    with transaction() as conn:
+        if replace:
+            conn.execute("DELETE FROM chunks WHERE doc_id = ? AND version = ?", (doc_id, version))
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunks (doc_id, chunk, start, end, content, version) VALUES (?, ?, ?, ?, ?, ?)",
+            [(doc_id, c.index, c.start, c.end, c.text, version) for c in chunks]
+        )
+
+
+def delete_chunks(doc_id: str, version=''):
+    with transaction() as conn:
+        conn.execute("DELETE FROM chunks WHERE doc_id = ? AND version = ?", (doc_id, version))
+
+
+def delete_version_chunks(version: str, batch_size=10000):
+    """Remove every chunk of an index version, in batches so other writers are not blocked for long."""
+    removed = 0
+    while True:
+        with transaction() as conn:
+            n = conn.execute(
+                "DELETE FROM chunks WHERE id IN (SELECT id FROM chunks WHERE version = ? LIMIT ?)", (version, batch_size)
+            ).rowcount
+        removed += n
+        if n < batch_size:
+            return removed
+
+
+def iter_document_ids(after_rowid=0, page_size=500):
+    """
+    Yield pages of (rowid, doc_id) in rowid order, starting after after_rowid.
+
+    Keyset paging keeps each query cheap however far into the table it is, and
+    documents written while iterating (which get new, higher rowids) are still reached.
+    """
+    conn = get_connection()
+    while True:
+        page = conn.execute(
+            "SELECT rowid, id FROM documents WHERE rowid > ? ORDER BY rowid LIMIT ?", (after_rowid, page_size)
+        ).fetchall()
+        if not page:
+            return
+        yield page
+        after_rowid = page[-1][0]
+
+
+def _fts_query(query: str) -> str:
+    # Each whitespace-separated term becomes a quoted phrase of its word tokens
+    # (so "1,234.56" matches the tokens 1 234 56 in order), OR-ed together and
+    # ranked by BM25. Quoting also keeps user input from being parsed as FTS syntax.
+    phrases = []
+    for term in query.split():
+        tokens = _TERM_RE.findall(term)
+        if tokens:
+            phrases.append('"' + ' '.join(tokens) + '"')
+    return ' OR '.join(phrases)
+
+
+def _chunk_row(doc_id, chunk, start, end, text, score=None):
+    return {
+        "id": f"{doc_id}#{chunk}",
+        "score": score,
+        "text": text,
+        "metadata": {"doc_id": doc_id, "chunk": chunk, "start": start, "end": end},
+    }
+
+
+def search_chunks(query: str, doc_id=None, limit=10, version='') -> list:
+    """BM25 keyword search over stored chunks, best first; score is the negated bm25() value."""
+    conn = get_connection()
+    match = _fts_query(query)
+    if not fts_enabled or not match:
+        return []
+    sql = ("SELECT c.doc_id, c.chunk, c.start, c.end, c.content, bm25(chunks_fts) AS rank "
+           "FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid WHERE chunks_fts MATCH ? AND c.version = ?")
+    params = [match, version]
+    if doc_id:
+        sql += " AND c.doc_id = ?"
+        params.append(doc_id)
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(limit)
+    return [_chunk_row(d, c, s, e, text, -rank) for d, c, s, e, text, rank in conn.execute(sql, params)]
+
+
+def get_chunks(chunk_ids, version='') -> dict:
+    """Look up stored chunks by "<doc_id>#<n>" id; returns {id: chunk} for the ids found."""
+    by_doc = {}
+    for chunk_id in chunk_ids:
+        doc_id, _, n = chunk_id.rpartition('#')
+        if doc_id and n.isdigit():
+            by_doc.setdefault(doc_id, []).append(int(n))
+    found = {}
+    conn = get_connection()
+    for doc_id, numbers in by_doc.items():
+        placeholders = ','.join('?' * len(numbers))
+        for d, c, s, e, text in conn.execute(
+                f"SELECT doc_id, chunk, start, end, content FROM chunks "
+                f"WHERE version = ? AND doc_id = ? AND chunk IN ({placeholders})", (version, doc_id, *numbers)):
+            row = _chunk_row(d, c, s, e, text)
+            found[row["id"]] = row
+    return found
+
+
+def compact(batch_size=200):
+    """
+    Compress existing plain-text rows above the size threshold, rebuild the
+    keyword index from the chunks table (dropping entries of chunks replaced
+    before recursive triggers were enabled) and reclaim the freed space.
+    """
+    conn = get_connection()
+    rows = conn.execute(
+        "SELECT id FROM documents WHERE encoding IS NULL AND length(CAST(content AS BLOB)) >= ?",
+        (DOCUMENT_COMPRESS_MIN_BYTES,)
+    ).fetchall()
+    for start in range(0, len(rows), batch_size):
+        ids = [r[0] for r in rows[start:start + batch_size]]
+        documents = get_documents(ids)
+        with transaction() as conn:
+            conn.executemany(
+                "UPDATE documents SET content = ?, encoding = ? WHERE id = ?",
+                [(*_encode(documents[i]), i) for i in ids]
+            )
+    if fts_enabled:
+        with transaction() as conn:
+            conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return len(rows)
+
+
+if __name__ == '__main__':
+    print(f"Compressed {compact()} document(s)")
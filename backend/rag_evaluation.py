@@ -0,0 +1,161 @@
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+
+def _grades(relevant):
+    # Relevant ids may be given as {id: grade} (graded) or as a list/set of ids (binary)
+    if isinstance(relevant, dict):
+        return {k: float(v) for k, v in relevant.items() if v > 0}
+    if isinstance(relevant, str):
+        return {relevant: 1.0}
+    return {k: 1.0 for k in relevant}
+
+
+def relevance_arrays(retrieved, relevant, depth):
+    """
+    Build the (queries x depth) gain matrix for retrieved ids and the ideal
+    (best possible) gain matrix for each query's relevant set.
+    """
+    n = len(retrieved)
+    gains = np.zeros((n, depth), dtype=np.float64)
+    ideal = np.zeros((n, depth), dtype=np.float64)
+    n_relevant = np.zeros(n, dtype=np.float64)
+    for i, (ids, rel) in enumerate(zip(retrieved, relevant)):
+        grades = _grades(rel)
+        n_relevant[i] = len(grades)
+        seen = set()
+        for j, item_id in enumerate(ids[:depth]):
+            # Duplicate ids only count at their first rank
+            if item_id not in seen:
+                gains[i, j] = grades.get(item_id, 0.0)
+                seen.add(item_id)
+        best = sorted(grades.values(), reverse=True)[:depth]
+        ideal[i, :len(best)] = best
+    return gains, ideal, n_relevant
+
+
+def evaluate_batch(retrieved, relevant, ks=(1, 3, 5, 10), per_query=False):
+    """
+    Compute Recall@K, Precision@K, MAP, MRR and nDCG@K over many queries at once.
+
+    Args:
+        retrieved (list): For each query, the ranked list of retrieved ids.
+        relevant (list): For each query, the relevant ids as {id: grade} for
+            graded relevance, or a list/set of ids (grade 1).
+        ks (iterable): Cutoffs to report Recall/Precision/nDCG at.
+        per_query (bool): Also return the per-query metric arrays.
+
+    Returns:
+        dict: Mean value of each metric (queries without relevant ids are
+        excluded from recall, MAP, MRR and nDCG).
+    """
+    ks = sorted(set(ks))
+    depth = max(max(ks), max((len(r) for r in retrieved), default=0))
+    gains, ideal, n_relevant = relevance_arrays(retrieved, relevant, depth)
+    hits = (gains > 0).astype(np.float64)
+    has_relevant = n_relevant > 0
+    safe_relevant = np.where(has_relevant, n_relevant, 1.0)
+
+    ranks = np.arange(1, depth + 1, dtype=np.float64)
+    discounts = 1.0 / np.log2(ranks + 1)
+    cum_hits = np.cumsum(hits, axis=1)
+
+    scores = {}
+    for k in ks:
+        scores[f"Recall@{k}"] = np.where(has_relevant, cum_hits[:, k - 1] / safe_relevant, np.nan)
+        scores[f"Precision@{k}"] = cum_hits[:, k - 1] / k
+        dcg = ((2 ** gains[:, :k] - 1) * discounts[:k]).sum(axis=1)
+        idcg = ((2 ** ideal[:, :k] - 1) * discounts[:k]).sum(axis=1)
+        scores[f"nDCG@{k}"] = np.where(idcg > 0, dcg / np.where(idcg > 0, idcg, 1.0), np.nan)
+
+    precision_at_rank = cum_hits / ranks
+    scores["MAP"] = np.where(has_relevant, (precision_at_rank * hits).sum(axis=1) / safe_relevant, np.nan)
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, 0)
+    scores["MRR"] = np.where(has_relevant, np.where(first_hit > 0, 1.0 / np.maximum(first_hit, 1), 0.0), np.nan)
+
+    summary = {
+        name: float(np.nanmean(values)) if np.any(~np.isnan(values)) else 0.0
+        for name, values in scores.items()
+    }
+    summary["queries"] = len(retrieved)
+    if per_query:
+        summary["per_query"] = {name: values.tolist() for name, values in scores.items()}
+    return summary
+
+
+def _to_doc_ids(ids):
+    # "<doc_id>#<n>" chunk ids collapse to their document, keeping first-seen order
+    return list(dict.fromkeys(i.rpartition('#')[0] or i for i in ids))
+
+
+def run_offline(records, retriever="hybrid", top_k=10, ks=(1, 3, 5, 10), level="chunk"):
+    """
+    Replay labeled queries through the real retrieval path and score the results.
+
+    Each record is {"query": str, "file_id": optional str, "relevant": ids or {id: grade}}.
+    """
+    from embedding_service import embed_texts, query_similar
+    from query_service import search_chunks
+    from retrieval import hybrid_search
+    from index_versions import active_version
+
+    start = time.perf_counter()
+    needs_vectors = retriever in ("hybrid", "vector")
+    vectors = embed_texts([r["query"] for r in records]) if needs_vectors else [None] * len(records)
+    embed_time = time.perf_counter() - start
+
+    retrieved = []
+    search_start = time.perf_counter()
+    for record, vector in zip(records, vectors):
+        file_id = record.get("file_id")
+        if retriever == "hybrid":
+            matches = hybrid_search(record["query"], vector, file_id=file_id, top_k=top_k)
+        elif retriever == "vector":
+            matches = query_similar(vector, top_k=top_k, filter={"doc_id": file_id} if file_id else None)
+        elif retriever == "keyword":
+            matches = search_chunks(record["query"], doc_id=file_id, limit=top_k, version=active_version()["version"])
+        else:
+            raise ValueError(f"Unknown retriever: {retriever}")
+        ids = [m["id"] for m in matches]
+        retrieved.append(_to_doc_ids(ids) if level == "doc" else ids)
+    search_time = time.perf_counter() - search_start
+
+    results = evaluate_batch(retrieved, [r["relevant"] for r in records], ks=ks)
+    results.update({
+        "retriever": retriever,
+        "level": level,
+        "top_k": top_k,
+        "embed_time": embed_time,
+        "search_time": search_time,
+        "mean_search_ms": 1000 * search_time / max(len(records), 1),
+    })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality on a labeled query set (JSONL).")
+    parser.add_argument("labels", help="JSONL file of {query, file_id?, relevant} records")
+    parser.add_argument("--retriever", choices=["hybrid", "vector", "keyword"], default="hybrid")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5, 10])
+    parser.add_argument("--level", choices=["chunk", "doc"], default="chunk",
+                        help="Compare relevant ids against chunk ids or their document ids")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.labels, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    results = run_offline(records, retriever=args.retriever, top_k=args.top_k, ks=args.ks, level=args.level)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
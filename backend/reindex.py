@@ -0,0 +1,249 @@
+"""
+Re-embed every stored document into a new index version.
+
+Needed when the embedding model or the chunk size changes. Documents are
+streamed out of documents.db in keyset pages, so memory stays bounded however
+many there are. They are chunked, embedded and upserted through the same
+batched path as uploads (EMBED_BATCH_SIZE inputs per request, EMBED_CONCURRENCY
+requests in flight) into a new version next to the active one (see
+index_versions). Progress is checkpointed after every page, so an interrupted
+run resumes after the last finished page; chunks embedded before the
+interruption come back from the embedding cache. When every document is in,
+the new version is activated in a single transaction and queries switch to it.
+
+Embedding requests are paced to --tokens-per-minute, and a page that hits the
+API rate limit (or finds the embedding backend unavailable, see resilience) is
+retried after the Retry-After delay (or an exponential, jittered backoff).
+
+With Pinecone, versions are namespaces of PINECONE_INDEX, so the new model
+must produce vectors of the index's dimension.
+
+Usage:
+    python reindex.py v2 --model text-embedding-3-small
+    EMBED_CONCURRENCY=8 python reindex.py v2 --tokens-per-minute 1000000
+    python reindex.py v2 --no-activate       # build only, switch later
+    python reindex.py --activate v2          # switch (--activate "" rolls back to the legacy index)
+    python reindex.py --list
+    python reindex.py --drop v1              # delete a retired version
+    python reindex.py --build-ivf v2         # retrain the local approximate index
+
+With the local backend and LOCAL_INDEX_APPROXIMATE=1, IVF clusters are trained
+on each new version before it is activated.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from concurrent.futures import wait
+import services
+import resilience
+import job_queue
+import index_versions
+import vector_store
+from ingest_service import ingest_documents
+from query_service import iter_document, iter_document_ids, delete_version_chunks
+from config import (
+    DATABASE_PATH, EMBEDDING_MODEL, EMBEDDING_DIM, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS,
+    INDEX_VERSION_REFRESH_SECONDS, REINDEX_PAGE_SIZE, REINDEX_TOKENS_PER_MINUTE, UPSERT_TIMEOUT,
+    LOCAL_INDEX_APPROXIMATE
+)
+
+logger = logging.getLogger(__name__)
+
+_VERSION_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+MAX_RETRIES = 8
+MAX_BACKOFF_SECONDS = 60
+
+
+def checkpoint_path(version: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), f"reindex-{version}.json")
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    state["updated_at"] = time.time()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    # A crash mid-write leaves the previous checkpoint intact
+    os.replace(tmp_path, path)
+
+
+def _retry_after(error, attempt):
+    # Errors that exhausted the embedding guard's own retries carry the API error as their cause
+    headers = getattr(error, "headers", None) or getattr(error.__cause__, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return min(MAX_BACKOFF_SECONDS, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+def _page_documents(page):
+    names = job_queue.filenames(doc_id for _, doc_id in page)
+    for _, doc_id in page:
+        # Same chunk metadata as at upload time; the text is streamed, not loaded whole
+        metadata = {"filename": names[doc_id]} if doc_id in names else None
+        yield doc_id, iter_document(doc_id), metadata
+
+
+def _ingest_page(page, version):
+    retryable = (services.get("openai").error.RateLimitError, resilience.BackendUnavailable)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return ingest_documents(_page_documents(page), version=version)
+        except retryable as e:
+            if attempt == MAX_RETRIES:
+                raise
+            if getattr(e, "pending", None) is not None:
+                # A timed-out upsert may still land; let it finish before the page is written again
+                wait([e.pending], timeout=UPSERT_TIMEOUT)
+            delay = _retry_after(e, attempt)
+            logger.warning(f"Rate limited or embedding backend unavailable ({e}); retrying page in {delay:.1f} seconds")
+            time.sleep(delay)
+
+
+def _run_pages(state, path, page_size, tokens_per_minute):
+    """Re-embed documents after the checkpointed rowid until none are left."""
+    start = time.monotonic()
+    tokens = 0
+    for page in iter_document_ids(state["last_rowid"], page_size):
+        stats = _ingest_page(page, state["version"])
+        page_tokens = sum(s["tokens"] for s in stats.values())
+        tokens += page_tokens
+        state["last_rowid"] = page[-1][0]
+        state["documents"] += len(page)
+        state["chunks"] += sum(s["chunks"] for s in stats.values())
+        state["tokens"] += page_tokens
+        save_checkpoint(path, state)
+        logger.info(f"  {state['documents']} documents, {state['chunks']} chunks re-embedded")
+        if tokens_per_minute > 0:
+            # Stay under the embedding token rate averaged over this run
+            ahead = tokens / tokens_per_minute * 60 - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def reindex(version: str, model=EMBEDDING_MODEL, dim=EMBEDDING_DIM, chunk_tokens=CHUNK_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS, page_size=REINDEX_PAGE_SIZE,
+            tokens_per_minute=REINDEX_TOKENS_PER_MINUTE, activate=True, path=None,
+            settle_seconds=INDEX_VERSION_REFRESH_SECONDS) -> dict:
+    """
+    Build (or resume building) an index version from every stored document.
+
+    Args:
+        version (str): Name of the new version (letters, digits, "_", "-", ".").
+        activate (bool): Switch queries to the version once it is complete.
+        path (str): Checkpoint file; defaults to reindex-<version>.json next to documents.db.
+        settle_seconds (float): Wait after activating before the catch-up pass,
+            so other processes have picked up the switch (INDEX_VERSION_REFRESH_SECONDS).
+
+    Returns:
+        dict: The final checkpoint state.
+
+    Raises:
+        ValueError: Invalid version name, or the version or checkpoint exists with other settings.
+    """
+    if not _VERSION_RE.match(version or ""):
+        raise ValueError(f"Invalid index version name: '{version}'")
+    settings = {"model": model, "dim": dim, "chunk_tokens": chunk_tokens, "chunk_overlap": chunk_overlap}
+    index_versions.create_version(version, **settings)
+    path = path or checkpoint_path(version)
+    state = load_checkpoint(path)
+    if state is None:
+        state = {"version": version, **settings, "last_rowid": 0, "documents": 0, "chunks": 0, "tokens": 0,
+                 "activated": False, "started_at": time.time()}
+    elif any(state.get(k) != v for k, v in {"version": version, **settings}.items()):
+        raise ValueError(f"Checkpoint {path} is for a different version or settings; remove it to start over")
+    else:
+        logger.info(f"Resuming index version '{version}' after {state['documents']} documents")
+
+    _run_pages(state, path, page_size, tokens_per_minute)
+    if LOCAL_INDEX_APPROXIMATE and not state["activated"] and vector_store.build_ivf(version):
+        # Clusters are trained on the complete version; later upserts join the nearest one
+        logger.info(f"Trained the approximate index of version '{version}'")
+    if activate and not state["activated"]:
+        index_versions.activate(version)
+        state["activated"] = True
+        save_checkpoint(path, state)
+        logger.info(f"Activated index version '{version}'")
+        # Uploads that landed in the previous version while the switch propagated
+        # have higher rowids than the checkpoint, so one more pass picks them up
+        time.sleep(settle_seconds)
+        _run_pages(state, path, page_size, tokens_per_minute)
+    return state
+
+
+def drop(version: str):
+    """Delete a retired version's vectors, chunk rows and checkpoint."""
+    if version == "":
+        raise ValueError("The legacy index cannot be dropped")
+    vector_store.drop_version_store(version)
+    removed = delete_version_chunks(version)
+    index_versions.delete_version(version)
+    path = checkpoint_path(version)
+    if os.path.exists(path):
+        os.remove(path)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-embed all stored documents into a new index version.")
+    parser.add_argument("version", nargs="?", help="Index version to build, e.g. v2")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM, help="Vector dimension of the model")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--page-size", type=int, default=REINDEX_PAGE_SIZE, help="Documents read per page")
+    parser.add_argument("--tokens-per-minute", type=int, default=REINDEX_TOKENS_PER_MINUTE,
+                        help="Embedding token rate to stay under (0 = no pacing)")
+    parser.add_argument("--no-activate", action="store_true", help="Build the version without switching to it")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: reindex-<version>.json)")
+    parser.add_argument("--activate", dest="switch_to", metavar="VERSION", help="Only switch to an existing version")
+    parser.add_argument("--drop", metavar="VERSION", help="Delete a version that is not active")
+    parser.add_argument("--list", action="store_true", help="List index versions")
+    parser.add_argument("--build-ivf", metavar="VERSION",
+                        help="(Re)train the approximate index of a local version (LOCAL_INDEX_APPROXIMATE)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        if args.list:
+            active = index_versions.active_version(max_age=0)["version"]
+            print(json.dumps({"active": active, "versions": index_versions.list_versions()}, indent=2))
+        elif args.switch_to is not None:
+            print(json.dumps(index_versions.activate(args.switch_to), indent=2))
+        elif args.build_ivf is not None:
+            trained = vector_store.build_ivf(args.build_ivf)
+            print(f"Trained the approximate index of version '{args.build_ivf}'" if trained
+                  else "The vector backend has no local approximate index")
+        elif args.drop is not None:
+            print(f"Dropped index version '{args.drop}' ({drop(args.drop)} chunk rows)")
+        elif args.version:
+            start = time.perf_counter()
+            state = reindex(args.version, model=args.model, dim=args.dim, chunk_tokens=args.chunk_tokens,
+                            chunk_overlap=args.chunk_overlap, page_size=args.page_size,
+                            tokens_per_minute=args.tokens_per_minute, activate=not args.no_activate,
+                            path=args.checkpoint)
+            print(f"Index version '{args.version}': {state['documents']} documents, {state['chunks']} chunks, "
+                  f"{state['tokens']} tokens in {time.perf_counter() - start:.1f} seconds"
+                  f"{', active' if state['activated'] else ''}")
+        else:
+            parser.error("give a version to build, or --activate, --drop or --list")
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Guards around calls to the external AI backends (embeddings, vector store, chat model).
+
+Vector store writes have their own "upsert" guard: they get a deadline sized
+for ingestion batches, and their failures do not open the circuit that
+queries ("vector") depend on.
+
+Every call to a backend goes through its Guard, which adds:
+    single-flight    - an identical call already in flight is joined instead of
+                       sent again (callers share the result, so must not mutate it)
+    limiter          - at most `concurrency` calls in flight per process; a
+                       caller waits for a free slot only until its deadline
+    deadline         - `timeout` seconds per call, retries included; an attempt
+                       still running at the deadline is never retried, so writes
+                       do not overlap
+    retries          - transient errors (timeouts, connection errors, rate limits,
+                       5xx) are retried with jittered exponential backoff
+    circuit breaker  - after `failures` consecutive failed calls the backend is
+                       skipped for `reset_seconds`, then a single probe call
+                       decides whether it is back
+
+A call that cannot be served raises BackendUnavailable (CircuitOpenError when
+it was not attempted at all), so callers can fall back instead of waiting:
+retrieval drops to BM25 keyword search in SQLite when embeddings or the vector
+store are down, and /query fails fast when the chat model is.
+
+Sync calls run on the guard's worker threads so the caller can stop waiting at
+the deadline even when the client library cannot; async calls (acall) are
+bounded with asyncio.wait_for.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import metrics
+from config import (
+    EMBEDDING_TIMEOUT, VECTOR_TIMEOUT, UPSERT_TIMEOUT, LLM_TIMEOUT, BACKEND_RETRIES, BACKEND_CONCURRENCY,
+    CIRCUIT_FAILURES, CIRCUIT_RESET_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF_SECONDS = 2.0
+
+
+class BackendUnavailable(Exception):
+    """The backend failed, timed out or is switched off by its circuit breaker."""
+
+
+class CircuitOpenError(BackendUnavailable):
+    pass
+
+
+class DeadlineExceeded(BackendUnavailable):
+    # Future of the call when it was still running at the deadline; its outcome is unknown
+    pending = None
+
+
+def is_transient(error) -> bool:
+    """Whether a failed call is worth retrying and counts against the backend's health."""
+    if isinstance(error, (DeadlineExceeded, TimeoutError, ConnectionError, FutureTimeout, asyncio.TimeoutError)):
+        return True
+    import openai
+    if isinstance(error, (openai.error.Timeout, openai.error.APIConnectionError, openai.error.RateLimitError,
+                          openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+        return True
+    # openai.error.APIError and Pinecone's ApiException carry the HTTP status
+    status = getattr(error, "http_status", None) or getattr(error, "status", None)
+    return isinstance(status, int) and status >= 500
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, 0.1 * 2^attempt)]."""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, 0.1 * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open -> half-open
+    after `reset_seconds`, when one probe call is let through; the probe's
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failures=CIRCUIT_FAILURES, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+                    metrics.inc('circuit_opened_total', backend=self.name)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """Returns (result, shared): shared is True when another caller's call was joined."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            try:
+                return future.result(timeout), True
+            except FutureTimeout:
+                raise DeadlineExceeded("Deadline exceeded waiting for an identical call in flight")
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class Guard:
+    def __init__(self, name, timeout, retries=BACKEND_RETRIES, concurrency=BACKEND_CONCURRENCY,
+                 failures=CIRCUIT_FAILURES, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.concurrency = max(1, concurrency)
+        self.breaker = CircuitBreaker(name, failures, reset_seconds)
+        self._flights = SingleFlight()
+        self._async_flights = {}
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"guard-{self.name}")
+        return self._pool
+
+    def _count(self, outcome):
+        metrics.inc('backend_calls_total', backend=self.name, outcome=outcome)
+
+    def _next_delay(self, attempt, deadline):
+        """Backoff before the next attempt, or None when there is no attempt or time left."""
+        if attempt >= self.retries:
+            return None
+        delay = backoff(attempt)
+        return delay if time.monotonic() + delay < deadline else None
+
+    def _fail(self, error):
+        self.breaker.record_failure()
+        self._count("timeout" if isinstance(error, DeadlineExceeded) else "error")
+        if isinstance(error, BackendUnavailable):
+            raise error
+        raise BackendUnavailable(f"{self.name} failed: {type(error).__name__}: {error}") from error
+
+    def _reject(self):
+        self._count("rejected")
+        return CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+    def _attempt(self, fn, args, kwargs, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+            raise DeadlineExceeded(f"{self.name}: no free slot before the deadline")
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        # A call that outlives its deadline keeps its slot until it actually returns
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            error = DeadlineExceeded(f"{self.name} did not answer within {self.timeout:g} seconds")
+            error.pending = future
+            raise error
+
+    def _call(self, fn, args, kwargs, deadline):
+        if not self.breaker.allow():
+            raise self._reject()
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(fn, args, kwargs, deadline)
+            except Exception as e:
+                if not is_transient(e):
+                    # The backend answered; the request itself was bad
+                    self.breaker.record_success()
+                    raise
+                delay = None if getattr(e, "pending", None) is not None else self._next_delay(attempt, deadline)
+                if delay is None:
+                    self._fail(e)
+                logger.warning(f"{self.name} call failed ({type(e).__name__}: {e}); retrying in {delay:.2f} seconds")
+                time.sleep(delay)
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                self._count("ok")
+                return result
+
+    def call(self, fn, *args, key=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) under the guard.
+
+        Args:
+            key (hashable): Identity of the request; concurrent calls with the
+                same key are coalesced into one. None disables coalescing.
+
+        Raises:
+            BackendUnavailable: The call failed with a transient error on every
+                attempt, ran past the deadline, or the circuit is open.
+        """
+        deadline = time.monotonic() + self.timeout
+        if key is None:
+            return self._call(fn, args, kwargs, deadline)
+        result, shared = self._flights.do(key, lambda: self._call(fn, args, kwargs, deadline), self.timeout)
+        if shared:
+            self._count("coalesced")
+        return result
+
+    async def _acall(self, fn, args, kwargs, deadline):
+        if not self.breaker.allow():
+            raise self._reject()
+        attempt = 0
+        while True:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"{self.name} did not answer within {self.timeout:g} seconds")
+                result = await asyncio.wait_for(fn(*args, **kwargs), remaining)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = DeadlineExceeded(f"{self.name} did not answer within {self.timeout:g} seconds")
+                if not is_transient(e):
+                    self.breaker.record_success()
+                    raise
+                delay = self._next_delay(attempt, deadline)
+                if delay is None:
+                    self._fail(e)
+                logger.warning(f"{self.name} call failed ({type(e).__name__}: {e}); retrying in {delay:.2f} seconds")
+                await asyncio.sleep(delay)
+                attempt += 1
+            else:
+                self.breaker.record_success()
+                self._count("ok")
+                return result
+
+    async def acall(self, fn, *args, key=None, **kwargs):
+        """
+        Async call(): fn is a coroutine function. Coalescing applies within the
+        running event loop; the concurrency limit is left to the caller.
+        """
+        deadline = time.monotonic() + self.timeout
+        if key is None:
+            return await self._acall(fn, args, kwargs, deadline)
+        flight_key = (id(asyncio.get_running_loop()), key)
+        task = self._async_flights.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._acall(fn, args, kwargs, deadline))
+            self._async_flights[flight_key] = task
+
+            def done(t):
+                self._async_flights.pop(flight_key, None)
+                # Retrieve the outcome so an error nobody awaited anymore is not reported as lost
+                if not t.cancelled():
+                    t.exception()
+            task.add_done_callback(done)
+        else:
+            self._count("coalesced")
+        # A caller that gives up (e.g. a disconnected client) does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def status(self) -> dict:
+        return {"state": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "timeout": self.timeout, "concurrency": self.concurrency}
+
+
+_guard_settings = {
+    "embedding": {"timeout": EMBEDDING_TIMEOUT},
+    "vector": {"timeout": VECTOR_TIMEOUT},
+    "upsert": {"timeout": UPSERT_TIMEOUT},
+    "llm": {"timeout": LLM_TIMEOUT},
+}
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def guard(name: str) -> Guard:
+    """The process-wide guard for a backend: "embedding", "vector", "upsert" or "llm"."""
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = Guard(name, **_guard_settings[name])
+        return _guards[name]
+
+
+def reset(name=None):
+    """Forget a guard's breaker state (all guards by default); it is recreated on next use."""
+    with _guards_lock:
+        for n in ([name] if name else list(_guards)):
+            _guards.pop(n, None)
+
+
+@contextmanager
+def override(name, instance):
+    """Use instance as the guard for a backend within the block (e.g. one with a short timeout in tests)."""
+    with _guards_lock:
+        previous = _guards.get(name)
+        _guards[name] = instance
+    try:
+        yield instance
+    finally:
+        with _guards_lock:
+            if previous is None:
+                _guards.pop(name, None)
+            else:
+                _guards[name] = previous
+
+
+def status() -> dict:
+    with _guards_lock:
+        return {name: g.status() for name, g in _guards.items()}
@@ -0,0 +1,90 @@
+import logging
+from embedding_service import query_similar
+from resilience import BackendUnavailable
+from query_service import search_chunks, get_chunks
+from index_versions import active_version
+from config import RETRIEVAL_TOP_K, RETRIEVAL_CANDIDATES, RRF_K
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K, weights=None):
+    """
+    Fuse several ranked id lists with reciprocal rank fusion.
+
+    Each id scores sum(weight / (k + rank)) over the lists it appears in
+    (rank starting at 1), so items ranked well by several retrievers rise
+    to the top without having to calibrate their raw scores.
+
+    Returns:
+        list: (id, score) pairs, best first.
+    """
+    weights = weights or [1.0] * len(ranked_lists)
+    scores = {}
+    for ids, weight in zip(ranked_lists, weights):
+        for rank, item_id in enumerate(ids, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(query: str, query_vector: list, file_id=None, top_k=RETRIEVAL_TOP_K,
+                  candidates=RETRIEVAL_CANDIDATES):
+    """
+    Retrieve chunks with BM25 keyword search and vector search, fused with RRF.
+
+    query_vector may be None (the query could not be embedded); the search is
+    then keyword-only, as it is when the vector store is unavailable.
+
+    Returns:
+        list: Matches shaped like vector store matches ({"id", "score", "metadata"})
+        plus the chunk "text", best first.
+    """
+    version = active_version()["version"]
+    vector_matches = vector_candidates(query_vector, file_id, candidates)
+    keyword_matches = search_chunks(query, doc_id=file_id, limit=candidates, version=version)
+    return fuse_matches(vector_matches, keyword_matches, top_k, version=version)
+
+
+def vector_candidates(query_vector, file_id=None, candidates=RETRIEVAL_CANDIDATES):
+    """Vector search candidates, or none when there is no query vector or the vector store is down."""
+    if query_vector is None:
+        return []
+    filter = {"doc_id": file_id} if file_id else None
+    try:
+        return query_similar(query_vector, top_k=candidates, filter=filter)
+    except BackendUnavailable as e:
+        logger.warning(f"Vector search unavailable ({e}); using keyword search only")
+        return []
+
+
+def fuse_matches(vector_matches, keyword_matches, top_k=RETRIEVAL_TOP_K, version=None):
+    """
+    Fuse vector and keyword candidates with RRF and attach the stored chunk text.
+
+    Split out of hybrid_search so callers that fetch both candidate lists
+    concurrently (see async_service) share the same ranking. Chunk text is
+    read from the given index version (default: the active one).
+    """
+    version = active_version()["version"] if version is None else version
+    fused = reciprocal_rank_fusion([
+        [m['id'] for m in vector_matches],
+        [m['id'] for m in keyword_matches],
+    ])[:top_k]
+
+    by_id = {m['id']: m for m in keyword_matches}
+    missing = [item_id for item_id, _ in fused if item_id not in by_id]
+    by_id.update(get_chunks(missing, version=version))
+    vector_by_id = {m['id']: m for m in vector_matches}
+
+    results = []
+    for item_id, score in fused:
+        chunk = by_id.get(item_id)
+        if chunk is None:
+            # Vector hit without a stored chunk (e.g. indexed before chunks were stored)
+            metadata = dict(vector_by_id[item_id]['metadata'])
+            results.append({"id": item_id, "score": score, "metadata": metadata, "text": None})
+            continue
+        metadata = dict(vector_by_id[item_id]['metadata']) if item_id in vector_by_id else {}
+        metadata.update(chunk['metadata'])
+        results.append({"id": item_id, "score": score, "metadata": metadata, "text": chunk['text']})
+    return results
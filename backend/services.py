@@ -0,0 +1,217 @@
+"""
+Lazily initialized backend clients.
+
+Each backend (OpenAI, vector store, SQLite schema, speech SDK, ...) is
+registered with a factory and created on first use by get(), so importing the
+app does not connect to anything. /healthz and /readyz report which services
+are warm.
+
+Servers can warm services up front:
+    preload()  - in a pre-fork master (e.g. gunicorn --preload), loads only
+                 services that are safe to share across fork (modules, tokenizer,
+                 models); no connections, threads or process pools.
+    warmup()   - in each worker after fork (or at ASGI startup), initializes
+                 everything listed in PRELOAD_SERVICES.
+
+Tests can swap a backend with override(name, instance) instead of patching
+module globals.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from config import PRELOAD_SERVICES
+
+logger = logging.getLogger(__name__)
+
+
+class Service:
+    def __init__(self, name, factory, required=False, fork_safe=False):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.fork_safe = fork_safe
+        self.lock = threading.Lock()
+        self.instance = None
+        self.warm = False
+        self.error = None
+        self.init_seconds = None
+
+
+_registry = {}
+
+
+def register(name, factory, required=False, fork_safe=False):
+    """
+    Register a backend factory.
+
+    required services must be up for /readyz; fork_safe ones may be created
+    in a pre-fork master process and inherited by workers.
+    """
+    _registry[name] = Service(name, factory, required=required, fork_safe=fork_safe)
+
+
+def get(name):
+    """Return the service instance, creating it on first use (thread-safe)."""
+    service = _registry[name]
+    if service.warm:
+        return service.instance
+    with service.lock:
+        if not service.warm:
+            start = time.perf_counter()
+            try:
+                service.instance = service.factory()
+            except Exception as e:
+                service.error = str(e)
+                raise
+            service.init_seconds = time.perf_counter() - start
+            service.error = None
+            service.warm = True
+            logger.info(f"Initialized {name} in {service.init_seconds:.3f} seconds")
+    return service.instance
+
+
+def provide(name, instance):
+    """Use instance for a service instead of calling its factory."""
+    service = _registry[name]
+    with service.lock:
+        service.instance = instance
+        service.warm = True
+        service.error = None
+
+
+def reset(name):
+    """Forget a service instance so the next get() creates it again."""
+    service = _registry[name]
+    with service.lock:
+        service.instance = None
+        service.warm = False
+        service.error = None
+        service.init_seconds = None
+
+
+@contextmanager
+def override(name, instance):
+    """Temporarily replace a service, e.g. a LocalVectorStore or a fake client in tests."""
+    service = _registry[name]
+    previous = (service.instance, service.warm)
+    provide(name, instance)
+    try:
+        yield instance
+    finally:
+        with service.lock:
+            service.instance, service.warm = previous
+
+
+def is_warm(name):
+    return _registry[name].warm
+
+
+def status():
+    return {
+        name: {"warm": s.warm, "required": s.required, "init_seconds": s.init_seconds, "error": s.error}
+        for name, s in _registry.items()
+    }
+
+
+def warmup(names=None, fork_safe_only=False):
+    """
+    Initialize the given services (default: PRELOAD_SERVICES) now instead of
+    on first use. Failures are logged and reported, not raised.
+    """
+    names = PRELOAD_SERVICES if names is None else names
+    for name in names:
+        if fork_safe_only and not _registry[name].fork_safe:
+            continue
+        try:
+            get(name)
+        except Exception as e:
+            logger.error(f"Warmup of {name} failed: {str(e)}")
+    return {name: status()[name] for name in names}
+
+
+def preload(names=None):
+    """Warm only the fork-safe services; for a pre-fork master process."""
+    return warmup(names, fork_safe_only=True)
+
+
+def ready():
+    """Initialize the required services; returns (ok, status)."""
+    for name, service in _registry.items():
+        if service.required:
+            try:
+                get(name)
+            except Exception:
+                pass
+    current = status()
+    return all(s["warm"] for s in current.values() if s["required"]), current
+
+
+# Factories import their modules on first use so nothing heavy loads at import time
+
+def _openai():
+    import openai
+    from config import OPENAI_API_KEY
+    openai.api_key = OPENAI_API_KEY
+    return openai
+
+
+def _database():
+    # Creates this thread's connection and the schema; other threads open their own
+    import query_service
+    query_service.get_connection()
+    return query_service.DATABASE_PATH
+
+
+def _vector_store():
+    # The store of the index version that is active now (see index_versions)
+    from vector_store import create_vector_store
+    from index_versions import active_version
+    active = active_version()
+    return create_vector_store(version=active["version"], dim=active["dim"])
+
+
+def _embedding_cache():
+    from embedding_cache import EmbeddingCache
+    return EmbeddingCache()
+
+
+def _tokenizer():
+    from chunking import _get_encoding
+    return _get_encoding()
+
+
+def _speech():
+    from transcribe_service import speech_config
+    return speech_config()
+
+
+def _job_queue():
+    # Resumes jobs left queued or running by a previous process
+    import job_queue
+    job_queue.start()
+    return job_queue
+
+
+def _blob_sweeper():
+    import blob_store
+    blob_store.start_sweeper()
+    return blob_store
+
+
+def _summarizer():
+    from config import SUMMARIZER_PRELOAD
+    from transformer_summarizer import warmup as warm_models
+    warm_models(SUMMARIZER_PRELOAD)
+    return SUMMARIZER_PRELOAD
+
+
+register("openai", _openai, fork_safe=True)
+register("tokenizer", _tokenizer, fork_safe=True)
+register("summarizer", _summarizer, fork_safe=True)
+register("database", _database, required=True)
+register("job_queue", _job_queue, required=True)
+register("blob_sweeper", _blob_sweeper)
+register("vector_store", _vector_store)
+register("embedding_cache", _embedding_cache)
+register("speech", _speech)
@@ -1,21 +1,137 @@
 import os
-from pydub import AudioSegment
-import azure.cognitiveservices.speech as speechsdk
-from config import AZURE_COG_ENDPOINT, AZURE_COG_KEY
-
-def transcribe(audio_path):
-    # Convert webm to wav (Azure doesn't support webm directly)
-    base = os.path.splitext(audio_path)[0]
-    wav_path = f"{base}.wav"
-    audio = AudioSegment.from_file(audio_path)
-    audio.export(wav_path, format="wav")
-
-    speech_config = speechsdk.SpeechConfig(
-        subscription=AZURE_COG_KEY,
-        endpoint=AZURE_COG_ENDPOINT
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import services
+from config import (
+    AZURE_COG_ENDPOINT, AZURE_COG_KEY, TRANSCRIBE_SAMPLE_RATE, TRANSCRIBE_SEGMENT_SECONDS,
+    TRANSCRIBE_MIN_SILENCE_MS, TRANSCRIBE_CONCURRENCY, TRANSCRIBE_TIMEOUT, TRANSCRIBE_TIMEOUT_FACTOR
+)
+
+PUSH_CHUNK_BYTES = 32 * 1024
+
+
+def decode_audio(source, format=None):
+    """
+    Decode an audio file (path or file-like object) to 16-bit mono PCM at the
+    recognizer's sample rate, entirely in memory.
+    """
+    from pydub import AudioSegment
+    if format is None and isinstance(source, str):
+        format = os.path.splitext(source)[1].lstrip('.').lower() or None
+    audio = AudioSegment.from_file(source, format=format)
+    return audio.set_frame_rate(TRANSCRIBE_SAMPLE_RATE).set_channels(1).set_sample_width(2)
+
+
+def split_on_silence(audio, max_seconds=TRANSCRIBE_SEGMENT_SECONDS, min_silence_ms=TRANSCRIBE_MIN_SILENCE_MS):
+    """
+    Split a pydub AudioSegment into segments of at most max_seconds, cutting in
+    the middle of the last silence before each limit (or at the limit when there is none).
+    """
+    from pydub.silence import detect_silence
+    max_ms = int(max_seconds * 1000)
+    if len(audio) <= max_ms:
+        return [audio]
+    threshold = audio.dBFS - 16 if audio.dBFS != float('-inf') else -60
+    cut_points = [(start + end) // 2 for start, end in
+                  detect_silence(audio, min_silence_len=min_silence_ms, silence_thresh=threshold, seek_step=10)]
+
+    segments = []
+    start = 0
+    while len(audio) - start > max_ms:
+        limit = start + max_ms
+        candidates = [p for p in cut_points if start < p <= limit]
+        end = candidates[-1] if candidates else limit
+        segments.append(audio[start:end])
+        start = end
+    segments.append(audio[start:])
+    return segments
+
+
+def _speechsdk():
+    # The Azure Speech SDK is only loaded when audio is actually transcribed
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk
+
+
+def speech_config():
+    return _speechsdk().SpeechConfig(subscription=AZURE_COG_KEY, endpoint=AZURE_COG_ENDPOINT)
+
+
+def recognize_deadline(pcm: bytes, sample_rate=TRANSCRIBE_SAMPLE_RATE) -> float:
+    """Seconds to wait for the recognizer: a fixed allowance plus a multiple of the audio duration."""
+    return TRANSCRIBE_TIMEOUT + TRANSCRIBE_TIMEOUT_FACTOR * len(pcm) / (2 * sample_rate)
+
+
+def azure_recognize(pcm: bytes, sample_rate=TRANSCRIBE_SAMPLE_RATE, timeout=None) -> str:
+    """
+    Recognize raw 16-bit mono PCM with continuous recognition over a push
+    stream, so utterances after the first one are not dropped.
+
+    Raises TimeoutError when the session has not ended within timeout seconds
+    (by default recognize_deadline(pcm)); recognition is stopped first.
+    """
+    if timeout is None:
+        timeout = recognize_deadline(pcm, sample_rate)
+    speechsdk = _speechsdk()
+    stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=1)
+    stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+    recognizer = speechsdk.SpeechRecognizer(
+        speech_config=services.get("speech"),
+        audio_config=speechsdk.audio.AudioConfig(stream=stream)
     )
-    audio_config = speechsdk.audio.AudioConfig(filename=wav_path)
-    recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
-    result = recognizer.recognize_once()
+    texts = []
+    errors = []
+    done = threading.Event()
+
+    def on_recognized(evt):
+        if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech and evt.result.text:
+            texts.append(evt.result.text)
+
+    def on_canceled(evt):
+        if evt.cancellation_details.reason == speechsdk.CancellationReason.Error:
+            errors.append(evt.cancellation_details.error_details)
+        done.set()
+
+    recognizer.recognized.connect(on_recognized)
+    recognizer.canceled.connect(on_canceled)
+    recognizer.session_stopped.connect(lambda evt: done.set())
+
+    recognizer.start_continuous_recognition()
+    for i in range(0, len(pcm), PUSH_CHUNK_BYTES):
+        stream.write(pcm[i:i + PUSH_CHUNK_BYTES])
+    stream.close()
+    finished = done.wait(timeout)
+    recognizer.stop_continuous_recognition()
+
+    if not finished:
+        raise TimeoutError(f"Speech recognition did not finish within {timeout:.0f}s")
+
+    if errors:
+        raise RuntimeError(f"Speech recognition failed: {errors[0]}")
+    return ' '.join(texts)
+
+
+def transcribe(source, format=None, recognize=None, max_workers=TRANSCRIBE_CONCURRENCY,
+               max_seconds=TRANSCRIBE_SEGMENT_SECONDS):
+    """
+    Transcribe an audio file without writing intermediate files.
+
+    Args:
+        source (str or file-like): Path to the audio, or an open binary stream (e.g. an upload).
+        format (str): Container format (e.g. "webm", "wav"); inferred from the path when omitted.
+        recognize (callable): Takes 16-bit mono PCM bytes and returns text; defaults to
+            Azure continuous recognition. Tests pass a local fake.
+        max_workers (int): Segments recognized concurrently for long recordings.
+        max_seconds (float): Longest segment sent to the recognizer in one piece.
 
-    return result.text if result.reason == speechsdk.ResultReason.RecognizedSpeech else ""
\ No newline at end of file
+    Returns:
+        str: Transcribed text of all segments, in order.
+    """
+    recognize = recognize or azure_recognize
+    segments = [s.raw_data for s in split_on_silence(decode_audio(source, format), max_seconds)]
+    if len(segments) == 1:
+        texts = [recognize(segments[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segments)))) as pool:
+            texts = list(pool.map(recognize, segments))
+    return ' '.join(t.strip() for t in texts if t and t.strip())
@@ -1,17 +1,26 @@
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import torch
 from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
 import logging
+from config import SUMMARIZER_MEMORY_BUDGET_MB, SUMMARIZER_PRELOAD, SUMMARIZER_MODE, SUMMARIZER_THREADS
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
 
 # Directory to save the models
 MODEL_DIR = "./models/"
 os.makedirs(MODEL_DIR, exist_ok=True)
+# ONNX exports are kept here so the (slow) export only happens once per model
+ONNX_DIR = os.path.join(MODEL_DIR, "onnx")
+
+SUMMARIZER_MODES = ["fp32", "int8", "onnx"]
 
 MODELS_TO_DOWNLOAD = [
     "facebook/bart-large-cnn",  # BART model fine-tuned 
@@ -42,7 +51,179 @@ def download_transformer_models():
         except Exception as e:
             logger.error(f"Failed to download {model_name}: {str(e)}")
 
-def summarize_with_transformer(text, model_name="facebook/bart-large-cnn", max_length=150, min_length=30):
+# Loaded pipelines, least recently used first: (model_name, mode) -> (pipeline, size in bytes)
+_pipelines = OrderedDict()
+# Loads in progress: (model_name, mode) -> Future of the pipeline; callers asking for
+# the same key wait on it, everyone else goes on without waiting
+_loading = {}
+_registry_lock = threading.Lock()
+
+def _model_size(summarizer):
+    model = summarizer.model
+    if not isinstance(model, torch.nn.Module):
+        # ONNX Runtime model: size of the exported files
+        path = str(getattr(model, "model_save_dir", "") or "")
+        if not os.path.isdir(path):
+            return 0
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path) if ".onnx" in f)
+    # state_dict also holds the packed int8 weights of quantized layers, which
+    # parameters() leaves out; tied weights (shared embeddings) are counted once
+    seen = set()
+    total = 0
+    for value in model.state_dict().values():
+        for tensor in (value if isinstance(value, (tuple, list)) else (value,)):
+            if isinstance(tensor, torch.Tensor) and tensor.data_ptr() not in seen:
+                seen.add(tensor.data_ptr())
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+def _model_path(model_name):
+    # Use the local model if already downloaded, otherwise download it
+    model_path = os.path.join(MODEL_DIR, model_name.replace("/", "_"))
+    return model_path if os.path.exists(model_path) else model_name
+
+def _load_onnx(model_name, model_path):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    except ImportError:
+        raise RuntimeError("The onnx summarizer mode needs optimum[onnxruntime]: pip install optimum[onnxruntime]")
+    options = onnxruntime.SessionOptions()
+    if SUMMARIZER_THREADS > 0:
+        options.intra_op_num_threads = SUMMARIZER_THREADS
+    export_path = os.path.join(ONNX_DIR, model_name.replace("/", "_"))
+    if os.path.exists(export_path):
+        model = ORTModelForSeq2SeqLM.from_pretrained(export_path, session_options=options)
+    else:
+        logger.info(f"Exporting {model_name} to ONNX in {export_path}")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_path, export=True, session_options=options)
+        model.save_pretrained(export_path)
+    return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(model_path))
+
+def _load_pipeline(model_name, mode=SUMMARIZER_MODE):
+    if mode not in SUMMARIZER_MODES:
+        raise ValueError(f"Unknown summarizer mode: {mode} (expected one of {', '.join(SUMMARIZER_MODES)})")
+    if SUMMARIZER_THREADS > 0:
+        torch.set_num_threads(SUMMARIZER_THREADS)
+    model_path = _model_path(model_name)
+    if mode == "onnx":
+        return _load_onnx(model_name, model_path)
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+    if mode == "int8":
+        # Linear weights are stored as int8 and activations quantized on the fly;
+        # embeddings and layer norms stay fp32. Most of the compute is in the linear layers.
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("summarization", model=model, tokenizer=AutoTokenizer.from_pretrained(model_path))
+
+def get_summarizer(model_name="facebook/bart-large-cnn", mode=None):
+    """
+    Return a warm summarization pipeline, loading it on first use.
+
+    mode selects the CPU inference path (see SUMMARIZER_MODES; default SUMMARIZER_MODE).
+    Loaded pipelines are reused across calls. When their combined weight size
+    exceeds SUMMARIZER_MEMORY_BUDGET_MB the least recently used ones are dropped.
+    Concurrent callers of a model being loaded share that one load.
+    """
+    key = (model_name, mode or SUMMARIZER_MODE)
+    with _registry_lock:
+        if key in _pipelines:
+            _pipelines.move_to_end(key)
+            return _pipelines[key][0]
+        future = _loading.get(key)
+        leader = future is None
+        if leader:
+            future = _loading[key] = Future()
+    if not leader:
+        return future.result()
+
+    # Loaded outside the registry lock, so warm models are served meanwhile
+    try:
+        logger.info(f"Loading pipeline with model: {model_name} ({key[1]})")
+        summarizer = _load_pipeline(*key)
+        weight = _model_size(summarizer)
+    except BaseException as e:
+        with _registry_lock:
+            _loading.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _registry_lock:
+        _pipelines[key] = (summarizer, weight)
+        _loading.pop(key, None)
+        budget = SUMMARIZER_MEMORY_BUDGET_MB * 1024 * 1024
+        while len(_pipelines) > 1 and sum(size for _, size in _pipelines.values()) > budget:
+            (evicted, evicted_mode), _ = _pipelines.popitem(last=False)
+            logger.info(f"Unloading pipeline for model: {evicted} ({evicted_mode})")
+    future.set_result(summarizer)
+    return summarizer
+
+def warmup(model_names=None, mode=None):
+    """Load pipelines up front (e.g. before forking workers) so the first request doesn't pay for it."""
+    for model_name in model_names or SUMMARIZER_PRELOAD or MODELS_TO_DOWNLOAD:
+        summarizer = get_summarizer(model_name, mode)
+        summarizer("warmup", max_length=8, min_length=1, do_sample=False)
+
+def _max_input_tokens(summarizer):
+    limit = summarizer.tokenizer.model_max_length
+    positions = getattr(summarizer.model.config, "max_position_embeddings", None)
+    if positions:
+        limit = min(limit, positions)
+    # Some tokenizers report a huge sentinel value when there is no fixed limit (e.g. T5)
+    return limit if limit < 100000 else 512
+
+def summarize_batch(texts, model_name="facebook/bart-large-cnn", max_length=150, min_length=30, batch_size=8,
+                    mode=None):
+    """
+    Summarize many texts with one pipeline call, batched through the model.
+
+    Args:
+        texts (list): Texts to summarize. Each must fit in the model's input length.
+        model_name (str): The name of the transformer model to use.
+        max_length (int): Maximum length of each summary.
+        min_length (int): Minimum length of each summary.
+        batch_size (int): Number of texts per forward pass.
+        mode (str): CPU inference mode ("fp32", "int8" or "onnx"); default SUMMARIZER_MODE.
+
+    Returns:
+        list: Summaries in input order.
+    """
+    summarizer = get_summarizer(model_name, mode)
+    results = summarizer(
+        list(texts), max_length=max_length, min_length=min_length,
+        do_sample=False, truncation=True, batch_size=batch_size
+    )
+    return [r['summary_text'] for r in results]
+
+def summarize_long(text, model_name="facebook/bart-large-cnn", max_length=150, min_length=30, max_rounds=3,
+                   mode=None):
+    """
+    Map-reduce summarization for inputs longer than the model's maximum input length.
+
+    The text is split into token windows that fit the model, each window is
+    summarized (map, batched), and the joined partial summaries are summarized
+    again (reduce) until they fit in a single input.
+    """
+    summarizer = get_summarizer(model_name, mode)
+    tokenizer = summarizer.tokenizer
+    window = _max_input_tokens(summarizer) - 16  # room for special tokens / task prefix
+
+    for _ in range(max_rounds):
+        ids = tokenizer(text, add_special_tokens=False)['input_ids']
+        if len(ids) <= window:
+            break
+        pieces = [
+            tokenizer.decode(ids[i:i + window], skip_special_tokens=True)
+            for i in range(0, len(ids), window)
+        ]
+        partials = summarize_batch(
+            pieces, model_name=model_name, max_length=max_length, min_length=min(min_length, max_length // 2),
+            mode=mode
+        )
+        text = ' '.join(partials)
+    return summarize_batch([text], model_name=model_name, max_length=max_length, min_length=min_length, mode=mode)[0]
+
+def summarize_with_transformer(text, model_name="facebook/bart-large-cnn", max_length=150, min_length=30, mode=None):
     """
     Summarize the given text using a transformer model.
     
@@ -51,30 +232,22 @@ def summarize_with_transformer(text, model_name="facebook/bart-large-cnn", max_l
         model_name (str): The name of the transformer model to use.
         max_length (int): Maximum length of the summary.
         min_length (int): Minimum length of the summary.
+        mode (str): CPU inference mode ("fp32", "int8" or "onnx"); default SUMMARIZER_MODE.
     
     Returns:
         str: The summarized text.
     """
-    logger.info(f"Loading pipeline with model: {model_name}")
-    
-    # Use the local model if already downloaded, otherwise download it
-    model_path = os.path.join(MODEL_DIR, model_name.replace("/", "_"))
-    if os.path.exists(model_path):
-        summarizer = pipeline("summarization", model=model_path, tokenizer=model_path)
-    else:
-        summarizer = pipeline("summarization", model=model_name, tokenizer=model_name)
-    
     logger.info(" text...")
     try:
-        # Summarize the text
-        summary = summarizer(text, max_length=max_length, min_length=min_length, do_sample=False)[0]['summary_text']
+        # Long inputs are summarized map-reduce style instead of being truncated
+        summary = summarize_long(text, model_name=model_name, max_length=max_length, min_length=min_length, mode=mode)
         logger.info("Response given successfully.")
         return summary
     except Exception as e:
         logger.error(f"Response failure: {str(e)}")
         return "Error: Could not summarize the text."
 
-if _name_ == "_main_":
+if __name__ == "__main__":
     # Step 1: Download the transformer models
     download_transformer_models()
     
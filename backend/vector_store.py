@@ -0,0 +1,368 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+import numpy as np
+import services
+import index_versions
+
+from config import (
+    VECTOR_BACKEND, LOCAL_INDEX_DIR, LOCAL_INDEX_APPROXIMATE, EMBEDDING_DIM,
+    PINECONE_API_KEY, PINECONE_ENV, PINECONE_INDEX,
+)
+
+
+def _match(vector_id, score, metadata):
+    return {"id": vector_id, "score": float(score), "metadata": metadata}
+
+
+def _normalize_filter(filter):
+    """Turn a Pinecone-style filter ({"k": v}, {"k": {"$eq": v}}, {"k": {"$in": [...]}}) into {key: set}."""
+    conditions = {}
+    for key, cond in (filter or {}).items():
+        if isinstance(cond, dict):
+            if "$eq" in cond:
+                conditions[key] = {cond["$eq"]}
+            elif "$in" in cond:
+                conditions[key] = set(cond["$in"])
+            else:
+                raise ValueError(f"Unsupported filter operator for '{key}': {list(cond)}")
+        else:
+            conditions[key] = {cond}
+    return conditions
+
+
+class PineconeVectorStore:
+    """Pinecone index; each index version lives in its own namespace (the legacy version in the default one)."""
+
+    def __init__(self, index, version=""):
+        self.index = index
+        self.version = version
+        self._namespace = {"namespace": version} if version else {}
+
+    def upsert(self, vectors: list):
+        self.index.upsert(vectors=vectors, **self._namespace)
+
+    def query(self, vector: list, top_k=3, filter=None, approximate=None):
+        kwargs = {"filter": filter} if filter else {}
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=True, **kwargs, **self._namespace)['matches']
+
+    def delete(self, ids: list):
+        self.index.delete(ids=ids, **self._namespace)
+
+    def drop(self):
+        """Delete every vector of this version."""
+        self.index.delete(delete_all=True, **self._namespace)
+
+
+class LocalVectorStore:
+    """
+    In-process vector index.
+
+    Vectors are kept L2-normalised in a memory-mapped float32 matrix
+    (vectors.f32) and ids/metadata in an SQLite sidecar (index.db), so the
+    index survives restarts without loading everything into RAM. Scores are
+    cosine similarities. Queries are exact unless approximate is set (per
+    store, or per query); once build_ivf() has trained centroids, approximate
+    queries probe only the nprobe nearest clusters.
+    """
+
+    def __init__(self, path=LOCAL_INDEX_DIR, dim=EMBEDDING_DIM, nprobe=8, version="",
+                 approximate=LOCAL_INDEX_APPROXIMATE):
+        self.path = path
+        self.dim = dim
+        self.version = version
+        self.nprobe = nprobe
+        self.approximate = approximate
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._centroids_path = os.path.join(path, "centroids.npy")
+
+        self._db = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False)
+        self._db.execute("""
+        CREATE TABLE IF NOT EXISTS vectors(
+            row INTEGER PRIMARY KEY,
+            id TEXT UNIQUE,
+            metadata TEXT,
+            deleted INTEGER DEFAULT 0
+        )
+        """)
+        self._db.commit()
+
+        self._ids = []
+        self._metadata = []
+        self._alive = []
+        self._row_of = {}
+        for row, vector_id, metadata, deleted in self._db.execute(
+                "SELECT row, id, metadata, deleted FROM vectors ORDER BY row"):
+            while len(self._ids) < row:
+                # Rows freed by a delete followed by a re-upsert of the same id
+                self._ids.append(None)
+                self._metadata.append({})
+                self._alive.append(False)
+            self._ids.append(vector_id)
+            self._metadata.append(json.loads(metadata) if metadata else {})
+            self._alive.append(not deleted)
+            if not deleted:
+                self._row_of[vector_id] = row
+        self._inverted = {}
+
+        self._capacity = 0
+        self._matrix = None
+        self._open_matrix(max(len(self._ids), 1024))
+
+        self._centroids = None
+        self._assignments = None
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+            self._assignments = self._assign(np.arange(len(self._ids)))
+
+    def __len__(self):
+        return len(self._row_of)
+
+    # --- storage -----------------------------------------------------------
+
+    def _open_matrix(self, capacity):
+        size = capacity * self.dim * 4
+        if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(size)
+        if self._matrix is not None:
+            self._matrix.flush()
+        capacity = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _ensure_capacity(self, rows):
+        if rows > self._capacity:
+            self._open_matrix(max(rows, self._capacity * 2))
+
+    def upsert(self, vectors: list):
+        with self._lock:
+            updates = []
+            for v in vectors:
+                values = np.asarray(v["values"], dtype=np.float32)
+                if values.shape != (self.dim,):
+                    raise ValueError(f"Vector '{v['id']}' has dimension {values.shape}, expected {self.dim}")
+                norm = np.linalg.norm(values)
+                if norm > 0:
+                    values = values / norm
+                metadata = v.get("metadata") or {}
+
+                row = self._row_of.get(v["id"])
+                if row is None:
+                    row = len(self._ids)
+                    self._ids.append(v["id"])
+                    self._metadata.append(metadata)
+                    self._alive.append(True)
+                    self._row_of[v["id"]] = row
+                else:
+                    self._unindex(row)
+                    self._metadata[row] = metadata
+                self._index_metadata(row)
+
+                self._ensure_capacity(row + 1)
+                self._matrix[row] = values
+                updates.append((row, v["id"], json.dumps(metadata)))
+
+            self._matrix.flush()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO vectors (row, id, metadata, deleted) VALUES (?, ?, ?, 0)", updates)
+            self._db.commit()
+
+            if self._centroids is not None:
+                rows = np.array([u[0] for u in updates], dtype=np.int64)
+                self._assignments = np.resize(self._assignments, len(self._ids))
+                self._assignments[rows] = self._assign(rows)
+
+    def delete(self, ids: list):
+        with self._lock:
+            rows = [self._row_of.pop(i) for i in ids if i in self._row_of]
+            for row in rows:
+                self._unindex(row)
+                self._alive[row] = False
+            self._db.executemany("UPDATE vectors SET deleted = 1 WHERE row = ?", [(r,) for r in rows])
+            self._db.commit()
+
+    # --- metadata filtering ------------------------------------------------
+
+    def _index_metadata(self, row):
+        for key, postings in self._inverted.items():
+            value = self._metadata[row].get(key)
+            if value is not None and not isinstance(value, (list, dict)):
+                postings.setdefault(value, set()).add(row)
+
+    def _unindex(self, row):
+        for key, postings in self._inverted.items():
+            value = self._metadata[row].get(key)
+            if not isinstance(value, (list, dict)) and value in postings:
+                postings[value].discard(row)
+
+    def _postings(self, key):
+        # Inverted indexes are built lazily for keys that are actually filtered on
+        if key not in self._inverted:
+            postings = {}
+            for row, metadata in enumerate(self._metadata):
+                value = metadata.get(key)
+                if self._alive[row] and value is not None and not isinstance(value, (list, dict)):
+                    postings.setdefault(value, set()).add(row)
+            self._inverted[key] = postings
+        return self._inverted[key]
+
+    def _filter_rows(self, filter):
+        rows = None
+        for key, values in _normalize_filter(filter).items():
+            postings = self._postings(key)
+            matched = set().union(*(postings.get(v, set()) for v in values))
+            rows = matched if rows is None else rows & matched
+        return rows
+
+    # --- search ------------------------------------------------------------
+
+    def query(self, vector: list, top_k=3, filter=None, approximate=None):
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q = q / norm
+
+        with self._lock:
+            n = len(self._ids)
+            alive = np.fromiter(self._alive, dtype=bool, count=n)
+            if filter:
+                candidates = np.fromiter(sorted(self._filter_rows(filter)), dtype=np.int64)
+            else:
+                candidates = None
+
+            use_ivf = self.approximate if approximate is None else approximate
+            # Small filtered candidate sets are cheaper to score exactly
+            if use_ivf and self._centroids is not None and (candidates is None or len(candidates) > top_k * 64):
+                probe = np.argsort(-(self._centroids @ q))[:self.nprobe]
+                in_probe = np.isin(self._assignments[:n], probe)
+                rows = np.nonzero(in_probe & alive)[0]
+                if candidates is not None:
+                    rows = np.intersect1d(rows, candidates, assume_unique=True)
+            elif candidates is not None:
+                rows = candidates
+            else:
+                rows = np.nonzero(alive)[0]
+
+            if len(rows) == 0:
+                return []
+            scores = self._matrix[rows] @ q
+            k = min(top_k, len(rows))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [_match(self._ids[rows[i]], scores[i], self._metadata[rows[i]]) for i in best]
+
+    # --- approximate index ---------------------------------------------------
+
+    def _assign(self, rows):
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.argmax(self._matrix[rows] @ self._centroids.T, axis=1).astype(np.int32)
+
+    def build_ivf(self, nlist=None, iterations=10, sample_size=20000, seed=0):
+        """Train IVF centroids with spherical k-means and assign every stored vector to a cluster."""
+        with self._lock:
+            rows = np.nonzero(np.fromiter(self._alive, dtype=bool, count=len(self._ids)))[0]
+            if len(rows) == 0:
+                return
+            nlist = nlist or max(1, int(np.sqrt(len(rows))))
+            rng = np.random.default_rng(seed)
+            sample = self._matrix[rng.choice(rows, size=min(sample_size, len(rows)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for c in range(len(centroids)):
+                    members = sample[labels == c]
+                    if len(members):
+                        centroid = members.sum(axis=0)
+                        centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+            self._centroids = centroids
+            np.save(self._centroids_path, centroids)
+            self._assignments = self._assign(np.arange(len(self._ids)))
+
+    def drop(self):
+        """Delete the index files; the store cannot be used afterwards."""
+        with self._lock:
+            self._db.close()
+            self._matrix = None
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+def create_vector_store(backend=VECTOR_BACKEND, version="", dim=EMBEDDING_DIM):
+    """Open the vector store of an index version ("" is the legacy, unversioned index)."""
+    if backend == "local":
+        path = os.path.join(LOCAL_INDEX_DIR, "versions", version) if version else LOCAL_INDEX_DIR
+        return LocalVectorStore(path=path, dim=dim, version=version)
+    if backend == "pinecone":
+        from pinecone import Pinecone
+        pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
+        return PineconeVectorStore(pc.Index(PINECONE_INDEX), version=version)
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+# Stores of versions other than the active one, e.g. the version reindex.py is building
+_other_stores = {}
+_stores_lock = threading.Lock()
+
+
+def build_ivf(version=None):
+    """
+    Train the approximate (IVF) index of a version's local store; other
+    backends do their own approximate search. Returns True when trained.
+    """
+    store = get_vector_store(version)
+    if not hasattr(store, "build_ivf"):
+        return False
+    store.build_ivf()
+    return True
+
+
+def _open_version(version):
+    info = index_versions.get_version(version)
+    if info is None:
+        raise ValueError(f"Unknown index version '{version}'")
+    return create_vector_store(version=version, dim=info["dim"])
+
+
+def get_vector_store(version=None):
+    """
+    The vector store of an index version, by default the active one.
+
+    The active store is a service created on first use (see services); when
+    another process activates a new version, the next call switches over.
+    """
+    active = index_versions.active_version()["version"]
+    version = active if version is None else version
+    store = services.get("vector_store")
+    current = getattr(store, "version", None)
+    if current is None or current == version:
+        # A store without a version was put in place with set_vector_store()/services.override()
+        return store
+    with _stores_lock:
+        if version != active:
+            if version not in _other_stores:
+                _other_stores[version] = _open_version(version)
+            return _other_stores[version]
+        store = services.get("vector_store")
+        if store.version != active:
+            store = _other_stores.pop(active, None) or _open_version(active)
+            services.provide("vector_store", store)
+        return store
+
+
+def set_vector_store(store):
+    """Replace the active vector store (e.g. a LocalVectorStore in tests)."""
+    services.provide("vector_store", store)
+
+
+def drop_version_store(version):
+    """Delete every vector of an index version that is not active."""
+    if version == index_versions.active_version(max_age=0)["version"]:
+        raise ValueError(f"Index version '{version}' is active")
+    with _stores_lock:
+        store = _other_stores.pop(version, None) or _open_version(version)
+    store.drop()